@@ -2,6 +2,8 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Base directory of the project
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,6 +25,7 @@ INSTALLED_APPS = [
 
 # Middleware
 MIDDLEWARE = [
+    'quiz_app.metrics.RequestMetricsMiddleware',  # Only active with REQUEST_METRICS
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,12 +59,72 @@ TEMPLATES = [
 WSGI_APPLICATION = 'ncaa_quiz.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default. WAL lets quiz pages read while answers are written,
+# IMMEDIATE transactions take the write lock up front instead of failing
+# with "database is locked" when a read turns into a write, and the timeout
+# makes concurrent writers queue for the lock. Set DATABASE_ENGINE=postgresql
+# for deployments with many concurrent writers.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'ncaa_quiz'),
+            'USER': os.environ.get('POSTGRES_USER', 'ncaa_quiz'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('DATABASE_POOL', '1') == '1':
+        # Connection pool shared by each process's threads (needs psycopg[pool]);
+        # Django requires persistent connections to be off when pooling
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+            },
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('CONN_MAX_AGE', 60))  # Seconds to keep a connection
+elif DATABASE_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.environ.get('SQLITE_TIMEOUT', 20)),  # Seconds to wait for the write lock
+            },
+            # A file, not the default in-memory database, so tests lock like production
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DATABASE_ENGINE {DATABASE_ENGINE!r}; use 'sqlite' or 'postgresql'.")
+
+# Cache
+# Local memory by default. Set CACHE_DIR to share one file-based cache between
+# the processes of a deployment, which cached pages, quiz progress and the
+# sampling version need when there is more than one worker.
+if os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_DIR'],
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ncaa-quiz',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
     }
-}
 
 # Authentication
 AUTH_PASSWORD_VALIDATORS = [
@@ -85,6 +148,31 @@ LOGIN_URL = '/login/'  # Custom login URL
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# PDF imports
+PDF_IMPORT_WORKERS = os.cpu_count() or 2  # Processes extracting PDF pages; 0 parses inline in the request
+PDF_IMPORT_CONCURRENT_JOBS = 2  # Imports processed at the same time
+QUESTION_IMPORT_BATCH_SIZE = 500  # Rows per bulk insert when saving imported questions
+PDF_IMPORT_STALE_SECONDS = 15 * 60  # Unfinished imports without progress for this long are marked failed
+
+# Question review
+REVIEW_PAGE_SIZE = 50  # Questions per page of the review screen
+
+# Leaderboards
+LEADERBOARD_SIZE = 25  # Users listed on a leaderboard page
+
+# Quiz attempts
+QUIZ_TIMER_GRACE_SECONDS = 30  # Answers arriving this long after the deadline still count
+
+# Write-behind answer log (quiz_app/writebehind.py)
+ANSWER_WRITE_BEHIND = os.environ.get('ANSWER_WRITE_BEHIND') == '1'  # Log answers to disk and insert them in batches
+ANSWER_LOG_DIR = os.environ.get('ANSWER_LOG_DIR', os.path.join(BASE_DIR, 'answer_log'))  # Local disk, one per host
+ANSWER_LOG_FLUSH_INTERVAL = 1.0  # Seconds between bulk inserts of logged answers
+ANSWER_LOG_BATCH_SIZE = 500  # Logged answers inserted per transaction
+
+# Request metrics
+REQUEST_METRICS = os.environ.get('REQUEST_METRICS') == '1'  # Time and count the queries of every request
+REQUEST_METRICS_WINDOW = 1000  # Recent requests kept per URL name for the metrics page
+
 LOGIN_REDIRECT_URL = '/'  # Redirects to the home page after login
 LOGOUT_REDIRECT_URL = '/'  # Redirects to the home page after logout
 
@@ -1,63 +1,34 @@
-import pdfplumber
-import re
-
-
-def extract_questions_and_answers(text):
-    """
-    Extracts questions and their answers from a given text.
-
-    :param text: The raw text extracted from a PDF page.
-    :return: A list of tuples, where each tuple contains a question (str)
-             and a list of answers (dict with 'text' and 'is_correct' keys).
-    """
-    lines = text.split("\n")
-    questions = []
-    current_question = None
-    current_answers = []
-    i = 0
-
-    while i < len(lines):
-        line = lines[i].strip()
-        # Detect a new question starting with "Q#"
-        question_match = re.match(r"(Q\d+)\s(.*)", line)
-        if question_match:
-            # Save the previous question and its answers
-            if current_question and current_answers:
-                questions.append((current_question.strip(), current_answers))
-                current_answers = []
+"""
+Print the questions and answers parsed from a quiz PDF.
 
-            # Start a new question
-            current_question = question_match.group(2).strip()
+    python parsers.py path/to/quiz.pdf
 
-        # Detect standalone "o" indicating the start of an answer
-        elif line == "o" and i + 1 < len(lines):
-            # The next line is the answer text
-            answer_text = lines[i + 1].strip()
-            is_correct = "__" in answer_text  # Detect correct answers by underline
-            cleaned_text = answer_text.replace("__", "").strip()  # Clean underline markers
-            current_answers.append({"text": cleaned_text, "is_correct": is_correct})
-            i += 1  # Skip the next line since it's part of the answer
+Uses the same parser as PDF uploads (quiz_app/parsing.py), streaming the
+pages through it so nothing but the current question is held in memory.
+"""
+import argparse
 
-        # Append additional lines to the current question
-        elif current_question and not re.match(r"(Q\d+)\s", line):
-            current_question += f" {line.strip()}"
+import pdfplumber
 
-        i += 1
+from quiz_app.parsing import iter_lines, iter_questions
 
-    # Add the last question and answers
-    if current_question and current_answers:
-        questions.append((current_question.strip(), current_answers))
 
-    return questions
+def iter_page_texts(pdf):
+    for page in pdf.pages:
+        yield page.extract_text()
 
 
-file_path = "q1.pdf"  # Replace with the path to your actual PDF
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the questions and answers parsed from a quiz PDF.")
+    parser.add_argument('file', nargs='?', default='q1.pdf', help="Path to the quiz PDF")
+    args = parser.parse_args(argv)
 
-with pdfplumber.open(file_path) as pdf:
-    for page in pdf.pages:
-        text = page.extract_text()
-        parsed_data = extract_questions_and_answers(text)
-        for question, answers in parsed_data:  # Correct unpacking of tuple
+    with pdfplumber.open(args.file) as pdf:
+        for question, answers in iter_questions(iter_lines(iter_page_texts(pdf))):
             print("Question:", question)
             for ans in answers:
                 print("  - Answer:", ans["text"], "(Correct)" if ans["is_correct"] else "(Incorrect)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+"""
+Adaptive question selection from each user's answer history.
+
+Every answered question gets a QuestionMastery row following the Leitner
+system: a correct answer moves the question up a box, a wrong one back to
+box 0, and the box sets how long until the question is due again
+(BOX_INTERVALS). Quizzes are drawn mostly from due questions, weighted
+toward the low boxes, with a share of questions the user has never seen.
+General questions and conference quiz questions are tracked separately;
+a conference's practice page asks its members one question at a time from
+the conference's open quizzes, picked the same way.
+
+Selection must not cost a query per quiz, so a user's rows are cached as
+a State: per box, the question ids in the order they fall due, plus the
+sorted ids of every question seen. Due questions are then found by
+bisection and drawn at random, so picking a quiz takes time in the number
+of questions asked, not in the size of the history or of the pool. The
+cached state is updated in place as answers are recorded, each question
+moved between boxes by bisection.
+
+Answers are recorded by reading the rows involved and writing them back
+with one upsert, in a transaction. Outside SQLite, where that transaction
+doesn't lock the rows it reads, two requests answering the same question
+for the same user at once can lose one of the updates, which only shifts
+when the question is asked next.
+"""
+import random
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Question, QuestionMastery
+from .sampling import active_question_pool
+
+DAY = 24 * 60 * 60
+BOX_INTERVALS = [0, DAY, 3 * DAY, 7 * DAY, 21 * DAY, 60 * DAY]  # Seconds until a question in each box is due
+BOX_WEIGHTS = [32, 16, 8, 4, 2, 1]  # How much more likely a due question in each box is to be picked
+NEW_SHARE = 0.3  # Share of each quiz kept for unseen questions, when there are enough due ones
+DRAWS_PER_QUESTION = 4  # Random draws per question asked before falling back to a scan
+STATE_TIMEOUT = 24 * 60 * 60
+
+GENERAL = QuestionMastery.GENERAL
+CONFERENCE = QuestionMastery.CONFERENCE
+
+
+class State:
+    """
+    One user's mastery of the questions of one source, arranged for
+    selection. Arrays keep it small to cache and quick to load.
+    """
+
+    def __init__(self, rows=()):
+        """
+        :param rows: (question id, box, due as a Unix timestamp) tuples.
+        """
+        self.due_ids = [array('q') for _ in BOX_INTERVALS]  # Per box, ordered by due time
+        self.due_at = [array('d') for _ in BOX_INTERVALS]
+        rows = sorted(rows, key=lambda row: row[2])
+        for question_id, box, due in rows:
+            self.due_ids[box].append(question_id)
+            self.due_at[box].append(due)
+        self.seen = array('q', sorted(question_id for question_id, _, _ in rows))
+
+    def rows(self):
+        for box, (ids, dues) in enumerate(zip(self.due_ids, self.due_at)):
+            for question_id, due in zip(ids, dues):
+                yield question_id, box, due
+
+    def update(self, changes):
+        """
+        Move questions between boxes in place.
+
+        :param changes: A dict of question id to a tuple of its (box, due)
+                        before, or None if it was new, and its (box, due)
+                        after.
+        """
+        for question_id, (before, (box, due)) in changes.items():
+            if self.has_seen(question_id):
+                self._remove(question_id, before)
+            else:
+                insort(self.seen, question_id)
+            index = bisect_right(self.due_at[box], due)
+            self.due_ids[box].insert(index, question_id)
+            self.due_at[box].insert(index, due)
+
+    def has_seen(self, question_id):
+        index = bisect_left(self.seen, question_id)
+        return index < len(self.seen) and self.seen[index] == question_id
+
+    def due_counts(self, at):
+        return [bisect_right(dues, at) for dues in self.due_at]
+
+    def _remove(self, question_id, before):
+        if before is not None:
+            box, due = before
+            ids, dues = self.due_ids[box], self.due_at[box]
+            index = bisect_left(dues, due)
+            while index < len(dues) and dues[index] == due:
+                if ids[index] == question_id:
+                    del ids[index], dues[index]
+                    return
+                index += 1
+        # The cached state was behind the rows, e.g. answers recorded by
+        # another process; look in every box
+        for ids, dues in zip(self.due_ids, self.due_at):
+            if question_id in ids:
+                index = ids.index(question_id)
+                del ids[index], dues[index]
+                return
+
+
+def select_general_questions(user_id, count):
+    """
+    Pick up to count active general questions for a user, in random order.
+    """
+    ids, id_set = active_question_pool()
+    return choose(get_state(user_id, GENERAL), ids, id_set, count)
+
+
+def select_conference_questions(user_id, conference_id, count):
+    """
+    Pick up to count questions of a conference's open quizzes for a user,
+    in random order.
+    """
+    ids = list(Question.objects.filter(quiz__conference_id=conference_id, quiz__is_active=True)
+               .values_list('id', flat=True))
+    return choose(get_state(user_id, CONFERENCE), ids, set(ids), count)
+
+
+def choose(state, ids, id_set, count, now=None):
+    """
+    Pick up to count of the questions in ids (with id_set holding the same
+    ids): due ones weighted toward the low boxes, then unseen ones, then
+    the rest, weakest and soonest due first.
+    """
+    now = time.time() if now is None else now
+    count = min(count, len(ids))
+    chosen = {}  # An ordered set
+    due = state.due_counts(now)
+    draws = count * DRAWS_PER_QUESTION
+    _add_due(state, due, id_set, chosen, count - round(count * NEW_SHARE), draws)
+    _add_unseen(state, ids, chosen, count, draws)
+    _add_due(state, due, id_set, chosen, count, draws)  # Short of unseen questions
+
+    if len(chosen) < count:
+        # Random draws missed, which only happens once nearly every
+        # question is seen or the user's history is mostly elsewhere
+        for question_id in ids:
+            if len(chosen) >= count:
+                break
+            if question_id not in chosen and not state.has_seen(question_id):
+                chosen[question_id] = None
+        for box_ids in state.due_ids:
+            for question_id in box_ids:
+                if len(chosen) >= count:
+                    break
+                if question_id in id_set:
+                    chosen.setdefault(question_id)
+
+    chosen = list(chosen)
+    random.shuffle(chosen)
+    return chosen
+
+
+def get_state(user_id, source):
+    key = _cache_key(user_id, source)
+    state = cache.get(key)
+    if state is None:
+        state = State(
+            (question_id, box, due_at.timestamp())
+            for question_id, box, due_at in QuestionMastery.objects.filter(
+                user_id=user_id, source=source
+            ).values_list('question_id', 'box', 'due_at')
+        )
+        cache.set(key, state, STATE_TIMEOUT)
+    return state
+
+
+def record_answers(user_id, source, answers):
+    """
+    Move answered questions between boxes, reading and writing their rows
+    in one transaction.
+
+    :param answers: An iterable of (question id, is correct, answered at)
+                    tuples.
+    """
+    answers = sorted(answers, key=lambda answer: answer[2])
+    if not answers:
+        return
+    with transaction.atomic(savepoint=False):
+        rows = _read_rows(user_id, source, {question_id for question_id, _, _ in answers})
+        before = {question_id: (row.box, row.due_at.timestamp()) for question_id, row in rows.items()}
+        for question_id, is_correct, answered_at in answers:
+            row = rows.get(question_id)
+            if row is None:
+                row = rows[question_id] = QuestionMastery(user_id=user_id, source=source, question_id=question_id)
+            row.box = min(row.box + 1, len(BOX_INTERVALS) - 1) if is_correct else 0
+            row.due_at = answered_at + timedelta(seconds=BOX_INTERVALS[row.box])
+            row.answer_count += 1
+            row.correct_count += is_correct
+            row.last_seen_at = answered_at
+        QuestionMastery.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=['user', 'source', 'question_id'],
+            update_fields=['box', 'due_at', 'answer_count', 'correct_count', 'last_seen_at'],
+        )
+    changes = {
+        question_id: (before.get(question_id), (row.box, row.due_at.timestamp()))
+        for question_id, row in rows.items()
+    }
+    transaction.on_commit(partial(_update_state, user_id, source, changes))
+
+
+def record_attempt_answers(user_id, attempt_answers):
+    """
+    Record the general questions a user answered in a quiz attempt, from
+    their AttemptAnswer rows. Skipped questions are left as they were.
+    """
+    record_answers(user_id, GENERAL, [
+        (answer.question_id, answer.is_correct, answer.answered_at)
+        for answer in attempt_answers
+        if answer.question_id is not None and answer.answer_id is not None
+    ])
+
+
+def record_user_answers(user_answers):
+    """
+    Record conference questions answered, from saved UserAnswer rows.
+    """
+    answers = defaultdict(list)
+    for answer in user_answers:
+        answers[answer.user_id].append((answer.question_id, answer.is_correct, answer.answered_at))
+    for user_id, user_answers in answers.items():
+        record_answers(user_id, CONFERENCE, user_answers)
+
+
+def merge_mastery(duplicate_id, original_id):
+    """
+    Fold users' mastery of a general question merged into another into
+    their rows for the question kept: counts add up, and the better box
+    stays with its due time. Call in the merge's transaction.
+    """
+    held = defaultdict(dict)  # User id: question id: row
+    for row in QuestionMastery.objects.filter(source=GENERAL, question_id__in=[duplicate_id, original_id]):
+        held[row.user_id][row.question_id] = row
+    merged = []
+    for user_id, rows in held.items():
+        duplicate = rows.get(duplicate_id)
+        if duplicate is None:
+            continue
+        kept = rows.get(original_id)
+        if kept is None:
+            kept = QuestionMastery(user_id=user_id, source=GENERAL, question_id=original_id, box=duplicate.box,
+                                   due_at=duplicate.due_at, last_seen_at=duplicate.last_seen_at)
+        elif (duplicate.box, kept.due_at) > (kept.box, duplicate.due_at):
+            kept.box, kept.due_at = duplicate.box, duplicate.due_at
+        kept.answer_count += duplicate.answer_count
+        kept.correct_count += duplicate.correct_count
+        kept.last_seen_at = max(kept.last_seen_at, duplicate.last_seen_at)
+        merged.append(kept)
+    if not merged:
+        return
+    QuestionMastery.objects.bulk_create(
+        merged,
+        update_conflicts=True,
+        unique_fields=['user', 'source', 'question_id'],
+        update_fields=['box', 'due_at', 'answer_count', 'correct_count', 'last_seen_at'],
+    )
+    QuestionMastery.objects.filter(source=GENERAL, question_id=duplicate_id).delete()
+    # Cached states are loaded again with the merged rows
+    keys = [_cache_key(row.user_id, GENERAL) for row in merged]
+    transaction.on_commit(partial(cache.delete_many, keys))
+
+
+def _read_rows(user_id, source, question_ids):
+    """
+    The user's rows for question_ids, as unsaved instances to upsert.
+    """
+    return {
+        question_id: QuestionMastery(user_id=user_id, source=source, question_id=question_id, box=box,
+                                     due_at=due_at, answer_count=answer_count, correct_count=correct_count,
+                                     last_seen_at=last_seen_at)
+        for question_id, box, due_at, answer_count, correct_count, last_seen_at in QuestionMastery.objects.filter(
+            user_id=user_id, source=source, question_id__in=question_ids
+        ).values_list('question_id', 'box', 'due_at', 'answer_count', 'correct_count', 'last_seen_at')
+    }
+
+
+def _add_due(state, due, id_set, chosen, target, draws):
+    """
+    Add due questions in id_set to chosen until it holds target questions,
+    drawing a box by its weight and then a due question in it.
+    """
+    weights = [weight * count for weight, count in zip(BOX_WEIGHTS, due)]
+    if sum(due) <= target - len(chosen):
+        # Few enough to take them all
+        for box, count in enumerate(due):
+            for question_id in state.due_ids[box][:count]:
+                if question_id in id_set:
+                    chosen.setdefault(question_id)
+        return
+    boxes = range(len(due))
+    while len(chosen) < target and draws > 0:
+        draws -= 1
+        box = random.choices(boxes, weights)[0]
+        question_id = state.due_ids[box][random.randrange(due[box])]
+        if question_id in id_set:
+            chosen.setdefault(question_id)
+
+
+def _add_unseen(state, ids, chosen, target, draws):
+    while len(chosen) < target and draws > 0:
+        draws -= 1
+        question_id = ids[random.randrange(len(ids))]
+        if not state.has_seen(question_id):
+            chosen.setdefault(question_id)
+
+
+def _update_state(user_id, source, changes):
+    """
+    Apply changes to the user's cached state, if there is one; otherwise
+    it is loaded with them on the next selection.
+    """
+    key = _cache_key(user_id, source)
+    state = cache.get(key)
+    if state is not None:
+        state.update(changes)
+        cache.set(key, state, STATE_TIMEOUT)
+
+
+def _cache_key(user_id, source):
+    return f'adaptive:state:{user_id}:{source}'
@@ -1,5 +1,20 @@
 from django.contrib import admin
-from .models import Question, Answer, UserAnswer, Quiz, Conference, GeneralQuestion, QuizPDF, GeneralAnswer
+from .models import (Question, Answer, UserAnswer, Quiz, Conference, GeneralQuestion, QuizPDF, GeneralAnswer,
+                     ImportJob, QuizAttempt, AttemptAnswer, ItemAnalysis, NearDuplicate, QuestionMastery)
+from . import search
+
+
+class FullTextSearchMixin:
+    """
+    Searches questions through the full-text index (see search.py) instead
+    of scanning their text with LIKE.
+    """
+    search_source = None  # search.GENERAL or search.CONFERENCE
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search.search_terms(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=search.matching_ids(self.search_source, search_term)), False
 
 
 class AnswerInline(admin.TabularInline):
@@ -12,13 +27,14 @@ class AnswerInline(admin.TabularInline):
 
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(FullTextSearchMixin, admin.ModelAdmin):
     """
     Admin for managing questions, with inline answers.
     """
     list_display = ('text', 'quiz',)  # Displays question text and associated quiz
     list_filter = ('quiz',)  # Adds a filter for quizzes
-    search_fields = ('text',)  # Allows searching questions by text
+    search_fields = ('text',)  # Allows searching questions and their answers by text
+    search_source = search.CONFERENCE
     inlines = [AnswerInline]  # Adds the AnswerInline
 
 
@@ -51,13 +67,14 @@ class GeneralAnswerInline(admin.TabularInline):
     readonly_fields = ()  # Add fields here if you want them to be read-only
 
 @admin.register(GeneralQuestion)
-class GeneralQuestionAdmin(admin.ModelAdmin):
+class GeneralQuestionAdmin(FullTextSearchMixin, admin.ModelAdmin):
     """
     Admin for managing general questions.
     """
     list_display = ('text', 'is_active')  # Displays question text and active status
     list_filter = ('is_active',)  # Adds a filter for active status
-    search_fields = ('text',)  # Allows searching general questions by text
+    search_fields = ('text',)  # Allows searching general questions and their answers by text
+    search_source = search.GENERAL
     inlines = [GeneralAnswerInline]  # Includes related GeneralAnswer objects in the admin view
 
 
@@ -71,6 +88,72 @@ class UserAnswerAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'question__text')  # Allows searching by user or question text
 
 
+class AttemptAnswerInline(admin.TabularInline):
+    """
+    Inline for the answers given during a quiz attempt.
+    """
+    model = AttemptAnswer
+    extra = 0
+    fields = ('question', 'answer', 'is_correct', 'answered_at')
+    readonly_fields = fields  # Answers are recorded by the quiz, not edited
+
+
+@admin.register(QuizAttempt)
+class QuizAttemptAdmin(admin.ModelAdmin):
+    """
+    Admin for reviewing general quiz attempts.
+    """
+    list_display = ('user', 'score', 'total', 'started_at', 'deadline', 'finished_at', 'expired')  # Shows timing of each attempt
+    list_filter = ('expired',)  # Adds a filter for attempts that ran out of time
+    search_fields = ('user__username',)  # Allows searching attempts by user
+    inlines = [AttemptAnswerInline]  # Shows the answers given in the attempt
+
+
+@admin.register(ItemAnalysis)
+class ItemAnalysisAdmin(admin.ModelAdmin):
+    """
+    Admin for reading item analysis results. Rows are written by the
+    analyze_items command.
+    """
+    list_display = ('question', 'responses', 'p_value', 'point_biserial', 'computed_at')  # Shows each question's statistics
+    list_filter = ('question__quiz__conference',)  # Adds a filter for conferences
+    search_fields = ('question__text',)  # Allows searching by question text
+    readonly_fields = ('question', 'responses', 'p_value', 'point_biserial', 'distractor_rates', 'computed_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(NearDuplicate)
+class NearDuplicateAdmin(admin.ModelAdmin):
+    """
+    Admin for reviewing near-duplicate general questions. Pairs are found
+    as questions are imported; merge them from the review questions page.
+    """
+    list_display = ('question', 'duplicate_of', 'similarity', 'dismissed', 'found_at')  # Shows each pair and its similarity
+    list_filter = ('dismissed',)  # Adds a filter for dismissed pairs
+    list_select_related = ('question', 'duplicate_of')
+    readonly_fields = ('question', 'duplicate_of', 'similarity', 'found_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(QuestionMastery)
+class QuestionMasteryAdmin(admin.ModelAdmin):
+    """
+    Admin for reading users' adaptive quiz schedules. Rows are written as
+    questions are answered.
+    """
+    list_display = ('user', 'source', 'question_id', 'box', 'due_at', 'answer_count', 'correct_count')  # Shows each schedule
+    list_filter = ('source', 'box')  # Adds filters for the question pool and box
+    search_fields = ('user__username',)  # Allows searching by user
+    readonly_fields = ('user', 'source', 'question_id', 'box', 'due_at', 'answer_count', 'correct_count', 'last_seen_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(QuizPDF)
 class QuizPDFAdmin(admin.ModelAdmin):
     """
@@ -78,3 +161,13 @@ class QuizPDFAdmin(admin.ModelAdmin):
     """
     list_display = ('file', 'uploaded_at')  # Displays file name and upload timestamp
     search_fields = ('file',)  # Allows searching by file name
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    """
+    Admin for monitoring PDF import jobs.
+    """
+    list_display = ('pdf', 'status', 'pages_done', 'total_pages', 'question_count', 'duplicate_count', 'created_at')  # Shows job progress
+    list_filter = ('status',)  # Adds a filter for job status
+    readonly_fields = ('errors',)  # Errors are recorded by the importer
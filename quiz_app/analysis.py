@@ -0,0 +1,137 @@
+"""
+Item analysis of conference quiz questions.
+
+For every question in a conference this computes:
+
+- difficulty (p-value): the share of responses that were correct;
+- discrimination (point-biserial): the correlation between answering the
+  question correctly and the user's share of correct answers on the rest
+  of the conference's questions;
+- distractor rates: the share of responses that picked each answer,
+  including answers nobody picked.
+
+UserAnswer rows are read in chunks into NumPy arrays and every statistic
+is computed with grouped sums (np.bincount), so nothing loops over
+responses in Python. Every response counts, including repeat answers to
+the same question. This module needs NumPy, which the web app itself does
+not; only the analyze_items command imports it.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+
+from .importers import batched
+from .models import Answer, ItemAnalysis, Question, UserAnswer
+
+CHUNK_SIZE = 50000  # UserAnswer rows per fetch
+
+
+def analyze_conference(conference):
+    """
+    Compute item statistics for every question of a conference's quizzes
+    and replace its ItemAnalysis rows.
+
+    :return: The number of questions analysed.
+    """
+    questions = list(Question.objects.filter(quiz__conference=conference).values_list('id', flat=True))
+    responses = load_responses(
+        UserAnswer.objects.filter(question__quiz__conference=conference)
+        .values_list('user_id', 'question_id', 'answer_id', 'is_correct')
+    )
+    stats = item_statistics(responses)
+
+    answers = defaultdict(list)
+    for answer_id, question_id, text, is_correct in (
+        Answer.objects.filter(question__quiz__conference=conference)
+        .order_by('id')
+        .values_list('id', 'question_id', 'text', 'is_correct')
+    ):
+        answers[question_id].append((answer_id, text, is_correct))
+
+    rows = []
+    for question_id in questions:
+        count, p_value, point_biserial = stats['items'].get(question_id, (0, None, None))
+        rows.append(ItemAnalysis(
+            question_id=question_id,
+            responses=count,
+            p_value=p_value,
+            point_biserial=point_biserial,
+            distractor_rates=[
+                {
+                    'answer': answer_id,
+                    'text': text,
+                    'is_correct': is_correct,
+                    'rate': stats['picks'].get(answer_id, 0) / count if count else None,
+                }
+                for answer_id, text, is_correct in answers[question_id]
+            ],
+        ))
+
+    with transaction.atomic():
+        ItemAnalysis.objects.filter(question__quiz__conference=conference).delete()
+        ItemAnalysis.objects.bulk_create(rows)
+    return len(rows)
+
+
+def load_responses(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Read a values_list queryset of (user id, question id, answer id, is
+    correct) into an int64 array with one row per response, chunk_size
+    rows at a time.
+    """
+    chunks = [np.array(chunk, dtype=np.int64) for chunk in batched(queryset.iterator(chunk_size=chunk_size), chunk_size)]
+    return np.concatenate(chunks) if chunks else np.empty((0, 4), dtype=np.int64)
+
+
+def item_statistics(responses):
+    """
+    Compute item statistics from a response array.
+
+    :param responses: An array of (user id, question id, answer id, is
+                      correct) rows, as returned by load_responses().
+    :return: A dict with 'items', mapping question ids to (responses,
+             p-value, point-biserial) tuples, and 'picks', mapping answer
+             ids to how often they were picked. The point-biserial is None
+             when it is undefined, e.g. when everyone got the question right.
+    """
+    if not len(responses):
+        return {'items': {}, 'picks': {}}
+    users, questions, answers, correct = responses.T
+    correct = correct.astype(np.float64)
+
+    # Each user's share of correct answers on their other responses
+    _, user_index = np.unique(users, return_inverse=True)
+    user_correct = np.bincount(user_index, weights=correct)
+    user_count = np.bincount(user_index)
+    others = user_count[user_index] - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rest = (user_correct[user_index] - correct) / others
+
+    question_ids, question_index = np.unique(questions, return_inverse=True)
+    n = np.bincount(question_index)
+    p_values = np.bincount(question_index, weights=correct) / n
+
+    # Point-biserial as a Pearson correlation from grouped sums, over the
+    # responses of users who answered something else too
+    scored = others > 0
+    index, x, y = question_index[scored], correct[scored], rest[scored]
+    size = len(question_ids)
+    m = np.bincount(index, minlength=size)
+    sum_x = np.bincount(index, weights=x, minlength=size)
+    sum_y = np.bincount(index, weights=y, minlength=size)
+    sum_xy = np.bincount(index, weights=x * y, minlength=size)
+    sum_yy = np.bincount(index, weights=y * y, minlength=size)
+    covariance = m * sum_xy - sum_x * sum_y
+    spread = (m * sum_x - sum_x ** 2) * (m * sum_yy - sum_y ** 2)  # x is 0 or 1, so sum(x*x) == sum(x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        point_biserial = np.where(spread > 0, covariance / np.sqrt(spread), np.nan)
+
+    answer_ids, picks = np.unique(answers, return_counts=True)
+    return {
+        'items': {
+            int(question_id): (int(count), float(p_value), float(r) if np.isfinite(r) else None)
+            for question_id, count, p_value, r in zip(question_ids, n, p_values, point_biserial)
+        },
+        'picks': dict(zip(answer_ids.tolist(), picks.tolist())),
+    }
@@ -1,7 +1,16 @@
 # quiz_app/apps.py
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class QuizAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'quiz_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401  Connects the signal receivers
+        if settings.ANSWER_WRITE_BEHIND:
+            # Answers dead processes logged are inserted without waiting for
+            # this one's first submit
+            from . import writebehind
+            writebehind.start()
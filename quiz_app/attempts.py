@@ -0,0 +1,273 @@
+"""
+Quiz attempts and their answers.
+
+Every quiz is a QuizAttempt row; the session only holds its id. Each
+answer is saved as an AttemptAnswer row as it arrives, and a quiz's
+progress (position, score and wrong questions) is read back from those
+rows, one indexed query per step. Only the parts of an attempt that never
+change (its questions, owner and deadline) are cached, so losing the cache
+or serving a quiz from several processes loses no answers.
+
+The deadline of a timed attempt is stored on the row and copied into the
+cached part, so checking it on every answer is a comparison with no query.
+
+Saved answers also move the questions along the user's adaptive schedule
+(adaptive.py) and count toward the overall leaderboard (leaderboard.py).
+
+The functions used while a quiz runs have async twins (a-prefixed) using
+the async cache and ORM, for the async quiz views; both share the same
+progress handling.
+Expired attempts are finalized the next time the user touches the quiz, or
+by the finalize_expired_attempts command for users who never come back;
+nothing relies on the browser polling.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from . import adaptive, leaderboard
+from .forms import QuizPreferenceForm
+from .models import AttemptAnswer, QuizAttempt
+
+TIMER_MINUTES = {int(value) for value, _ in QuizPreferenceForm.TIMER_CHOICES}
+PROGRESS_TIMEOUT = 4 * 60 * 60  # Long enough for any quiz
+
+
+def parse_timer(value):
+    """
+    Minutes from the quiz preferences; anything but a known choice means
+    the quiz is untimed.
+    """
+    try:
+        minutes = int(value)
+    except (TypeError, ValueError):
+        return 0
+    return minutes if minutes in TIMER_MINUTES else 0
+
+
+def start_attempt(user, question_ids, timer_minutes=0):
+    """
+    Record the start of a quiz attempt.
+
+    :return: A tuple of (attempt, progress).
+    """
+    attempt = QuizAttempt.objects.create(**_attempt_fields(user, question_ids, timer_minutes))
+    progress = _new_progress(attempt)
+    _cache_attempt(attempt.id, _attempt_header(attempt))
+    return attempt, progress
+
+
+async def astart_attempt(user, question_ids, timer_minutes=0):
+    attempt = await QuizAttempt.objects.acreate(**_attempt_fields(user, question_ids, timer_minutes))
+    progress = _new_progress(attempt)
+    await _acache_attempt(attempt.id, _attempt_header(attempt))
+    return attempt, progress
+
+
+def get_progress(attempt_id):
+    attempt = cache.get(_cache_key(attempt_id))
+    if attempt is None:
+        attempt = _attempt_header(QuizAttempt.objects.get(id=attempt_id))
+        _cache_attempt(attempt_id, attempt)
+    return _progress(attempt, list(_saved_answers(attempt_id)))
+
+
+async def aget_progress(attempt_id):
+    attempt = await cache.aget(_cache_key(attempt_id))
+    if attempt is None:
+        attempt = _attempt_header(await QuizAttempt.objects.aget(id=attempt_id))
+        await _acache_attempt(attempt_id, attempt)
+    return _progress(attempt, [answer async for answer in _saved_answers(attempt_id)])
+
+
+def record_answer(attempt_id, progress, question_id, answer_id, is_correct):
+    """
+    Save an answer and move the attempt on to the next question.
+    """
+    save_answers(attempt_id, progress['user'], [(question_id, answer_id, is_correct, time.time())])
+    _advance(progress, question_id, is_correct)
+
+
+async def arecord_answer(attempt_id, progress, question_id, answer_id, is_correct):
+    await asave_answers(attempt_id, progress['user'], [(question_id, answer_id, is_correct, time.time())])
+    _advance(progress, question_id, is_correct)
+
+
+def save_answers(attempt_id, user_id, answers):
+    """
+    Write answers as AttemptAnswer rows with a single bulk insert and
+    record them in the user's mastery and score.
+
+    :param answers: An iterable of (question id, answer id, is correct,
+                    answered at as a Unix timestamp) tuples.
+    """
+    rows = AttemptAnswer.objects.bulk_create(_answer_rows(attempt_id, answers))
+    _record_answers(user_id, rows)
+
+
+async def asave_answers(attempt_id, user_id, answers):
+    rows = await AttemptAnswer.objects.abulk_create(_answer_rows(attempt_id, answers))
+    await sync_to_async(_record_answers)(user_id, rows)
+
+
+def is_expired(deadline, grace=True):
+    """
+    Whether a deadline has passed. With grace, QUIZ_TIMER_GRACE_SECONDS are
+    allowed for answers that were in flight when time ran out; pages
+    requested after the deadline get none.
+    """
+    grace_seconds = settings.QUIZ_TIMER_GRACE_SECONDS if grace else 0
+    return deadline is not None and time.time() > deadline + grace_seconds
+
+
+def claim_attempt(attempt_id, expired=False):
+    """
+    Mark an unfinished attempt finished with a conditional UPDATE, so that
+    only one submission grades it.
+
+    :return: Whether this call claimed it; False if it was already finished
+             by an earlier submission or the sweeper.
+    """
+    return QuizAttempt.objects.filter(id=attempt_id, finished_at__isnull=True).update(**_claim_fields(expired)) == 1
+
+
+async def aclaim_attempt(attempt_id, expired=False):
+    return await QuizAttempt.objects.filter(id=attempt_id, finished_at__isnull=True).aupdate(
+        **_claim_fields(expired)
+    ) == 1
+
+
+def finalize_attempt(attempt_id, progress=None, expired=False):
+    """
+    Score the attempt from its saved answers. If the sweeper already closed
+    the attempt its finish time is kept and the score brought up to date.
+    """
+    if progress is not None:
+        cache.delete(_cache_key(attempt_id))
+    QuizAttempt.objects.filter(id=attempt_id).update(**_finish_fields(expired))
+
+
+async def afinalize_attempt(attempt_id, progress=None, expired=False):
+    if progress is not None:
+        await cache.adelete(_cache_key(attempt_id))
+    await QuizAttempt.objects.filter(id=attempt_id).aupdate(**_finish_fields(expired))
+
+
+def finalize_expired_attempts():
+    """
+    Close and score every unfinished attempt whose deadline (plus grace)
+    has passed, in a single UPDATE.
+
+    :return: The number of attempts closed.
+    """
+    cutoff = now() - timedelta(seconds=settings.QUIZ_TIMER_GRACE_SECONDS)
+    return QuizAttempt.objects.filter(finished_at__isnull=True, deadline__lt=cutoff).update(
+        score=_correct_count(),
+        finished_at=F('deadline'),
+        expired=True,
+    )
+
+
+def _correct_count():
+    correct = (
+        AttemptAnswer.objects.filter(attempt=OuterRef('pk'), is_correct=True)
+        .values('attempt')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(correct), Value(0))
+
+
+def _attempt_fields(user, question_ids, timer_minutes):
+    deadline = now() + timedelta(minutes=timer_minutes) if timer_minutes else None
+    return {'user': user, 'question_ids': question_ids, 'total': len(question_ids), 'deadline': deadline}
+
+
+def _new_progress(attempt):
+    return _progress(_attempt_header(attempt), [])
+
+
+def _attempt_header(attempt):
+    """
+    The parts of an attempt that never change, as cached.
+    """
+    return {
+        'user': attempt.user_id,
+        'questions': attempt.question_ids,
+        'deadline': attempt.deadline.timestamp() if attempt.deadline else None,
+    }
+
+
+def _saved_answers(attempt_id):
+    return AttemptAnswer.objects.filter(attempt_id=attempt_id).order_by('id').values_list('question_id', 'is_correct')
+
+
+def _progress(attempt, answers):
+    return {
+        **attempt,
+        'index': len(answers),
+        'score': sum(is_correct for _, is_correct in answers),
+        'wrong': [question_id for question_id, is_correct in answers if not is_correct],
+    }
+
+
+def _advance(progress, question_id, is_correct):
+    progress['index'] += 1
+    if is_correct:
+        progress['score'] += 1
+    else:
+        progress['wrong'].append(question_id)
+
+
+def _record_answers(user_id, rows):
+    if all(row.answer_id is None and not row.is_correct for row in rows):
+        return  # Skipped questions change neither
+    with transaction.atomic():
+        adaptive.record_attempt_answers(user_id, rows)
+        leaderboard.record_attempt_answers(user_id, rows)
+
+
+def _answer_rows(attempt_id, answers):
+    return [
+        AttemptAnswer(
+            attempt_id=attempt_id,
+            question_id=question_id,
+            answer_id=answer_id,
+            is_correct=is_correct,
+            answered_at=datetime.fromtimestamp(answered_at, tz=timezone.utc),
+        )
+        for question_id, answer_id, is_correct, answered_at in answers
+    ]
+
+
+def _claim_fields(expired):
+    fields = {'finished_at': now()}
+    if expired:
+        fields['expired'] = True
+    return fields
+
+
+def _finish_fields(expired):
+    fields = {'score': _correct_count(), 'finished_at': Coalesce(F('finished_at'), now())}
+    if expired:
+        fields['expired'] = True
+    return fields
+
+
+def _cache_attempt(attempt_id, attempt):
+    cache.set(_cache_key(attempt_id), attempt, PROGRESS_TIMEOUT)
+
+
+async def _acache_attempt(attempt_id, attempt):
+    await cache.aset(_cache_key(attempt_id), attempt, PROGRESS_TIMEOUT)
+
+
+def _cache_key(attempt_id):
+    return f'quiz:attempt:{attempt_id}'
@@ -0,0 +1,289 @@
+"""
+Query-count, latency and memory benchmark of every quiz_app route.
+
+seed() fills the database with a synthetic dataset, run() drives each
+route through the test client and measures it, and compare() checks the
+results against a stored baseline. The benchmark command runs all three
+against a throwaway test database.
+
+Query counts are compared exactly: a view that starts issuing a query per
+row (an N+1) shows up as a higher count at any dataset size. Latency and
+memory are compared with a tolerance, since they depend on the machine.
+"""
+import json
+import random
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+
+from .importers import batched
+from .metrics import percentile
+from .models import (Answer, Conference, GeneralAnswer, GeneralQuestion, ImportJob, Question, Quiz, QuizPDF,
+                     UserAnswer)
+from .sampling import invalidate_active_ids
+from .leaderboard import rebuild_leaderboard
+from .stats import rebuild_stats
+
+SEED_BATCH_SIZE = 10000
+
+
+@dataclass
+class Dataset:
+    """
+    Sizes of the synthetic dataset. The defaults are roughly a season of
+    real use.
+    """
+    general_questions: int = 5000
+    conferences: int = 30
+    quizzes_per_conference: int = 5
+    questions_per_quiz: int = 20
+    users: int = 2000
+    user_answers: int = 1000000
+    seed: int = 0
+
+
+@dataclass
+class Fixtures:
+    """
+    Rows of the seeded dataset that the benchmark cases point at.
+    """
+    admin: User
+    conference: Conference
+    quiz: Quiz
+    question: Question
+    answer: Answer
+    job: ImportJob
+
+
+@dataclass
+class Case:
+    """
+    One request to measure. prepare(client) runs before each request,
+    outside the measurement, to put the session in the state the request
+    needs.
+    """
+    name: str  # URL name from quiz_app/urls.py
+    path: str
+    method: str = 'get'
+    data: dict = field(default_factory=dict)
+    content_type: str = None
+    anonymous: bool = False
+    prepare: object = None
+
+
+def seed(dataset=None):
+    """
+    Fill the database with a synthetic dataset, using bulk inserts.
+
+    :return: Fixtures for the benchmark cases.
+    """
+    dataset = dataset or Dataset()
+    rng = random.Random(dataset.seed)
+    with transaction.atomic():
+        admin = User.objects.create_superuser('benchmark', password='benchmark')
+        User.objects.bulk_create(
+            [User(username=f'official{i}') for i in range(dataset.users)], batch_size=SEED_BATCH_SIZE
+        )
+        user_ids = list(User.objects.values_list('id', flat=True))
+
+        questions = GeneralQuestion.objects.bulk_create(
+            [GeneralQuestion(text=f"General question {i}", is_active=i % 10 != 0) for i in range(dataset.general_questions)],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        GeneralAnswer.objects.bulk_create(
+            [GeneralAnswer(question=question, text=f"Answer {n}", is_correct=n == 0)
+             for question in questions for n in range(4)],
+            batch_size=SEED_BATCH_SIZE,
+        )
+
+        conferences = Conference.objects.bulk_create([Conference(name=f"Conference {i}") for i in range(dataset.conferences)])
+        for conference in conferences:
+            conference.admins.add(admin)
+            conference.members.add(*rng.sample(user_ids, min(50, len(user_ids))))
+        quizzes = Quiz.objects.bulk_create([
+            Quiz(conference=conference, title=f"{conference.name} week {n}", creator=admin)
+            for conference in conferences for n in range(dataset.quizzes_per_conference)
+        ])
+        conference_questions = Question.objects.bulk_create(
+            [Question(quiz=quiz, text=f"{quiz.title} question {n}")
+             for quiz in quizzes for n in range(dataset.questions_per_quiz)],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        answers = Answer.objects.bulk_create(
+            [Answer(question=question, text=f"Answer {n}", is_correct=n == 0)
+             for question in conference_questions for n in range(4)],
+            batch_size=SEED_BATCH_SIZE,
+        )
+
+        # Answers from random users; the first answer of each question is the
+        # correct one, and is picked more often than the others
+        answer_sets = [answers[i:i + 4] for i in range(0, len(answers), 4)]
+        for batch in batched(range(dataset.user_answers), SEED_BATCH_SIZE):
+            rows = []
+            for _ in batch:
+                answer_set = rng.choice(answer_sets)
+                answer = answer_set[0] if rng.random() < 0.5 else rng.choice(answer_set)
+                rows.append(UserAnswer(user_id=rng.choice(user_ids), question_id=answer.question_id,
+                                       answer_id=answer.id, is_correct=answer.is_correct))
+            UserAnswer.objects.bulk_create(rows)
+
+        pdf = QuizPDF.objects.create(file='quiz_pdfs/benchmark.pdf', sha256='0' * 64)
+        job = ImportJob.objects.create(pdf=pdf, created_by=admin, status=ImportJob.DONE, total_pages=8, pages_done=8)
+    rebuild_stats()  # bulk_create doesn't send the signals that keep the totals
+    rebuild_leaderboard()
+    invalidate_active_ids()
+    return Fixtures(admin=admin, conference=conferences[0], quiz=quizzes[0], question=conference_questions[0],
+                    answer=answers[0], job=job)
+
+
+def cases(fixtures):
+    """
+    The requests to measure, covering every route in quiz_app/urls.py.
+    """
+    def start_quiz(client):
+        client.get('/quiz/?num_questions=10')
+
+    def start_play(client):
+        client.get('/quiz/play/?num_questions=10')
+
+    return [
+        Case('home', '/'),
+        Case('signup', '/signup/', anonymous=True),
+        Case('login', '/login/', anonymous=True),
+        Case('logout', '/logout/'),
+        Case('edit_profile', '/edit_profile/'),
+        Case('quiz', '/quiz/?num_questions=10'),
+        Case('quiz', '/quiz/', method='post', data={'answer': ''}, prepare=start_quiz),
+        Case('quiz_play', '/quiz/play/?num_questions=10'),
+        Case('quiz_preferences', '/quiz/preferences/'),
+        Case('submit_quiz', '/quiz/submit/', method='post', data={'responses': {}},
+             content_type='application/json', prepare=start_play),
+        Case('answer_question', f'/quiz/{fixtures.question.id}/answer/', method='post',
+             data={'answer': fixtures.answer.id}),
+        Case('conference_quiz', f'/conference/{fixtures.conference.id}/quiz/'),
+        Case('create_quiz', '/create_quiz/'),
+        Case('edit_quiz', f'/edit_quiz/{fixtures.quiz.id}/'),
+        Case('add_answers', f'/add_answers/{fixtures.question.id}/'),
+        Case('stats', f'/stats/{fixtures.conference.id}/'),
+        Case('conference_home', '/conference/'),
+        Case('manage_conferences', '/manage_conferences/'),
+        Case('upload_pdf', '/upload_pdf/'),
+        Case('import_status', f'/upload_pdf/jobs/{fixtures.job.id}/'),
+        Case('request_metrics', '/metrics/'),
+        Case('review_questions', '/review_questions/'),
+        Case('feedback', '/feedback/'),
+        Case('leaderboard', '/leaderboard/'),
+        Case('conference_leaderboard', f'/leaderboard/{fixtures.conference.id}/'),
+        Case('search_questions', f'/search/{fixtures.conference.id}/', data={'q': 'question 1'}),
+        Case('create_conference_quiz', f'/create_conference_quiz/{fixtures.conference.id}/'),
+        Case('close_quiz', f'/close_quiz/{fixtures.quiz.id}/'),
+        Case('release_quiz_questions', f'/release_quiz_questions/{fixtures.quiz.id}/'),
+    ]
+
+
+def uncovered_routes(benchmark_cases):
+    """
+    Names of quiz_app routes that no case requests.
+    """
+    names = {pattern.name for pattern in get_resolver('quiz_app.urls').url_patterns}
+    return sorted(names - {case.name for case in benchmark_cases})
+
+
+def run(fixtures, benchmark_cases, repeat=20):
+    """
+    Measure each case.
+
+    :return: A dict mapping "<method> <name>" to the status code, the most
+             queries any request issued, p50 and p95 latency in
+             milliseconds, and the peak memory allocated by one request in
+             KiB (measured in a separate, traced request).
+    """
+    cache.clear()
+    results = {}
+    for case in benchmark_cases:
+        statuses = set()
+        queries = 0
+        timings = []
+        for _ in range(repeat):
+            client = _client(fixtures, case)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = _request(client, case)
+                timings.append((time.perf_counter() - started) * 1000)
+            statuses.add(response.status_code)
+            queries = max(queries, len(captured))
+
+        client = _client(fixtures, case)
+        tracemalloc.start()
+        try:
+            _request(client, case)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        results[f'{case.method.upper()} {case.name}'] = {
+            'status': sorted(statuses),
+            'queries': queries,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'peak_kib': round(peak / 1024, 1),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance=0.5):
+    """
+    Compare results with a baseline from an earlier run.
+
+    :param tolerance: How much slower or hungrier than the baseline a route
+                      may be, as a fraction, e.g. 0.5 for 50%.
+    :return: A list of regressions, as messages. Any change of status code
+             is one, as is any extra query.
+    """
+    regressions = []
+    for route, result in results.items():
+        expected = baseline.get(route)
+        if expected is None:
+            continue  # New route; it becomes part of the next saved baseline
+        if result['status'] != expected['status']:
+            regressions.append(f"{route}: status {result['status']}, baseline {expected['status']}")
+        if result['queries'] > expected['queries']:
+            regressions.append(f"{route}: {result['queries']} queries, baseline {expected['queries']}")
+        for metric in ('p95_ms', 'peak_kib'):
+            if result[metric] > expected[metric] * (1 + tolerance):
+                regressions.append(f"{route}: {metric} {result[metric]}, baseline {expected[metric]}")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, dataset, results):
+    with open(path, 'w') as file:
+        json.dump({'dataset': asdict(dataset), 'routes': results}, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def _client(fixtures, case):
+    client = Client(raise_request_exception=False)
+    if not case.anonymous:
+        client.force_login(fixtures.admin)
+    if case.prepare:
+        case.prepare(client)
+    return client
+
+
+def _request(client, case):
+    kwargs = {'content_type': case.content_type} if case.content_type else {}
+    return getattr(client, case.method)(case.path, case.data, **kwargs)
+
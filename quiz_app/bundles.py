@@ -0,0 +1,79 @@
+"""
+Cached bundles holding every question and answer of a running quiz.
+
+A bundle is fetched with one prefetch when the quiz starts and stored in
+the cache under the id of the quiz attempt, so showing and checking each
+question needs no database queries. If the cache entry is lost the
+bundle is simply fetched again. The a-prefixed functions are the async
+equivalents, for the async quiz views.
+"""
+from django.core.cache import cache
+
+from .models import GeneralQuestion
+
+BUNDLE_TIMEOUT = 4 * 60 * 60  # Long enough for any quiz
+
+
+def build_bundle(question_ids):
+    """
+    Fetch questions and their answers in two queries.
+
+    :return: A dict of question id to {'id', 'text', 'answers'}, where
+             answers is a list of {'id', 'text', 'is_correct'} dicts.
+    """
+    return {question.id: _bundle_entry(question) for question in _questions(question_ids)}
+
+
+async def abuild_bundle(question_ids):
+    return {question.id: _bundle_entry(question) async for question in _questions(question_ids)}
+
+
+def store_bundle(key, bundle):
+    cache.set(_cache_key(key), bundle, BUNDLE_TIMEOUT)
+
+
+def get_bundle(key, question_ids):
+    bundle = cache.get(_cache_key(key))
+    if bundle is None:
+        bundle = build_bundle(question_ids)
+        cache.set(_cache_key(key), bundle, BUNDLE_TIMEOUT)
+    return bundle
+
+
+async def aget_bundle(key, question_ids):
+    bundle = await cache.aget(_cache_key(key))
+    if bundle is None:
+        bundle = await abuild_bundle(question_ids)
+        await cache.aset(_cache_key(key), bundle, BUNDLE_TIMEOUT)
+    return bundle
+
+
+async def astore_bundle(key, bundle):
+    await cache.aset(_cache_key(key), bundle, BUNDLE_TIMEOUT)
+
+
+def delete_bundle(key):
+    cache.delete(_cache_key(key))
+
+
+async def adelete_bundle(key):
+    await cache.adelete(_cache_key(key))
+
+
+def _questions(question_ids):
+    return GeneralQuestion.objects.filter(id__in=question_ids).prefetch_related('answers')
+
+
+def _bundle_entry(question):
+    return {
+        'id': question.id,
+        'text': question.text,
+        'answers': [
+            {'id': answer.id, 'text': answer.text, 'is_correct': answer.is_correct}
+            for answer in question.answers.all()
+        ],
+    }
+
+
+def _cache_key(key):
+    return f'quiz:bundle:{key}'
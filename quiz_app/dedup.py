@@ -0,0 +1,38 @@
+"""
+Helpers for recognising questions and files that have already been imported.
+"""
+import hashlib
+import re
+import unicodedata
+
+LEADING_NUMBER_RE = re.compile(r"^(?:q\s*)?\d+[.):]?\s+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    Normalize question or answer text for comparison: unify unicode forms,
+    ignore case and runs of whitespace, and drop a leading question number
+    such as "Q12" or "12.".
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = WHITESPACE_RE.sub(" ", text).strip()
+    return LEADING_NUMBER_RE.sub("", text)
+
+
+def content_hash(text):
+    """
+    SHA-256 hex digest of the normalized text.
+    """
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def file_sha256(file):
+    """
+    SHA-256 hex digest of an uploaded or stored Django file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
@@ -16,6 +16,8 @@ class QuizPreferenceForm(forms.Form):
     ]
     num_questions = forms.ChoiceField(choices=NUM_QUESTIONS_CHOICES, initial=10, label="Number of Questions")
     timer = forms.ChoiceField(choices=TIMER_CHOICES, initial=20, label="Timer Duration")
+    single_page = forms.BooleanField(required=False, label="All questions on one page")
+    adaptive = forms.BooleanField(required=False, label="Focus on questions I miss or am due to review")
 
 
 class AnswerForm(forms.Form):
@@ -0,0 +1,71 @@
+"""
+Version keys for cached conference list fragments and conference roles.
+
+Templates cache their conference lists with {% cache %}, varied on a key
+from this module. The key is built from version tokens kept in the cache:
+
+- one for conferences themselves (names, logos, added or deleted);
+- one for conference rosters, i.e. who admins which conference;
+- one per user, for the conferences that user admins or belongs to.
+
+Signals bump the tokens when conferences or their admins/members change
+(see signals.py), which retires every fragment built from the old state.
+The per-user token also versions cached conference roles (permissions.py).
+Looking a key up costs a cache read and no queries, and the lists are
+only queried when their fragment has to be rendered again.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+CONFERENCES_KEY = 'fragments:conferences'
+ROSTERS_KEY = 'fragments:rosters'
+FRAGMENT_TIMEOUT = 60 * 60  # Fragments are retired by version; this only bounds their memory
+
+
+def user_key(user_id):
+    return f'fragments:user:{user_id}'
+
+
+def conference_list_key(user):
+    """
+    Vary-on key for a user's conference lists. Superusers see every
+    conference and share one key; everyone else gets their own.
+    """
+    if user.is_superuser:
+        return f'superuser.{versions(CONFERENCES_KEY)}'
+    return f'user{user.id}.{versions(CONFERENCES_KEY, user_key(user.id))}'
+
+
+def roster_key():
+    """
+    Vary-on key for lists of conferences with their admins.
+    """
+    return versions(CONFERENCES_KEY, ROSTERS_KEY)
+
+
+def versions(*keys):
+    """
+    The current tokens of version keys, joined into one string.
+    """
+    tokens = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in tokens}
+    if missing:
+        cache.set_many(missing, None)
+        tokens.update(missing)
+    return '.'.join(tokens[key] for key in keys)
+
+
+def invalidate(*keys):
+    """
+    Retire every fragment built with the given version keys, now and again
+    once the current transaction commits, so a fragment rendered from
+    uncommitted data in between does not survive.
+    """
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def _bump(keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
@@ -0,0 +1,138 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .dedup import content_hash, normalize_text
+from .models import GeneralQuestion, GeneralAnswer
+from .neardup import index_questions
+from .sampling import invalidate_active_ids
+
+
+@dataclass
+class ImportSummary:
+    """
+    Counts of what import_questions() did with each parsed question.
+    """
+    created: int = 0  # New questions
+    duplicates: int = 0  # Already in the pool (or repeated in the import), left alone
+    updated: int = 0  # Already in the pool with different answers, answers replaced
+    answers: int = 0  # Answer rows written
+    near_duplicates: int = 0  # Pairs of new and similar questions, left for review
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_questions(parsed_data, is_active=False, batch_size=None, update_existing=False):
+    """
+    Save parsed questions and their answers as general questions.
+
+    Questions are matched against the pool by the hash of their normalized
+    text, one indexed lookup per batch. Questions already in the pool are
+    counted as duplicates, or with update_existing their answers are
+    brought in line with the import. New questions that nearly match one
+    in the pool are recorded for review (see neardup.py). Rows are written with bulk_create,
+    batch_size questions (and their answers) at a time, all inside a single
+    transaction.
+
+    :param parsed_data: An iterable of (question text, answers) tuples, where
+                        answers is a list of dicts with 'text' and
+                        'is_correct' keys.
+    :return: An ImportSummary.
+    """
+    batch_size = batch_size or settings.QUESTION_IMPORT_BATCH_SIZE
+    summary = ImportSummary()
+    seen = set()
+    with transaction.atomic():
+        for batch in batched(parsed_data, batch_size):
+            hashes = [content_hash(text) for text, _ in batch]
+            # Ordered so the oldest question wins if the pool already has duplicates
+            existing = dict(
+                GeneralQuestion.objects.filter(content_hash__in=hashes)
+                .order_by('-id')
+                .values_list('content_hash', 'id')
+            )
+
+            new = []
+            changed = []
+            for digest, (text, answers) in zip(hashes, batch):
+                if digest in seen:
+                    summary.duplicates += 1
+                elif digest in existing and update_existing:
+                    changed.append((existing[digest], answers))
+                elif digest in existing:
+                    summary.duplicates += 1
+                else:
+                    new.append((digest, text, answers))
+                seen.add(digest)
+
+            questions = GeneralQuestion.objects.bulk_create(
+                [GeneralQuestion(text=text, is_active=is_active, content_hash=digest) for digest, text, _ in new],
+                batch_size=batch_size,
+            )
+            answers = [
+                GeneralAnswer(question=question, text=answer["text"], is_correct=answer["is_correct"])
+                for question, (_, _, question_answers) in zip(questions, new)
+                for answer in question_answers
+            ]
+            GeneralAnswer.objects.bulk_create(answers)
+            summary.created += len(questions)
+            summary.answers += len(answers)
+            summary.near_duplicates += index_questions(questions, replace=False)
+
+            if changed:
+                updated, answer_count = _update_answers(changed)
+                summary.updated += updated
+                summary.duplicates += len(changed) - updated
+                summary.answers += answer_count
+    if is_active and summary.created:
+        invalidate_active_ids()  # bulk_create doesn't send signals
+    return summary
+
+
+def _answer_key(text, is_correct):
+    return normalize_text(text), is_correct
+
+
+def _update_answers(changed):
+    """
+    Bring the answers of existing questions in line with newly parsed ones.
+    A corrected answer key is applied in place; a different set of answers
+    replaces the old one.
+
+    :param changed: A list of (question id, parsed answers) tuples.
+    :return: A tuple of (questions updated, answer rows written).
+    """
+    current = defaultdict(list)
+    for answer in GeneralAnswer.objects.filter(question_id__in=[qid for qid, _ in changed]).order_by('id'):
+        current[answer.question_id].append(answer)
+
+    updated = 0
+    to_update = []
+    to_delete = []
+    to_create = []
+    for question_id, answers in changed:
+        old = current[question_id]
+        if [_answer_key(a.text, a.is_correct) for a in old] == [_answer_key(a["text"], a["is_correct"]) for a in answers]:
+            continue
+        updated += 1
+        if [normalize_text(a.text) for a in old] == [normalize_text(a["text"]) for a in answers]:
+            for answer, parsed in zip(old, answers):
+                answer.is_correct = parsed["is_correct"]
+            to_update.extend(old)
+        else:
+            to_delete.extend(a.id for a in old)
+            to_create.extend(
+                GeneralAnswer(question_id=question_id, text=a["text"], is_correct=a["is_correct"]) for a in answers
+            )
+
+    GeneralAnswer.objects.filter(id__in=to_delete).delete()
+    GeneralAnswer.objects.bulk_update(to_update, ['is_correct'])
+    GeneralAnswer.objects.bulk_create(to_create)
+    return updated, len(to_update) + len(to_create)
@@ -0,0 +1,222 @@
+import logging
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+import django
+import pdfplumber
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .importers import batched, import_questions
+from .models import ImportJob
+from .parsing import iter_lines, iter_questions
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_PER_WORKER = 4  # Several page ranges per worker so one slow range doesn't idle the rest
+
+# Pools are created on first use so that importing this module (e.g. from
+# views.py) never starts worker processes.
+_pool_lock = threading.Lock()
+_page_pool = None
+_job_pool = None
+
+
+def _get_page_pool():
+    """
+    Process pool that extracts text from ranges of PDF pages.
+
+    Workers are spawned rather than forked so they never inherit the web
+    process's database connections, and run django.setup() before accepting
+    work so this module can be imported on the worker side.
+    """
+    global _page_pool
+    with _pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_IMPORT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return _page_pool
+
+
+def _get_job_pool():
+    """
+    Thread pool running one coordinator per import job. Coordinators wait
+    on page text from the process pool, parse it and write to the database.
+    """
+    global _job_pool
+    with _pool_lock:
+        if _job_pool is None:
+            _job_pool = ThreadPoolExecutor(
+                max_workers=settings.PDF_IMPORT_CONCURRENT_JOBS,
+                thread_name_prefix='pdf-import',
+            )
+        return _job_pool
+
+
+def start_import(quiz_pdf, user=None):
+    """
+    Create an ImportJob for an uploaded PDF and queue it for processing.
+
+    When PDF_IMPORT_WORKERS is 0 the import runs inline before returning,
+    which is what the tests and single-process setups use.
+    """
+    job = ImportJob.objects.create(pdf=quiz_pdf, created_by=user)
+    if settings.PDF_IMPORT_WORKERS:
+        transaction.on_commit(lambda: _get_job_pool().submit(_run_in_background, job.id))
+    else:
+        run_import(job.id)
+        job.refresh_from_db()
+    return job
+
+
+def _run_in_background(job_id):
+    try:
+        run_import(job_id)
+    except Exception:
+        logger.exception(f"Import job {job_id} crashed")
+        _update(job_id, status=ImportJob.FAILED, finished_at=now())
+    finally:
+        # Connections are per thread; don't leave this one open in the pool.
+        connections.close_all()
+
+
+def run_import(job_id):
+    """
+    Stream the pages of the job's PDF through the parser as one document
+    and save the extracted questions QUESTION_IMPORT_BATCH_SIZE at a time.
+    Page progress is recorded as each range of pages is read and the
+    question counts as each batch is saved, so the job can be polled while
+    it runs, and only one batch of questions is held in memory.
+    """
+    job = ImportJob.objects.select_related('pdf').get(id=job_id)
+    file_path = job.pdf.file.path
+
+    try:
+        total_pages = count_pages(file_path)
+    except Exception as e:
+        logger.error(f"Error opening PDF: {e}")
+        _update(job_id, status=ImportJob.FAILED, errors=[{'page': None, 'error': str(e)}], finished_at=now())
+        return
+    _update(job_id, status=ImportJob.RUNNING, total_pages=total_pages)
+
+    errors = []
+    try:
+        for batch in batched(parse_pages(_page_texts(job_id, file_path, total_pages, errors)),
+                             settings.QUESTION_IMPORT_BATCH_SIZE):
+            # A re-uploaded PDF may carry a corrected answer key
+            summary = import_questions(batch, update_existing=True)
+            _update(
+                job_id,
+                question_count=F('question_count') + summary.created,
+                duplicate_count=F('duplicate_count') + summary.duplicates,
+                updated_count=F('updated_count') + summary.updated,
+                answer_count=F('answer_count') + summary.answers,
+            )
+    except Exception as e:
+        logger.error(f"Error saving parsed PDF: {e}")
+        errors.append({'page': None, 'error': str(e)})
+        _update(job_id, status=ImportJob.FAILED, errors=errors, finished_at=now())
+        return
+
+    # Failed only if every page did; a document without pages is just empty
+    status = ImportJob.FAILED if errors and len(errors) == total_pages else ImportJob.DONE
+    _update(job_id, status=status, finished_at=now())
+
+
+def fail_stale_job(job):
+    """
+    Mark an unfinished job failed if it has made no progress for
+    PDF_IMPORT_STALE_SECONDS, e.g. because the server restarted while it
+    was queued or running. Called when the job is polled.
+
+    :return: Whether the job was marked failed.
+    """
+    cutoff = now() - timedelta(seconds=settings.PDF_IMPORT_STALE_SECONDS)
+    if job.status not in (ImportJob.PENDING, ImportJob.RUNNING) or job.updated_at >= cutoff:
+        return False
+    errors = job.errors + [{'page': None, 'error': "The import stopped making progress and was abandoned."}]
+    # Conditional, in case progress arrived since the job was read
+    return bool(ImportJob.objects.filter(
+        id=job.id, status__in=(ImportJob.PENDING, ImportJob.RUNNING), updated_at__lt=cutoff
+    ).update(status=ImportJob.FAILED, errors=errors, finished_at=now(), updated_at=now()))
+
+
+def _page_texts(job_id, file_path, total_pages, errors):
+    """
+    Yield the text of each page in order, recording page progress and
+    errors on the job as each range of pages is read. Pages that fail to
+    extract are skipped.
+    """
+    for start, stop, result in iter_page_texts(file_path, total_pages):
+        try:
+            texts = result()
+        except Exception as e:
+            logger.error(f"Error extracting PDF pages {start + 1}-{stop}: {e}")
+            errors.extend({'page': n + 1, 'error': str(e)} for n in range(start, stop))
+            texts = []
+        _update(job_id, pages_done=F('pages_done') + (stop - start), errors=errors)
+        yield from texts
+
+
+def _update(job_id, **fields):
+    ImportJob.objects.filter(id=job_id).update(updated_at=now(), **fields)
+
+
+def iter_page_texts(file_path, total_pages):
+    """
+    Yield (start, stop, result) for contiguous ranges of pages, in page
+    order. Calling result() returns the text of each page in the range.
+
+    With PDF_IMPORT_WORKERS set, every range is submitted to the process
+    pool up front and extracted in parallel; otherwise ranges are extracted
+    in this process as they are consumed.
+    """
+    workers = settings.PDF_IMPORT_WORKERS
+    chunks = page_chunks(total_pages, workers)
+    if workers:
+        pool = _get_page_pool()
+        futures = [pool.submit(extract_pages, file_path, start, stop) for start, stop in chunks]
+        for (start, stop), future in zip(chunks, futures):
+            yield start, stop, future.result
+    else:
+        for start, stop in chunks:
+            yield start, stop, partial(extract_pages, file_path, start, stop)
+
+
+def page_chunks(total_pages, workers):
+    """
+    Split page indexes into contiguous (start, stop) ranges.
+    """
+    size = max(1, math.ceil(total_pages / (max(workers, 1) * CHUNKS_PER_WORKER)))
+    return [(start, min(start + size, total_pages)) for start in range(0, total_pages, size)]
+
+
+def count_pages(file_path):
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pages(file_path, start, stop):
+    """
+    Extract the text of pages [start, stop) of a PDF, opening it only once.
+    Runs in a worker process, so it must not touch the database.
+    """
+    with pdfplumber.open(file_path) as pdf:
+        return [pdf.pages[n].extract_text() or "" for n in range(start, stop)]
+
+
+def parse_pages(texts):
+    """
+    Parse page texts as one document, so questions and answers that run
+    over a page break are kept together.
+    """
+    return iter_questions(iter_lines(texts))
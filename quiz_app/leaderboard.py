@@ -0,0 +1,322 @@
+"""
+Conference and overall leaderboards.
+
+A user's score is the number of questions they answered correctly: in a
+conference, that conference's quiz questions; overall, every conference
+question plus general quiz questions. Answering a question correctly
+again scores nothing. Scores are LeaderboardEntry rows
+bumped in place with F() expressions as answers are recorded, like the
+stats totals (stats.py), so no request ever aggregates answers.
+
+Each process keeps a Ranking per leaderboard, loaded from its rows on
+first use: a Fenwick tree counting the users at each score, and the users
+holding each score. A user's rank is one prefix sum, and the top K a
+descent of the tree per distinct score listed, so both take O(log n) in
+the highest score. The process applies the answers it records to its
+rankings as they commit, and reloads a ranking from the rows once it is
+MAX_AGE seconds old to pick up other processes' answers. One request
+reloads a stale ranking while the others keep using it, so an expiring
+board never sends every request to the table at once. The rows are the
+persisted snapshot: after a restart each leaderboard is one query away.
+
+A user's new points go to all their leaderboards in one UPDATE, joining
+the transaction of the answer's other totals. Only a user's first points
+on a leaderboard create its row. Outside SQLite, two first answers of the
+same user at once can lose a point that way.
+
+Run the rebuild_leaderboard command to recompute the rows from the saved
+answers after bulk changes.
+"""
+import heapq
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import AttemptAnswer, LeaderboardEntry, Question, UserAnswer
+from .stats import increment
+
+MAX_AGE = 30  # Seconds before a ranking is reloaded to include other processes' answers
+REBUILD_BATCH_SIZE = 1000  # Rows per bulk insert when rebuilding
+
+_lock = threading.Lock()
+_rankings = {}  # Conference id, or None for overall: (ranking, time loaded)
+_reload_locks = defaultdict(threading.Lock)  # Conference id: held while that ranking is reloaded
+
+
+class Ranking:
+    """
+    Users' scores on one leaderboard, indexed for ranks and top lists.
+    Users without a point aren't ranked.
+    """
+
+    def __init__(self, scores=()):
+        """
+        :param scores: (user id, score) pairs.
+        """
+        self.scores = {}  # User id: score
+        self.holders = defaultdict(set)  # Score: user ids
+        self.size = 64  # Highest score the tree holds, a power of two
+        self.tree = [0] * (self.size + 1)  # 1-based Fenwick tree of users per score
+        for user_id, score in scores:
+            self.set(user_id, score)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, user_id, points):
+        self.set(user_id, self.scores.get(user_id, 0) + points)
+
+    def set(self, user_id, score):
+        old = self.scores.pop(user_id, 0)
+        if old:
+            self._update(old, -1)
+            self.holders[old].discard(user_id)
+            if not self.holders[old]:
+                del self.holders[old]
+        if score > 0:
+            if score > self.size:
+                self._grow(score)
+            self._update(score, 1)
+            self.scores[user_id] = score
+            self.holders[score].add(user_id)
+
+    def rank(self, user_id):
+        """
+        :return: A tuple of (rank, score), or None for an unranked user.
+                 Users with the same score share a rank.
+        """
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return len(self.scores) - self._at_most(score) + 1, score
+
+    def top(self, count):
+        """
+        :return: A list of (rank, user id, score) tuples for the best count
+                 users; users with the same score in id order.
+        """
+        results = []
+        while len(results) < min(count, len(self.scores)):
+            # The next best user is this far from the bottom of the board
+            score = self._score_at(len(self.scores) - len(results))
+            rank = len(results) + 1
+            results += [(rank, user_id, score)
+                        for user_id in heapq.nsmallest(count - len(results), self.holders[score])]
+        return results
+
+    def _update(self, score, delta):
+        while score <= self.size:
+            self.tree[score] += delta
+            score += score & -score
+
+    def _at_most(self, score):
+        """
+        The number of users with this score or less.
+        """
+        count = 0
+        while score > 0:
+            count += self.tree[score]
+            score -= score & -score
+        return count
+
+    def _score_at(self, position):
+        """
+        The score of the user at position (from 1) when users are ordered
+        from the lowest score up.
+        """
+        index = 0
+        step = self.size
+        while step:
+            if self.tree[index + step] < position:
+                index += step
+                position -= self.tree[index]
+            step //= 2
+        return index + 1
+
+    def _grow(self, score):
+        while self.size < score:
+            self.size *= 2
+        self.tree = [0] * (self.size + 1)
+        for held, users in self.holders.items():
+            self.tree[held] = len(users)
+        for index in range(1, self.size + 1):
+            parent = index + (index & -index)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[index]
+
+
+def top(count, conference_id=None):
+    """
+    The best count users of a conference's leaderboard, or of the overall
+    one, as (rank, user id, score) tuples.
+    """
+    ranking = _get_ranking(conference_id)
+    with _lock:
+        return ranking.top(count)
+
+
+def rank(user_id, conference_id=None):
+    """
+    A user's (rank, score) on a conference's leaderboard, or on the overall
+    one; None if they haven't scored.
+    """
+    ranking = _get_ranking(conference_id)
+    with _lock:
+        return ranking.rank(user_id)
+
+
+def add_points(points):
+    """
+    Add to users' scores.
+
+    :param points: A dict of (conference id or None for overall, user id)
+                   to the points to add.
+    """
+    points = {key: count for key, count in points.items() if count}
+    if not points:
+        return
+    boards = defaultdict(list)  # (user id, points): conference ids, None for overall
+    for (conference_id, user_id), count in points.items():
+        boards[user_id, count].append(conference_id)
+    with transaction.atomic(savepoint=False):
+        for (user_id, count), conference_ids in boards.items():
+            _add_score(user_id, conference_ids, count)
+    transaction.on_commit(partial(_apply, points))
+
+
+def record_user_answers(user_answers):
+    """
+    Score saved UserAnswer rows on their conference's leaderboard and the
+    overall one.
+
+    Quizzes that are already loaded on the answers are used as is; the
+    conferences of the rest are looked up in one query.
+    """
+    correct = _first_correct(user_answers, UserAnswer.objects.all(), lambda answer: answer.user_id)
+    if not correct:
+        return
+    conferences = {
+        answer.question_id: answer.question.quiz.conference_id
+        for answer in correct
+        if UserAnswer.question.is_cached(answer) and Question.quiz.is_cached(answer.question)
+    }
+    missing = {answer.question_id for answer in correct} - conferences.keys()
+    if missing:
+        conferences.update(Question.objects.filter(id__in=missing).values_list('id', 'quiz__conference_id'))
+    points = Counter()
+    for answer in correct:
+        points[conferences[answer.question_id], answer.user_id] += 1
+        points[None, answer.user_id] += 1
+    add_points(points)
+
+
+def record_attempt_answers(user_id, attempt_answers):
+    """
+    Score saved AttemptAnswer rows of a general quiz on the overall
+    leaderboard.
+    """
+    correct = _first_correct(attempt_answers, AttemptAnswer.objects.all(), lambda answer: user_id,
+                             user_field='attempt__user_id')
+    add_points({(None, user_id): len(correct)})
+
+
+def rebuild_leaderboard():
+    """
+    Recompute every leaderboard from the saved answers.
+    """
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        overall = Counter()
+        entries = []
+        for row in (
+            UserAnswer.objects.filter(is_correct=True)
+            .values('user_id', conference_id=F('question__quiz__conference_id'))
+            .annotate(score=Count('question', distinct=True))
+            .order_by()
+        ):
+            entries.append(LeaderboardEntry(**row))
+            overall[row['user_id']] += row['score']
+        for user_id, score in (
+            AttemptAnswer.objects.filter(is_correct=True)
+            .values_list('attempt__user_id')
+            .annotate(score=Count('question', distinct=True))
+            .order_by()
+        ):
+            overall[user_id] += score
+        entries += [LeaderboardEntry(user_id=user_id, score=score) for user_id, score in overall.items()]
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=REBUILD_BATCH_SIZE)
+    with _lock:
+        _rankings.clear()
+
+
+def _first_correct(answers, saved, user_of, user_field='user_id'):
+    """
+    The correct answers among saved rows that are their user's first correct
+    answer to the question, one per user and question. Earlier ones are
+    looked up in saved, a queryset of the same rows, with one query.
+    """
+    firsts = {}
+    for answer in answers:
+        if answer.is_correct and answer.question_id is not None:
+            firsts.setdefault((user_of(answer), answer.question_id), answer)
+    if not firsts:
+        return []
+    earlier = set(
+        saved.filter(**{f'{user_field}__in': {user_id for user_id, _ in firsts}},
+                     question_id__in={question_id for _, question_id in firsts}, is_correct=True)
+        .exclude(id__in=[answer.id for answer in answers])
+        .values_list(user_field, 'question_id')
+    )
+    return [answer for key, answer in firsts.items() if key not in earlier]
+
+
+def _add_score(user_id, conference_ids, points):
+    """
+    Add points to a user's score on each of the leaderboards of
+    conference_ids (None for overall).
+    """
+    boards = Q(conference_id__in=[conference_id for conference_id in conference_ids if conference_id is not None])
+    if None in conference_ids:
+        boards |= Q(conference__isnull=True)
+    entries = LeaderboardEntry.objects.filter(boards, user_id=user_id)
+    if entries.update(score=F('score') + points) == len(conference_ids):
+        return
+    # The user's first points on some of them
+    for conference_id in set(conference_ids) - set(entries.values_list('conference_id', flat=True)):
+        increment(LeaderboardEntry, {'conference_id': conference_id, 'user_id': user_id}, score=points)
+
+
+def _get_ranking(conference_id):
+    with _lock:
+        loaded = _rankings.get(conference_id)
+        reload_lock = _reload_locks[conference_id]
+    if loaded and time.monotonic() - loaded[1] < MAX_AGE:
+        return loaded[0]
+    # Only one caller reloads; while it does, the others keep using a stale
+    # ranking, or wait for it when there is none yet
+    if not reload_lock.acquire(blocking=loaded is None):
+        return loaded[0]
+    try:
+        with _lock:
+            loaded = _rankings.get(conference_id)
+        if loaded and time.monotonic() - loaded[1] < MAX_AGE:
+            return loaded[0]  # Reloaded while this caller waited
+        # Loaded outside _lock so other leaderboards aren't held up
+        ranking = Ranking(LeaderboardEntry.objects.filter(conference_id=conference_id).values_list('user_id', 'score'))
+        with _lock:
+            _rankings[conference_id] = (ranking, time.monotonic())
+        return ranking
+    finally:
+        reload_lock.release()
+
+
+def _apply(points):
+    with _lock:
+        for (conference_id, user_id), count in points.items():
+            loaded = _rankings.get(conference_id)
+            if loaded:
+                loaded[0].add(user_id, count)
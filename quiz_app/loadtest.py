@@ -0,0 +1,80 @@
+"""
+Concurrent answer writes, for measuring how many answers per second the
+database sustains under parallel load.
+
+Each thread saves UserAnswer rows as answer_question does, one autocommit
+insert per answer plus the stats update its signal makes, and counts the
+writes that failed, e.g. with "database is locked". With write_behind,
+threads append to an answer log instead (see writebehind.py) and the time
+includes the final flush that inserts every answer.
+"""
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connections
+from django.utils.timezone import now
+
+from .models import Answer, Conference, Question, Quiz, UserAnswer
+from .writebehind import AnswerLog
+
+
+@dataclass
+class WriteThroughput:
+    threads: int
+    writes: int
+    errors: int
+    seconds: float
+
+    @property
+    def per_second(self):
+        return self.writes / self.seconds if self.seconds else 0.0
+
+
+def write_answers(threads, writes_per_thread, write_behind=False):
+    """
+    Save writes_per_thread answers from each of threads threads at once.
+
+    :return: A WriteThroughput.
+    """
+    quiz = Quiz.objects.create(conference=Conference.objects.create(name="Load test"), title="Load test")
+    questions = [Question.objects.create(quiz=quiz, text=f"Question {n}") for n in range(10)]
+    answers = [Answer.objects.create(question=question, text="Answer", is_correct=n % 2 == 0)
+               for n, question in enumerate(questions)]
+    users = [User.objects.create(username=f'load-{time.time_ns()}-{n}') for n in range(threads)]
+    start = threading.Barrier(threads + 1)
+    directory = tempfile.TemporaryDirectory()
+    log = AnswerLog(directory.name) if write_behind else None
+
+    def worker(user):
+        errors = 0
+        try:
+            start.wait()
+            for n in range(writes_per_thread):
+                answer = answers[n % len(answers)]
+                try:
+                    if log:
+                        log.append({'token': uuid.uuid4().hex, 'user': user.id, 'question': answer.question_id,
+                                    'answer': answer.id, 'correct': answer.is_correct, 'at': now().isoformat()})
+                    else:
+                        UserAnswer.objects.create(user=user, question_id=answer.question_id, answer=answer,
+                                                  is_correct=answer.is_correct)
+                except OperationalError:
+                    errors += 1
+        finally:
+            connections.close_all()
+        return errors
+
+    with directory, ThreadPoolExecutor(threads) as pool:
+        futures = [pool.submit(worker, user) for user in users]
+        start.wait()
+        started = time.perf_counter()
+        errors = sum(future.result() for future in futures)
+        if log:
+            log.flush()
+        elapsed = time.perf_counter() - started
+    return WriteThroughput(threads, threads * writes_per_thread - errors, errors, elapsed)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_app.models import Conference
+
+
+class Command(BaseCommand):
+    help = "Compute difficulty, discrimination and distractor rates for conference quiz questions. Requires NumPy."
+
+    def add_arguments(self, parser):
+        parser.add_argument('conference_ids', nargs='*', type=int, help="Conferences to analyse (default: all)")
+
+    def handle(self, *args, **options):
+        try:
+            from quiz_app.analysis import analyze_conference
+        except ImportError as exc:
+            raise CommandError(f"Item analysis needs NumPy ({exc}).")
+
+        conferences = Conference.objects.order_by('id')
+        if options['conference_ids']:
+            conferences = conferences.filter(id__in=options['conference_ids'])
+        for conference in conferences:
+            count = analyze_conference(conference)
+            self.stdout.write(f"{conference.name}: analysed {count} question(s).")
@@ -0,0 +1,63 @@
+from dataclasses import fields
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from quiz_app import benchmark
+
+BASELINE = Path(benchmark.__file__).with_name('benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset into a throwaway test database, measure every quiz_app route "
+        "(queries, p50/p95 latency, peak memory) and compare against the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        for dataset_field in fields(benchmark.Dataset):
+            parser.add_argument(f"--{dataset_field.name.replace('_', '-')}", type=int, default=dataset_field.default)
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per route")
+        parser.add_argument('--baseline', default=str(BASELINE), help="Baseline JSON file")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="Allowed latency and memory growth over the baseline, as a fraction")
+        parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline")
+
+    def handle(self, *args, **options):
+        dataset = benchmark.Dataset(**{f.name: options[f.name] for f in fields(benchmark.Dataset)})
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            fixtures = benchmark.seed(dataset)
+            cases = benchmark.cases(fixtures)
+            uncovered = benchmark.uncovered_routes(cases)
+            if uncovered:
+                raise CommandError(f"Routes without a benchmark case: {', '.join(uncovered)}")
+            results = benchmark.run(fixtures, cases, repeat=options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'Route':<32} {'Status':>8} {'Queries':>8} {'p50 ms':>9} {'p95 ms':>9} {'Peak KiB':>10}")
+        for route, result in results.items():
+            status = ','.join(map(str, result['status']))
+            self.stdout.write(f"{route:<32} {status:>8} {result['queries']:>8} {result['p50_ms']:>9} "
+                              f"{result['p95_ms']:>9} {result['peak_kib']:>10}")
+
+        if options['save_baseline']:
+            benchmark.save_baseline(options['baseline'], dataset, results)
+            self.stdout.write(f"Saved baseline to {options['baseline']}.")
+            return
+
+        if not Path(options['baseline']).exists():
+            self.stdout.write("No baseline to compare against; run with --save-baseline to create one.")
+            return
+        baseline = benchmark.load_baseline(options['baseline'])
+        if baseline['dataset'] != vars(dataset):
+            self.stdout.write(self.style.WARNING("The baseline was recorded with a different dataset."))
+        regressions = benchmark.compare(results, baseline['routes'], options['tolerance'])
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
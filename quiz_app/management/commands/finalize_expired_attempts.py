@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from quiz_app.attempts import finalize_expired_attempts
+
+
+class Command(BaseCommand):
+    help = "Close timed quiz attempts whose deadline has passed. Run periodically, e.g. from cron."
+
+    def handle(self, *args, **options):
+        count = finalize_expired_attempts()
+        self.stdout.write(f"Finalized {count} expired attempt(s).")
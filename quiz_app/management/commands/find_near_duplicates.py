@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from quiz_app.models import GeneralQuestion
+from quiz_app.neardup import index_questions
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute MinHash signatures for general questions that have none and record their near duplicates "
+        "for review."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Recompute every question's signature")
+
+    def handle(self, *args, **options):
+        questions = GeneralQuestion.objects.only('id', 'text')
+        if not options['rebuild']:
+            questions = questions.filter(signature__isnull=True)
+        questions = list(questions)
+        count = index_questions(questions)
+        self.stdout.write(f"Indexed {len(questions)} question(s); found {count} near-duplicate pair(s).")
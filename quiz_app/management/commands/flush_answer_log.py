@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from quiz_app.writebehind import replay
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert the answers of write-behind log segments left behind by processes that died. "
+        "Segments of running processes are left to them."
+    )
+
+    def handle(self, *args, **options):
+        count = replay()
+        self.stdout.write(f"Inserted {count} logged answer(s).")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from quiz_app.leaderboard import rebuild_leaderboard
+
+
+class Command(BaseCommand):
+    help = "Recompute the conference and overall leaderboards from the saved answers."
+
+    def handle(self, *args, **options):
+        rebuild_leaderboard()
+        self.stdout.write("Rebuilt leaderboards.")
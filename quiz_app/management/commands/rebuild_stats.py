@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from quiz_app.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute conference quiz statistics from the saved user answers."
+
+    def handle(self, *args, **options):
+        rebuild_stats()
+        self.stdout.write("Rebuilt quiz statistics.")
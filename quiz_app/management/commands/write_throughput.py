@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from quiz_app.loadtest import write_answers
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure answer writes per second under parallel load on the configured database engine, "
+        "using a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8, 16], help="Thread counts to try")
+        parser.add_argument('--writes', type=int, default=200, help="Answers saved by each thread")
+        parser.add_argument('--write-behind', action='store_true',
+                            help="Append answers to the write-behind log and time the flush that inserts them")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"{connection.vendor}, {options['writes']} answers per thread")
+            self.stdout.write(f"{'Threads':>8} {'Writes':>8} {'Errors':>8} {'Seconds':>9} {'Writes/s':>9}")
+            for threads in options['threads']:
+                result = write_answers(threads, options['writes'], options['write_behind'])
+                self.stdout.write(f"{result.threads:>8} {result.writes:>8} {result.errors:>8} "
+                                  f"{result.seconds:>9.2f} {result.per_second:>9.1f}")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
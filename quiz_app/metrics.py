@@ -0,0 +1,186 @@
+"""
+Per-request timing and SQL instrumentation.
+
+RequestMetricsMiddleware measures every request's wall time, query count,
+database time, duplicate queries and response size. It logs one JSON line
+per request on the quiz_app.metrics logger and keeps the most recent
+REQUEST_METRICS_WINDOW requests of each URL name in memory, for the
+staff-only request_metrics view. It handles sync and async requests alike.
+
+Queries are observed with connection.execute_wrapper(), so this works with
+DEBUG off. It is opt-in: the middleware removes itself unless the
+REQUEST_METRICS setting is true. The in-memory window is per process.
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('quiz_app.metrics')
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)  # Upper bounds; slower requests go in a last bucket
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting queries, their time, and queries
+    repeated within one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()  # SQL with its parameters
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql, repr(params)] += 1
+
+    @property
+    def duplicates(self):
+        """
+        Queries that repeated an earlier query of the request exactly.
+        """
+        return sum(count - 1 for count in self.statements.values())
+
+    @property
+    def most_repeated(self):
+        """
+        The SQL run most often with any parameters, and how often; a high
+        count is the signature of an N+1.
+        """
+        shapes = Counter()
+        for (sql, _), count in self.statements.items():
+            shapes[sql] += count
+        return shapes.most_common(1)[0] if shapes else (None, 0)
+
+
+class MetricsStore:
+    """
+    The most recent request metrics of each URL name.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._requests = defaultdict(lambda: deque(maxlen=self.window))
+
+    def add(self, name, record):
+        with self._lock:
+            self._requests[name].append(record)
+
+    def clear(self):
+        with self._lock:
+            self._requests.clear()
+
+    def snapshot(self):
+        """
+        Summaries of each URL name's recent requests: count, latency
+        percentiles and histogram, and mean queries, database time and
+        duplicate queries.
+        """
+        with self._lock:
+            requests = {name: list(records) for name, records in self._requests.items()}
+        return {name: _summarize(records) for name, records in sorted(requests.items())}
+
+
+store = MetricsStore(settings.REQUEST_METRICS_WINDOW)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            _wrap_connections(stack, recorder)
+            response = self.get_response(request)
+        self._record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        # An async request's queries run in sync_to_async()'s thread, on that
+        # thread's connections, so the wrappers are installed from there too
+        with ExitStack() as stack:
+            await sync_to_async(_wrap_connections)(stack, recorder)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        self._record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    def _record(self, request, response, recorder, elapsed):
+        match = request.resolver_match
+        name = match.view_name if match else '<unresolved>'
+        sql, repeats = recorder.most_repeated
+        record = {
+            'view': name,
+            'method': request.method,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 2),
+            'queries': recorder.count,
+            'db_ms': round(recorder.time * 1000, 2),
+            'duplicates': recorder.duplicates,
+            'most_repeated': repeats,
+            'bytes': None if response.streaming else len(response.content),
+        }
+        store.add(name, record)
+        # The log line names the query behind a repeat; the window keeps numbers only
+        logger.info(json.dumps({**record, 'most_repeated_sql': sql} if repeats > 1 else record))
+
+
+def _wrap_connections(stack, recorder):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+
+def _summarize(records):
+    latencies = sorted(record['ms'] for record in records)
+    histogram = Counter()
+    for latency in latencies:
+        histogram[next((bound for bound in LATENCY_BUCKETS_MS if latency <= bound), 'slower')] += 1
+    count = len(records)
+    return {
+        'requests': count,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': latencies[-1],
+        'mean_queries': round(sum(record['queries'] for record in records) / count, 1),
+        'mean_db_ms': round(sum(record['db_ms'] for record in records) / count, 2),
+        'duplicate_queries': sum(record['duplicates'] for record in records),
+        'histogram_ms': {str(bound): histogram[bound] for bound in (*LATENCY_BUCKETS_MS, 'slower')},
+    }
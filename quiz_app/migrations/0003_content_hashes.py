@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+from quiz_app.dedup import content_hash, file_sha256
+
+
+def backfill_hashes(apps, schema_editor):
+    GeneralQuestion = apps.get_model('quiz_app', 'GeneralQuestion')
+    QuizPDF = apps.get_model('quiz_app', 'QuizPDF')
+
+    questions = list(GeneralQuestion.objects.only('id', 'text'))
+    for question in questions:
+        question.content_hash = content_hash(question.text)
+    GeneralQuestion.objects.bulk_update(questions, ['content_hash'], batch_size=500)
+
+    for pdf in QuizPDF.objects.all():
+        try:
+            with pdf.file.open('rb') as file:
+                pdf.sha256 = file_sha256(file)
+        except OSError:
+            continue  # File no longer on disk
+        pdf.save(update_fields=['sha256'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0002_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generalquestion',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='duplicate_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='updated_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quizpdf',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0006_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemAnalysis',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analysis', serialize=False, to='quiz_app.question')),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('p_value', models.FloatField(null=True)),
+                ('point_biserial', models.FloatField(null=True)),
+                ('distractor_rates', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'item analyses',
+            },
+        ),
+    ]
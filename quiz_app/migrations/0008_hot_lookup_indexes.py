@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0007_itemanalysis'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generalquestion',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='generalquestion_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generalquestion',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['id'], name='generalquestion_inactive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['conference', 'is_active'], name='quiz_app_qu_confere_97418d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useranswer',
+            index=models.Index(fields=['user', 'answered_at'], name='quiz_app_us_user_id_eec8b5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useranswer',
+            index=models.Index(fields=['question', 'is_correct'], name='quiz_app_us_questio_91a138_idx'),
+        ),
+    ]
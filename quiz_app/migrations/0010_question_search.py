@@ -0,0 +1,172 @@
+"""
+Full-text index over general and conference questions and their answers,
+kept in sync by triggers (see quiz_app/search.py).
+
+Each indexed question has a key of id * 2 for general questions and
+id * 2 + 1 for conference questions. SQLite gets an FTS5 table, PostgreSQL
+a table of weighted tsvectors with a GIN index.
+"""
+from django.db import migrations
+
+SOURCES = (
+    # Question table, answer table, low bit of the key
+    ('quiz_app_generalquestion', 'quiz_app_generalanswer', 0),
+    ('quiz_app_question', 'quiz_app_answer', 1),
+)
+
+
+def sqlite_forwards(questions, answers, parity):
+    key = f'* 2 + {parity}'
+    answer_text = f"coalesce((SELECT group_concat(text, ' ') FROM {answers} WHERE question_id = {{id}}), '')"
+    refresh = (
+        f"UPDATE quiz_app_questionsearch SET answers = {answer_text} WHERE rowid = {{id}} {key};"
+    )
+    return [
+        f"""
+        CREATE TRIGGER {questions}_search_insert AFTER INSERT ON {questions} BEGIN
+            INSERT INTO quiz_app_questionsearch (rowid, question, answers)
+            VALUES (new.id {key}, new.text, {answer_text.format(id='new.id')});
+        END
+        """,
+        f"""
+        CREATE TRIGGER {questions}_search_update AFTER UPDATE OF text ON {questions} BEGIN
+            UPDATE quiz_app_questionsearch SET question = new.text WHERE rowid = new.id {key};
+        END
+        """,
+        f"""
+        CREATE TRIGGER {questions}_search_delete AFTER DELETE ON {questions} BEGIN
+            DELETE FROM quiz_app_questionsearch WHERE rowid = old.id {key};
+        END
+        """,
+        f"""
+        CREATE TRIGGER {answers}_search_insert AFTER INSERT ON {answers} BEGIN
+            {refresh.format(id='new.question_id')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER {answers}_search_update AFTER UPDATE OF text, question_id ON {answers} BEGIN
+            {refresh.format(id='old.question_id')}
+            {refresh.format(id='new.question_id')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER {answers}_search_delete AFTER DELETE ON {answers} BEGIN
+            {refresh.format(id='old.question_id')}
+        END
+        """,
+        f"""
+        INSERT INTO quiz_app_questionsearch (rowid, question, answers)
+        SELECT id {key}, text, {answer_text.format(id=f'{questions}.id')} FROM {questions}
+        """,
+    ]
+
+
+def postgresql_forwards(questions, answers, parity):
+    document = (
+        f"quiz_app_search_document(q.text, (SELECT string_agg(a.text, ' ') FROM {answers} a WHERE a.question_id = q.id))"
+    )
+    return [
+        f"""
+        CREATE FUNCTION {questions}_search() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM quiz_app_questionsearch WHERE key = OLD.id * 2 + {parity};
+                RETURN OLD;
+            END IF;
+            INSERT INTO quiz_app_questionsearch (key, document)
+            SELECT q.id * 2 + {parity}, {document} FROM {questions} q WHERE q.id = NEW.id
+            ON CONFLICT (key) DO UPDATE SET document = EXCLUDED.document;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE TRIGGER {questions}_search AFTER INSERT OR UPDATE OF text OR DELETE ON {questions}
+        FOR EACH ROW EXECUTE FUNCTION {questions}_search()
+        """,
+        f"""
+        CREATE FUNCTION {answers}_search() RETURNS trigger AS $$
+        DECLARE
+            question_ids bigint[] := '{{}}';
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                question_ids := question_ids || OLD.question_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                question_ids := question_ids || NEW.question_id;
+            END IF;
+            UPDATE quiz_app_questionsearch s SET document = {document}
+            FROM {questions} q
+            WHERE q.id = ANY(question_ids) AND s.key = q.id * 2 + {parity};
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE TRIGGER {answers}_search AFTER INSERT OR UPDATE OF text, question_id OR DELETE ON {answers}
+        FOR EACH ROW EXECUTE FUNCTION {answers}_search()
+        """,
+        f"""
+        INSERT INTO quiz_app_questionsearch (key, document)
+        SELECT q.id * 2 + {parity}, {document} FROM {questions} q
+        """,
+    ]
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = ["CREATE VIRTUAL TABLE quiz_app_questionsearch USING fts5(question, answers, tokenize='porter unicode61')"]
+        for source in SOURCES:
+            statements += sqlite_forwards(*source)
+    elif vendor == 'postgresql':
+        statements = [
+            "CREATE TABLE quiz_app_questionsearch (key bigint PRIMARY KEY, document tsvector NOT NULL)",
+            "CREATE INDEX quiz_app_questionsearch_document_idx ON quiz_app_questionsearch USING gin (document)",
+            # Question text weighs more than answer text in the ranking
+            """
+            CREATE FUNCTION quiz_app_search_document(question text, answers text) RETURNS tsvector AS $$
+                SELECT setweight(to_tsvector('english', question), 'A')
+                    || setweight(to_tsvector('english', coalesce(answers, '')), 'B')
+            $$ LANGUAGE sql IMMUTABLE
+            """,
+        ]
+        for source in SOURCES:
+            statements += postgresql_forwards(*source)
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = [
+            f'DROP TRIGGER {table}_search_{event}'
+            for questions, answers, _ in SOURCES
+            for table in (questions, answers)
+            for event in ('insert', 'update', 'delete')
+        ]
+    elif vendor == 'postgresql':
+        statements = []
+        for questions, answers, _ in SOURCES:
+            for table in (questions, answers):
+                statements += [f'DROP TRIGGER {table}_search ON {table}', f'DROP FUNCTION {table}_search()']
+        statements.append('DROP FUNCTION quiz_app_search_document(text, text)')
+    else:
+        return
+    statements.append('DROP TABLE quiz_app_questionsearch')
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0009_answer_client_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
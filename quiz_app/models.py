@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils.timezone import now
 
+from .dedup import content_hash
+
 
 class GeneralQuestion(models.Model):
     """
@@ -9,6 +11,20 @@ class GeneralQuestion(models.Model):
     """
     text = models.TextField()
     is_active = models.BooleanField(default=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)  # Hash of the normalized text
+
+    class Meta:
+        # Django filters booleans as a bare column, which SQLite can't seek
+        # an is_active index with; partial indexes on each side serve the
+        # active pool (sampling) and the inactive queue (review) instead.
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(is_active=True), name='generalquestion_active_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_active=False), name='generalquestion_inactive_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.content_hash = content_hash(self.text)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.text
@@ -44,6 +60,11 @@ class Quiz(models.Model):
     is_active = models.BooleanField(default=True)  # Whether the quiz is open for participation
     creator = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_quizzes')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['conference', 'is_active']),  # A conference's open quizzes
+        ]
+
     def __str__(self):
         return self.title
 
@@ -79,18 +100,287 @@ class UserAnswer(models.Model):
     question = models.ForeignKey('Question', on_delete=models.CASCADE, related_name='user_answers')
     answer = models.ForeignKey('Answer', on_delete=models.CASCADE, related_name='user_answers')
     is_correct = models.BooleanField()  # Whether the selected answer was correct
-    answered_at = models.DateTimeField(auto_now_add=True)  # Timestamp of the answer
+    answered_at = models.DateTimeField(default=now, editable=False)  # Timestamp of the answer
+    # Set on answers saved through the write-behind log, which inserts each token once
+    client_token = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'answered_at']),  # A user's answer history
+            models.Index(fields=['question', 'is_correct']),  # Correct/incorrect counts per question
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.question.text[:50]}: {'Correct' if self.is_correct else 'Incorrect'}"
 
 
+class QuizStats(models.Model):
+    """
+    Running totals of the answers given to a conference quiz.
+    """
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    participants = models.PositiveIntegerField(default=0)  # Users who answered at least one question
+    answer_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+
+    @property
+    def average_score(self):
+        """
+        Percentage of answers that were correct.
+        """
+        return round(100 * self.correct_count / self.answer_count, 1) if self.answer_count else None
+
+    def __str__(self):
+        return f"Stats for {self.quiz.title}"
+
+
+class QuestionStats(models.Model):
+    """
+    Running totals of the answers given to a conference quiz question.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    answer_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats for {self.question.text[:50]}"
+
+
+class AnswerStats(models.Model):
+    """
+    How many times an answer to a conference quiz question was picked.
+    """
+    answer = models.OneToOneField(Answer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    pick_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats for {self.answer.text}"
+
+
+class UserQuizStats(models.Model):
+    """
+    Running totals of one user's answers to a conference quiz.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_stats')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='user_stats')
+    answer_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'quiz'], name='unique_user_quiz_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.quiz.title}: {self.correct_count} / {self.answer_count}"
+
+
+class ItemAnalysis(models.Model):
+    """
+    Item statistics for a conference quiz question, written by the
+    analyze_items command.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='analysis')
+    responses = models.PositiveIntegerField(default=0)
+    p_value = models.FloatField(null=True)  # Share of correct responses
+    point_biserial = models.FloatField(null=True)  # Correlation of correctness with the rest of the user's score
+    distractor_rates = models.JSONField(default=list)  # [{'answer', 'text', 'is_correct', 'rate'}] per answer
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'item analyses'
+
+    def __str__(self):
+        return f"Analysis of {self.question.text[:50]}"
+
+
+class QuestionSignature(models.Model):
+    """
+    MinHash signature of a general question's text, for near-duplicate
+    detection (see neardup.py).
+    """
+    question = models.OneToOneField(GeneralQuestion, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    minhash = models.BinaryField()  # Little-endian 32-bit integers
+
+
+class QuestionBand(models.Model):
+    """
+    The LSH bucket of one band of a question's signature. Questions sharing
+    a bucket are near-duplicate candidates.
+    """
+    question = models.ForeignKey(GeneralQuestion, on_delete=models.CASCADE, related_name='bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', 'band']),  # Questions in a bucket
+        ]
+
+
+class NearDuplicate(models.Model):
+    """
+    A general question whose text nearly matches an older one, for
+    reviewers to merge or dismiss.
+    """
+    question = models.ForeignKey(GeneralQuestion, on_delete=models.CASCADE, related_name='near_duplicates')
+    duplicate_of = models.ForeignKey(GeneralQuestion, on_delete=models.CASCADE, related_name='+')
+    similarity = models.FloatField()  # Estimated Jaccard similarity of the texts
+    dismissed = models.BooleanField(default=False)  # A reviewer found they are different questions
+    found_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'duplicate_of'], name='unique_near_duplicate'),
+        ]
+
+    def __str__(self):
+        return f"{self.question.text[:50]} ~ {self.duplicate_of.text[:50]}"
+
+
+class QuizAttempt(models.Model):
+    """
+    Represents one user's run through a general quiz, optionally timed.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
+    question_ids = models.JSONField(default=list)  # GeneralQuestion ids in the order they are asked
+    total = models.PositiveIntegerField()  # Number of questions in the quiz
+    score = models.PositiveIntegerField(null=True, blank=True)  # Set when finished; null if never recorded
+    started_at = models.DateTimeField(auto_now_add=True)
+    deadline = models.DateTimeField(null=True, blank=True)  # Null for untimed quizzes
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expired = models.BooleanField(default=False)  # Finished by running out of time
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['finished_at', 'deadline']),  # Finding unfinished attempts past their deadline
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.score if self.score is not None else '?'} / {self.total}"
+
+
+class AttemptAnswer(models.Model):
+    """
+    Represents the answer given to one question of a quiz attempt.
+    """
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='answers')
+    question = models.ForeignKey(GeneralQuestion, on_delete=models.SET_NULL, null=True, related_name='attempt_answers')
+    answer = models.ForeignKey(GeneralAnswer, on_delete=models.SET_NULL, null=True, blank=True, related_name='attempt_answers')  # Null if skipped
+    is_correct = models.BooleanField()
+    answered_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Attempt #{self.attempt_id} - {'Correct' if self.is_correct else 'Incorrect'}"
+
+
+class QuestionMastery(models.Model):
+    """
+    How well a user knows a general or conference question: a Leitner box
+    that moves up with each correct answer and back to the start with each
+    wrong one, and when the question is next due (see adaptive.py).
+    """
+    GENERAL = 0
+    CONFERENCE = 1
+    SOURCE_CHOICES = [
+        (GENERAL, 'General'),
+        (CONFERENCE, 'Conference'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mastery')
+    source = models.PositiveSmallIntegerField(choices=SOURCE_CHOICES)
+    question_id = models.PositiveIntegerField()  # GeneralQuestion or Question id, depending on source
+    box = models.PositiveSmallIntegerField(default=0)  # 0 for a question last answered wrong
+    due_at = models.DateTimeField()  # When the question should be asked again
+    answer_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    last_seen_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = 'question mastery'
+        constraints = [
+            # Also the index a user's state is loaded with
+            models.UniqueConstraint(fields=['user', 'source', 'question_id'], name='unique_question_mastery'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.get_source_display()} question #{self.question_id}: box {self.box}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A user's score, the number of questions they answered correctly, in a
+    conference or, without one, overall (see leaderboard.py).
+    """
+    conference = models.ForeignKey(Conference, on_delete=models.CASCADE, null=True, blank=True, related_name='leaderboard')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    score = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'leaderboard entries'
+        constraints = [
+            # Also the indexes a leaderboard is loaded with
+            models.UniqueConstraint(fields=['conference', 'user'], name='unique_conference_leaderboard_entry'),
+            models.UniqueConstraint(fields=['user'], condition=models.Q(conference__isnull=True),
+                                    name='unique_overall_leaderboard_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.conference.name if self.conference else 'Overall'}: {self.score}"
+
+
 class QuizPDF(models.Model):
     """
     Represents an uploaded PDF file for quizzes.
     """
     file = models.FileField(upload_to='uploads/quiz_pdfs/')
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False)  # Hash of the file contents
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Quiz PDF uploaded at {self.uploaded_at}"
\ No newline at end of file
+        return f"Quiz PDF uploaded at {self.uploaded_at}"
+
+class ImportJob(models.Model):
+    """
+    Tracks the background import of an uploaded quiz PDF.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    pdf = models.ForeignKey(QuizPDF, on_delete=models.CASCADE, related_name='import_jobs')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    total_pages = models.PositiveIntegerField(default=0)
+    pages_done = models.PositiveIntegerField(default=0)
+    question_count = models.PositiveIntegerField(default=0)  # New questions
+    duplicate_count = models.PositiveIntegerField(default=0)  # Questions already in the pool
+    updated_count = models.PositiveIntegerField(default=0)  # Existing questions whose answers changed
+    answer_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # [{'page': n, 'error': message}, ...]
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=now)  # Last progress; a job that stops updating was interrupted
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total_pages': self.total_pages,
+            'pages_done': self.pages_done,
+            'question_count': self.question_count,
+            'duplicate_count': self.duplicate_count,
+            'updated_count': self.updated_count,
+            'answer_count': self.answer_count,
+            'errors': self.errors,
+        }
+
+    def __str__(self):
+        return f"Import #{self.id} of {self.pdf.file.name} ({self.status})"
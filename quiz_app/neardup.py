@@ -0,0 +1,192 @@
+"""
+Near-duplicate detection for general questions with MinHash and LSH.
+
+Content hashes (dedup.py) only catch exact duplicates. Imports of the same
+rule from different conferences often differ in a word or two, or in
+their punctuation, and those need a similarity measure instead.
+
+Each question's normalized text is cut into overlapping character
+shingles and summarized by a MinHash signature: the minimum of each of
+NUM_HASHES hash functions over the shingles. The share of positions where
+two signatures agree estimates the Jaccard similarity of the two shingle
+sets. A signature is stored as NUM_HASHES 32-bit integers.
+
+For LSH, a signature is split into BANDS bands, and each band is hashed to
+a bucket in an indexed table. Questions that share any bucket are
+candidates, so finding a question's near duplicates takes indexed lookups
+instead of a comparison with every other question. Candidates whose
+estimated similarity reaches SIMILARITY_THRESHOLD are recorded as
+NearDuplicate pairs for the review screen.
+
+Questions are indexed as they are imported or saved. The
+find_near_duplicates command indexes questions from before that.
+"""
+import hashlib
+import re
+import struct
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from .adaptive import merge_mastery
+from .dedup import normalize_text
+from .models import AttemptAnswer, NearDuplicate, QuestionBand, QuestionSignature
+
+SHINGLE_SIZE = 4  # Characters per shingle
+NUM_HASHES = 64
+BANDS = 16  # Of NUM_HASHES // BANDS hashes each; pairs from about 0.5 similarity become candidates
+SIMILARITY_THRESHOLD = 0.7
+BATCH_SIZE = 500  # Rows per lookup or bulk insert
+
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+# Each 64-byte BLAKE2b digest gives 16 of the 32-bit hash functions; salts
+# tell the digests of one shingle apart
+_SALTS = [n.to_bytes(16, 'little') for n in range(NUM_HASHES // 16)]
+_ROWS = NUM_HASHES // BANDS
+
+
+def shingles(text):
+    """
+    The overlapping SHINGLE_SIZE-character pieces of the normalized text,
+    without punctuation.
+    """
+    text = PUNCTUATION_RE.sub("", normalize_text(text))
+    return {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+
+
+def signature(text):
+    """
+    MinHash signature of a text, as NUM_HASHES 32-bit integers.
+    """
+    return [min(column) for column in zip(*map(_shingle_hashes, shingles(text)))]
+
+
+def similarity(first, second):
+    """
+    Estimated Jaccard similarity of the texts behind two signatures.
+    """
+    return sum(x == y for x, y in zip(first, second)) / NUM_HASHES
+
+
+def buckets(minhash):
+    """
+    The LSH bucket of each band of a signature.
+    """
+    return [_hash(_pack(minhash[band * _ROWS:(band + 1) * _ROWS]), signed=True) for band in range(BANDS)]
+
+
+def index_questions(questions, replace=True):
+    """
+    Compute the signatures and buckets of general questions and record
+    their near duplicates among all indexed questions.
+
+    :param replace: Whether the questions may have been indexed before, e.g.
+                    with an older text. Pass False for new questions to save
+                    the queries that clear their old rows.
+    :return: The number of near-duplicate pairs found.
+    """
+    signatures = {question.id: signature(question.text) for question in questions}
+    if not signatures:
+        return 0
+    with transaction.atomic():
+        if replace:
+            for chunk in _chunks(list(signatures)):
+                QuestionSignature.objects.filter(question_id__in=chunk).delete()
+                QuestionBand.objects.filter(question_id__in=chunk).delete()
+                # Pairs found with the old text; a reviewer's dismissals stand
+                NearDuplicate.objects.filter(
+                    Q(question_id__in=chunk) | Q(duplicate_of_id__in=chunk), dismissed=False
+                ).delete()
+        QuestionSignature.objects.bulk_create(
+            [QuestionSignature(question_id=question_id, minhash=_pack(minhash)) for question_id, minhash in signatures.items()],
+            batch_size=BATCH_SIZE,
+        )
+        QuestionBand.objects.bulk_create(
+            [QuestionBand(question_id=question_id, band=band, bucket=bucket)
+             for question_id, minhash in signatures.items() for band, bucket in enumerate(buckets(minhash))],
+            batch_size=BATCH_SIZE,
+        )
+        return _record_pairs(signatures)
+
+
+def merge_questions(duplicate, original):
+    """
+    Fold a duplicate general question into the one it duplicates and delete
+    it. Quiz attempt answers move to the original, picking its answer with
+    the same text, if it has one, and so does users' mastery (see
+    adaptive.merge_mastery). The original stays active if either question
+    was.
+    """
+    answers = {normalize_text(text): answer_id for answer_id, text in original.answers.values_list('id', 'text')}
+    with transaction.atomic():
+        for answer_id, text in duplicate.answers.values_list('id', 'text'):
+            AttemptAnswer.objects.filter(answer_id=answer_id).update(
+                question=original, answer_id=answers.get(normalize_text(text))
+            )
+        AttemptAnswer.objects.filter(question=duplicate).update(question=original)  # Skipped questions
+        merge_mastery(duplicate.id, original.id)  # Rows keyed by question id; nothing cascades to them
+        if duplicate.is_active and not original.is_active:
+            original.is_active = True
+            original.save(update_fields=['is_active'])
+        duplicate.delete()
+
+
+def _record_pairs(signatures):
+    """
+    Find the near duplicates of the questions with the given signatures
+    through their shared buckets and record them.
+    """
+    members = defaultdict(set)  # (band, bucket): the given questions in it
+    for question_id, minhash in signatures.items():
+        for band, bucket in enumerate(buckets(minhash)):
+            members[band, bucket].add(question_id)
+
+    candidates = set()
+    keys = list(members)
+    for chunk in _chunks(keys):
+        for other_id, band, bucket in QuestionBand.objects.filter(
+            bucket__in=[bucket for _, bucket in chunk]
+        ).values_list('question_id', 'band', 'bucket'):
+            for question_id in members.get((band, bucket), ()):
+                if other_id != question_id:
+                    candidates.add((max(question_id, other_id), min(question_id, other_id)))
+
+    others = list({question_id for pair in candidates for question_id in pair} - signatures.keys())
+    signatures = dict(signatures)
+    for chunk in _chunks(others):
+        for question_id, minhash in QuestionSignature.objects.filter(question_id__in=chunk).values_list('question_id', 'minhash'):
+            signatures[question_id] = _unpack(minhash)
+
+    pairs = []
+    for newer, older in candidates:
+        estimate = similarity(signatures[newer], signatures[older])
+        if estimate >= SIMILARITY_THRESHOLD:
+            pairs.append(NearDuplicate(question_id=newer, duplicate_of_id=older, similarity=estimate))
+    # Pairs found before, dismissed or not, are kept as they are
+    NearDuplicate.objects.bulk_create(pairs, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return len(pairs)
+
+
+def _shingle_hashes(shingle):
+    data = shingle.encode('utf-8')
+    return struct.unpack(f'<{NUM_HASHES}I', b''.join(hashlib.blake2b(data, salt=salt).digest() for salt in _SALTS))
+
+
+def _hash(data, signed=False):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big', signed=signed)
+
+
+def _pack(values):
+    return struct.pack(f'<{len(values)}I', *values)
+
+
+def _unpack(data):
+    data = bytes(data)
+    return list(struct.unpack(f'<{len(data) // 4}I', data))
+
+
+def _chunks(items):
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
@@ -0,0 +1,87 @@
+"""
+Parser for the text of quiz PDFs.
+
+Quizzes are laid out as a "Q<number> <question>" line, optionally followed
+by more lines of question text, then one standalone "o" line before each
+answer. The correct answer is underlined, which comes through in the text
+as "__" markers.
+
+This module has no Django dependencies so it can run in PDF worker
+processes and from the parsers.py command line tool.
+"""
+import re
+from collections import namedtuple
+
+QUESTION_RE = re.compile(r"Q\d+(?:\s(.*)|$)")  # The number may sit alone on its line
+ANSWER_MARKER = "o"
+CORRECT_MARKER = "__"
+
+
+class ParsedQuestion(namedtuple('ParsedQuestion', ['text', 'answers'])):
+    """
+    A question and its answers. answers is a list of dicts with 'text' and
+    'is_correct' keys. Unpacks like the (question, answers) tuples the
+    parser has always produced.
+    """
+    __slots__ = ()
+
+
+def iter_lines(pages):
+    """
+    Yield the lines of each page's text in order, so the parser sees a
+    multi-page document as one stream.
+    """
+    for text in pages:
+        if text:
+            yield from text.split("\n")
+
+
+def iter_questions(lines):
+    """
+    Parse lines of quiz text, yielding a ParsedQuestion as soon as each
+    question is complete.
+
+    Only the question being built is held in memory, so documents of any
+    size can be streamed through. Questions without answers are skipped.
+    """
+    question_parts = None
+    answers = []
+    expecting_answer = False
+
+    for line in lines:
+        line = line.strip()
+
+        # The line after a standalone "o" is the answer text
+        if expecting_answer:
+            expecting_answer = False
+            answers.append({
+                "text": line.replace(CORRECT_MARKER, "").strip(),
+                "is_correct": CORRECT_MARKER in line,  # Correct answers are underlined
+            })
+            continue
+
+        question_match = QUESTION_RE.match(line)
+        if question_match:
+            # Finish the previous question and start a new one
+            if question_parts and answers:
+                yield ParsedQuestion(" ".join(question_parts).strip(), answers)
+            question_parts = [(question_match.group(1) or "").strip()]
+            answers = []
+        elif line == ANSWER_MARKER:
+            expecting_answer = True
+        elif question_parts is not None:
+            # Question text wrapped onto another line
+            question_parts.append(line)
+
+    if question_parts and answers:
+        yield ParsedQuestion(" ".join(question_parts).strip(), answers)
+
+
+def extract_questions_and_answers(text):
+    """
+    Extracts questions and their answers from a given text.
+
+    :param text: The raw text extracted from a PDF page or document.
+    :return: A list of ParsedQuestion tuples.
+    """
+    return list(iter_questions(text.split("\n")))
@@ -0,0 +1,81 @@
+"""
+Conference role checks.
+
+A user's conference roles, i.e. the ids of the conferences they admin and
+belong to, are read with one indexed query on the membership tables and
+cached under their per-user version (see fragments.py), which signals bump
+whenever the user's memberships change. Within a request the roles are
+also kept on the request, so any number of checks cost at most one query,
+and none while the cache is warm.
+"""
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models import Value
+from django.shortcuts import get_object_or_404, render
+
+from . import fragments
+from .models import Conference, Quiz
+
+ROLES_TIMEOUT = 60 * 60
+
+
+def conference_roles(request):
+    """
+    :return: A dict with 'admin' and 'member' sets of conference ids.
+    """
+    if not hasattr(request, '_conference_roles'):
+        request._conference_roles = _load_roles(request.user)
+    return request._conference_roles
+
+
+def is_conference_admin(request, conference_id):
+    return request.user.is_authenticated and conference_id in conference_roles(request)['admin']
+
+
+def is_conference_member(request, conference_id):
+    """
+    Whether the user belongs to the conference, as a member or an admin.
+    """
+    if not request.user.is_authenticated:
+        return False
+    roles = conference_roles(request)
+    return conference_id in roles['member'] or conference_id in roles['admin']
+
+
+def quiz_conference_id(quiz_id):
+    return get_object_or_404(Quiz.objects.values_list('conference_id', flat=True), id=quiz_id)
+
+
+def conference_admin_required(message, conference_id=None):
+    """
+    Only let admins of the conference in the URL through; render an error
+    page with message for everyone else.
+
+    :param conference_id: A function from the view's URL kwargs to the
+                          conference id, when the URL has no conference_id.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            target = conference_id(**kwargs) if conference_id else kwargs['conference_id']
+            if not is_conference_admin(request, target):
+                return render(request, 'error.html', {'message': message})
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _load_roles(user):
+    if not user.is_authenticated:
+        return {'admin': set(), 'member': set()}
+    key = f'roles:{user.id}:{fragments.versions(fragments.user_key(user.id))}'
+    roles = cache.get(key)
+    if roles is None:
+        roles = {'admin': set(), 'member': set()}
+        admins = Conference.admins.through.objects.filter(user_id=user.id).values_list('conference_id', Value('admin'))
+        members = Conference.members.through.objects.filter(user_id=user.id).values_list('conference_id', Value('member'))
+        for conference_id, role in admins.union(members, all=True):
+            roles[role].add(conference_id)
+        cache.set(key, roles, ROLES_TIMEOUT)
+    return roles
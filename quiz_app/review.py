@@ -0,0 +1,102 @@
+"""
+Paging and bulk changes for the question review screen.
+
+Imports land every question inactive, so the backlog can run to thousands
+of rows. Pages are fetched by keyset: each page is the next size rows in
+id order after (or before) a given id. With the partial indexes on
+is_active, that is one index range scan however deep the page, where an
+OFFSET would read and discard every earlier row.
+
+Bulk changes run as a fixed number of statements whatever their size,
+instead of saving question by question; deletes clear each relation in
+one statement before the questions go.
+"""
+from dataclasses import dataclass
+
+from django.db import models, transaction
+
+from .models import AttemptAnswer, GeneralAnswer, NearDuplicate, QuestionBand, QuestionSignature
+from .sampling import invalidate_active_ids
+
+# Every relation to GeneralQuestion, as (model, field); a test checks none is missing
+QUESTION_RELATIONS = [
+    (AttemptAnswer, 'question'),
+    (NearDuplicate, 'question'),
+    (NearDuplicate, 'duplicate_of'),
+    (QuestionBand, 'question'),
+    (QuestionSignature, 'question'),
+    (GeneralAnswer, 'question'),  # Also clears the answer of attempts' answers
+]
+
+
+@dataclass
+class Page:
+    """
+    One page of rows, with the cursors of its neighbours; None when there
+    is no such page.
+    """
+    items: list
+    next_after: int = None  # Pass as after= for the next page
+    previous_before: int = None  # Pass as before= for the previous page
+
+
+def keyset_page(queryset, size, after=None, before=None):
+    """
+    The page of queryset, in id order, right after the id after, or right
+    before the id before, or the first page.
+    """
+    if before is not None:
+        items = list(queryset.filter(id__lt=before).order_by('-id')[:size + 1])
+        more = len(items) > size
+        items = items[:size][::-1]
+        return Page(items, next_after=items[-1].id if items else None,
+                    previous_before=items[0].id if more else None)
+
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    items = list(queryset.order_by('id')[:size + 1])
+    more = len(items) > size
+    items = items[:size]
+    return Page(items, next_after=items[-1].id if more else None,
+                previous_before=items[0].id if after is not None and items else None)
+
+
+def set_active(questions, active):
+    """
+    Activate or deactivate a queryset of general questions with one UPDATE.
+
+    :return: The number of questions changed.
+    """
+    count = questions.exclude(is_active=active).update(is_active=active)
+    if count:
+        invalidate_active_ids()  # update() doesn't send signals
+    return count
+
+
+def delete_questions(questions):
+    """
+    Delete a queryset of general questions with their answers, signatures
+    and near-duplicate pairs. Quiz attempts keep their answers, without the
+    question.
+
+    The rows pointing at the questions are cleared first, a statement per
+    relation in QUESTION_RELATIONS, so Django's collector finds nothing left
+    to load when the questions themselves are deleted.
+
+    The ids are read once up front: the filter may be a search, and
+    deleting the answers changes what a search matches.
+
+    :return: The number of questions deleted.
+    """
+    with transaction.atomic():
+        ids = list(questions.values_list('id', flat=True))
+        for model, field in QUESTION_RELATIONS:
+            dependents = model.objects.filter(**{f'{field}__in': ids})
+            if model._meta.get_field(field).remote_field.on_delete is models.SET_NULL:
+                dependents.update(**{field: None})
+            else:
+                dependents.delete()
+        count = questions.model.objects.filter(id__in=ids).delete()[1].get(questions.model._meta.label, 0)
+    if count:
+        invalidate_active_ids()
+    return count
@@ -0,0 +1,79 @@
+"""
+Random sampling of active general questions without loading the pool.
+
+Each process keeps the ids of active questions in a compact array and
+samples from it. A version token in the cache says when the array is
+stale: it is bumped whenever questions are added, deleted or
+(de)activated, and processes reload their array on their next sample.
+Multi-process deployments need a shared cache backend for the token to
+reach every process; MAX_AGE bounds staleness otherwise.
+"""
+import random
+import threading
+import time
+import uuid
+from array import array
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import GeneralQuestion
+
+VERSION_KEY = 'sampling:active_question_ids'
+MAX_AGE = 300  # Seconds before the id array is reloaded regardless of the version
+
+_lock = threading.Lock()
+_pool = (array('q'), frozenset())  # Active ids as an array to sample from and a set
+_loaded_version = None
+_loaded_at = 0.0
+
+
+def sample_active_question_ids(count):
+    """
+    Return up to count random active question ids, in random order.
+
+    Only touches the database when the id array needs reloading, so the
+    cost does not grow with the size of the pool.
+    """
+    ids, _ = _get_pool()
+    return random.sample(ids, min(count, len(ids)))
+
+
+def active_question_pool():
+    """
+    The ids of the active questions, as an array to sample from and as a
+    set for membership tests. Like sampling, only touches the database
+    when they need reloading.
+    """
+    return _get_pool()
+
+
+def invalidate_active_ids():
+    """
+    Mark every process's id array as stale.
+
+    Called straight away so this process sees its own changes, and again
+    on commit so other processes can't reload before the change is visible
+    to them.
+    """
+    _bump_version()
+    transaction.on_commit(_bump_version)
+
+
+def _bump_version():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def _get_pool():
+    global _pool, _loaded_version, _loaded_at
+    version = cache.get_or_set(VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None)
+    if version == _loaded_version and time.monotonic() - _loaded_at < MAX_AGE:
+        return _pool
+
+    with _lock:
+        if version != _loaded_version or time.monotonic() - _loaded_at >= MAX_AGE:
+            ids = array('q', GeneralQuestion.objects.filter(is_active=True).values_list('id', flat=True))
+            _pool = (ids, frozenset(ids))
+            _loaded_version = version
+            _loaded_at = time.monotonic()
+        return _pool
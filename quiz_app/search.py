@@ -0,0 +1,103 @@
+"""
+Full-text search over the question bank.
+
+General and conference questions are indexed together with the text of
+their answers in quiz_app_questionsearch, which database triggers keep in
+sync with every insert, update and delete, bulk ones included (see
+migration 0010). On SQLite it is an FTS5 table ranked with bm25(); on
+PostgreSQL a table of weighted tsvectors with a GIN index, ranked with
+ts_rank_cd(). Either way question text weighs more than answer text.
+
+A search matches questions containing every word of the query, the last
+one as a prefix, so results narrow as an admin types.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import GeneralQuestion, Question
+
+GENERAL, CONFERENCE = 0, 1  # Low bit of a search key: the question's table
+SEARCH_LIMIT = 50  # Results returned by search()
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query)
+
+
+def matching_ids(source, query):
+    """
+    An id__in expression for the questions of one source (GENERAL or
+    CONFERENCE) that match query, for filtering a queryset.
+    """
+    sql, params = _match(query)
+    return RawSQL(f'SELECT key / 2 FROM ({sql}) matches WHERE key & 1 = %s', (*params, source))
+
+
+def search(query, conference_id=None, limit=SEARCH_LIMIT):
+    """
+    Rank general questions and, when conference_id is given, that
+    conference's questions by how well they match query.
+
+    :return: Up to limit dicts of the matching questions with their answers,
+             best match first.
+    """
+    if not search_terms(query):
+        return []
+    sql, params = _match(query)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT key FROM ({sql}) matches
+            WHERE key & 1 = %s OR key / 2 IN (
+                SELECT question.id FROM quiz_app_question question
+                JOIN quiz_app_quiz quiz ON quiz.id = question.quiz_id
+                WHERE quiz.conference_id = %s
+            )
+            ORDER BY rank LIMIT %s
+            """,
+            (*params, GENERAL, conference_id, limit),
+        )
+        keys = [key for key, in cursor.fetchall()]
+
+    general = GeneralQuestion.objects.prefetch_related('answers').in_bulk(
+        [key // 2 for key in keys if key & 1 == GENERAL]
+    )
+    conference = Question.objects.select_related('quiz').prefetch_related('answers').in_bulk(
+        [key // 2 for key in keys if key & 1 == CONFERENCE]
+    )
+    results = []
+    for key in keys:
+        question = (conference if key & 1 else general).get(key // 2)
+        if question is None:
+            continue  # Deleted since the search ran
+        results.append({
+            'id': question.id,
+            'source': 'conference' if key & 1 else 'general',
+            'quiz': question.quiz.title if key & 1 else None,
+            'text': question.text,
+            'answers': [{'text': answer.text, 'is_correct': answer.is_correct} for answer in question.answers.all()],
+        })
+    return results
+
+
+def _match(query):
+    """
+    SQL selecting the key and rank (lower is better) of every indexed
+    question matching query, with its parameters.
+    """
+    terms = search_terms(query) or ['']
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join([*terms[:-1], f'{terms[-1]}:*'])
+        return (
+            "SELECT key, -ts_rank_cd(document, to_tsquery('english', %s)) AS rank "
+            "FROM quiz_app_questionsearch WHERE document @@ to_tsquery('english', %s)",
+            (tsquery, tsquery),
+        )
+    match = ' '.join([*(f'"{term}"' for term in terms[:-1]), f'"{terms[-1]}"*'])
+    return (
+        "SELECT rowid AS key, bm25(quiz_app_questionsearch, 2.0, 1.0) AS rank "
+        "FROM quiz_app_questionsearch WHERE quiz_app_questionsearch MATCH %s",
+        (match,),
+    )
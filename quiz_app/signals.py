@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import adaptive, fragments, leaderboard
+from .models import Conference, GeneralQuestion, UserAnswer
+from .neardup import index_questions
+from .sampling import invalidate_active_ids
+from .stats import apply_answers
+
+
+@receiver(post_save, sender=GeneralQuestion)
+@receiver(post_delete, sender=GeneralQuestion)
+def general_question_changed(sender, **kwargs):
+    invalidate_active_ids()
+
+
+@receiver(post_save, sender=GeneralQuestion)
+def general_question_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or 'text' in update_fields):
+        index_questions([instance])
+
+
+@receiver(post_save, sender=UserAnswer)
+def user_answer_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # One transaction for everything the answer adds to
+        with transaction.atomic():
+            apply_answers([instance])
+            adaptive.record_user_answers([instance])
+            leaderboard.record_user_answers([instance])
+
+
+@receiver(post_save, sender=Conference)
+@receiver(post_delete, sender=Conference)
+def conference_changed(sender, **kwargs):
+    fragments.invalidate(fragments.CONFERENCES_KEY)
+
+
+@receiver(m2m_changed, sender=Conference.admins.through)
+@receiver(m2m_changed, sender=Conference.members.through)
+def conference_people_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        user_ids = [instance.pk]  # Changed from the user's side
+    elif action == 'pre_clear':
+        # The users are only known before they are removed
+        user_ids = list(sender.objects.filter(conference=instance).values_list('user_id', flat=True))
+    else:
+        user_ids = pk_set or ()
+    keys = [fragments.user_key(user_id) for user_id in user_ids]
+    if sender is Conference.admins.through:
+        keys.append(fragments.ROSTERS_KEY)
+    if keys:
+        fragments.invalidate(*keys)
@@ -0,0 +1,118 @@
+"""
+Conference quiz statistics kept as running totals.
+
+Every UserAnswer adds to four summary tables: QuizStats, QuestionStats,
+AnswerStats (pick counts) and UserQuizStats. Rows are bumped in place
+with F() expressions, so concurrent answers never lose an update, and
+the stats page reads the totals instead of aggregating UserAnswer.
+
+Deleting answers does not subtract from the totals; run the rebuild_stats
+command to recompute everything from UserAnswer after bulk changes.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from .models import AnswerStats, Question, QuestionStats, QuizStats, UserAnswer, UserQuizStats
+
+
+def apply_answers(user_answers):
+    """
+    Add saved UserAnswer rows to the running totals.
+
+    Questions that are already loaded on the answers are used as is; the
+    quizzes of the rest are looked up in one query.
+    """
+    user_answers = list(user_answers)
+    if not user_answers:
+        return
+    quiz_ids = {
+        answer.question_id: answer.question.quiz_id
+        for answer in user_answers
+        if UserAnswer.question.is_cached(answer)
+    }
+    missing = {answer.question_id for answer in user_answers} - quiz_ids.keys()
+    if missing:
+        quiz_ids.update(Question.objects.filter(id__in=missing).values_list('id', 'quiz_id'))
+
+    quiz_totals = Counter()
+    question_totals = Counter()
+    user_totals = Counter()
+    picks = Counter()
+    for answer in user_answers:
+        quiz_id = quiz_ids[answer.question_id]
+        for totals, key in ((quiz_totals, quiz_id), (question_totals, answer.question_id),
+                            (user_totals, (answer.user_id, quiz_id))):
+            totals[key, 'answer_count'] += 1
+            totals[key, 'correct_count'] += answer.is_correct
+        picks[answer.answer_id] += 1
+
+    with transaction.atomic(savepoint=False):
+        participants = Counter()
+        for user_id, quiz_id in {key for key, _ in user_totals}:
+            created = increment(UserQuizStats, {'user_id': user_id, 'quiz_id': quiz_id},
+                                **_deltas(user_totals, (user_id, quiz_id)))
+            participants[quiz_id] += created
+        for quiz_id in {key for key, _ in quiz_totals}:
+            increment(QuizStats, {'quiz_id': quiz_id},
+                      participants=participants[quiz_id], **_deltas(quiz_totals, quiz_id))
+        for question_id in {key for key, _ in question_totals}:
+            increment(QuestionStats, {'question_id': question_id}, **_deltas(question_totals, question_id))
+        for answer_id, count in picks.items():
+            increment(AnswerStats, {'answer_id': answer_id}, pick_count=count)
+
+
+def rebuild_stats():
+    """
+    Recompute every summary table from UserAnswer.
+    """
+    correct = Count('id', filter=Q(is_correct=True))
+    with transaction.atomic():
+        for model in (UserQuizStats, QuizStats, QuestionStats, AnswerStats):
+            model.objects.all().delete()
+
+        user_rows = (
+            UserAnswer.objects.values('user_id', quiz_id=F('question__quiz_id'))
+            .annotate(answer_count=Count('id'), correct_count=correct)
+            .order_by()
+        )
+        UserQuizStats.objects.bulk_create(UserQuizStats(**row) for row in user_rows)
+        quiz_rows = (
+            UserAnswer.objects.values(quiz_id=F('question__quiz_id'))
+            .annotate(participants=Count('user_id', distinct=True), answer_count=Count('id'), correct_count=correct)
+            .order_by()
+        )
+        QuizStats.objects.bulk_create(QuizStats(**row) for row in quiz_rows)
+        question_rows = (
+            UserAnswer.objects.values('question_id')
+            .annotate(answer_count=Count('id'), correct_count=correct)
+            .order_by()
+        )
+        QuestionStats.objects.bulk_create(QuestionStats(**row) for row in question_rows)
+        answer_rows = UserAnswer.objects.values('answer_id').annotate(pick_count=Count('id')).order_by()
+        AnswerStats.objects.bulk_create(AnswerStats(**row) for row in answer_rows)
+
+
+def increment(model, lookup, **deltas):
+    """
+    Add deltas to the row matching lookup, creating it if needed. At least
+    one delta must be non-zero.
+
+    :return: Whether the row was created.
+    """
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if model.objects.filter(**lookup).update(**updates):
+        return False
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+        return True
+    except IntegrityError:
+        # Another request created the row first
+        model.objects.filter(**lookup).update(**updates)
+        return False
+
+
+def _deltas(totals, key):
+    return {field: totals[key, field] for field in ('answer_count', 'correct_count')}
@@ -1,25 +1,1196 @@
 # quiz_app/tests.py
-from django.test import TestCase
+import json
+import re
+import tempfile
+import time
+import unittest
+import uuid
+from unittest import mock
+from importlib.util import find_spec
+from io import StringIO
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
 from django.contrib.auth.models import User
-from .models import Question, Answer, UserAnswer
+from .models import (Question, Answer, UserAnswer, GeneralQuestion, GeneralAnswer, ImportJob, Conference,
+                     Quiz, QuizPDF, QuizAttempt, QuizStats, QuestionStats, AnswerStats, UserQuizStats,
+                     ItemAnalysis, NearDuplicate, QuestionMastery, LeaderboardEntry)
+from .ingest import page_chunks, parse_pages
+from .importers import import_questions
+from .parsing import iter_questions
+from .attempts import finalize_expired_attempts, save_answers
+from .dedup import content_hash
+from .sampling import invalidate_active_ids, sample_active_question_ids
+from .stats import rebuild_stats
+from . import adaptive, benchmark, leaderboard, metrics, neardup, review, search, writebehind
+from .loadtest import write_answers
 
 class QuizAppTestCase(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='testuser', password='password123')
-        self.question = Question.objects.create(text="What is the penalty for offsides?")
-        self.correct_answer = Answer.objects.create(
-            question=self.question, text="5-yard penalty", is_correct=True, rule_reference="Rule 7-1-5"
-        )
-        self.wrong_answer = Answer.objects.create(
-            question=self.question, text="10-yard penalty", is_correct=False, rule_reference="Rule 7-1-5"
-        )
+        quiz = Quiz.objects.create(conference=Conference.objects.create(name="Big Ten"), title="Week 1")
+        self.question = Question.objects.create(quiz=quiz, text="What is the penalty for offsides?")
+        self.correct_answer = Answer.objects.create(question=self.question, text="5-yard penalty", is_correct=True)
+        self.wrong_answer = Answer.objects.create(question=self.question, text="10-yard penalty", is_correct=False)
 
     def test_correct_answer(self):
         self.client.login(username='testuser', password='password123')
         response = self.client.post(f'/quiz/{self.question.id}/answer/', {'answer': self.correct_answer.id})
-        self.assertRedirects(response, '/quiz/')
+        # On to the next question of the conference's practice quiz
+        self.assertRedirects(response, f'/conference/{self.question.quiz.conference_id}/quiz/',
+                             fetch_redirect_response=False)
 
     def test_incorrect_answer(self):
         self.client.login(username='testuser', password='password123')
         response = self.client.post(f'/quiz/{self.question.id}/answer/', {'answer': self.wrong_answer.id})
         self.assertContains(response, "The correct answer was:")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PDF_IMPORT_WORKERS=0)
+class PDFImportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='uploader', password='password123')
+        self.client.login(username='uploader', password='password123')
+
+    def upload(self):
+        with open(settings.BASE_DIR / 'q1.pdf', 'rb') as pdf:
+            return self.client.post('/upload_pdf/', {'file': pdf})
+
+    def test_upload_creates_finished_job(self):
+        response = self.upload()
+        job = response.context['job']
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual(job.total_pages, 8)
+        self.assertEqual(job.pages_done, 8)
+        self.assertEqual(job.question_count, GeneralQuestion.objects.filter(is_active=False).count())
+        self.assertGreater(job.question_count, 0)
+
+    def test_reupload_of_same_file_is_not_parsed_again(self):
+        job = self.upload().context['job']
+        response = self.upload()
+        self.assertTrue(response.context['already_imported'])
+        self.assertEqual(response.context['job'].id, job.id)
+        self.assertEqual(QuizPDF.objects.count(), 1)
+
+    def test_import_status(self):
+        job = self.upload().context['job']
+        data = self.client.get(f'/upload_pdf/jobs/{job.id}/').json()
+        self.assertEqual(data['status'], ImportJob.DONE)
+        self.assertEqual(data['pages_done'], 8)
+        self.assertEqual(data['errors'], [])
+
+    @override_settings(QUESTION_IMPORT_BATCH_SIZE=5)
+    def test_progress_is_saved_per_batch(self):
+        progress = []
+
+        def import_batch(batch, **kwargs):
+            job = ImportJob.objects.get()
+            progress.append((job.pages_done, job.question_count))
+            return import_questions(batch, **kwargs)
+
+        with mock.patch('quiz_app.ingest.import_questions', side_effect=import_batch):
+            job = self.upload().context['job']
+        self.assertGreater(len(progress), 1)
+        self.assertLess(progress[0][0], job.total_pages)  # Saving started before the last page was read
+        self.assertEqual([count for _, count in progress], [5 * n for n in range(len(progress))])
+        self.assertEqual((job.status, job.pages_done), (ImportJob.DONE, 8))
+        self.assertEqual(job.question_count, GeneralQuestion.objects.count())
+
+    def test_document_without_pages_is_done(self):
+        with mock.patch('quiz_app.ingest.count_pages', return_value=0):
+            job = self.upload().context['job']
+        self.assertEqual((job.status, job.total_pages, job.question_count, job.errors), (ImportJob.DONE, 0, 0, []))
+
+    def test_interrupted_job_fails_when_polled(self):
+        job = self.upload().context['job']
+        ImportJob.objects.filter(id=job.id).update(status=ImportJob.RUNNING)
+        self.assertEqual(self.client.get(f'/upload_pdf/jobs/{job.id}/').json()['status'], ImportJob.RUNNING)
+        ImportJob.objects.filter(id=job.id).update(
+            updated_at=now() - timedelta(seconds=settings.PDF_IMPORT_STALE_SECONDS + 1)
+        )
+        data = self.client.get(f'/upload_pdf/jobs/{job.id}/').json()
+        self.assertEqual(data['status'], ImportJob.FAILED)
+        self.assertEqual(len(data['errors']), 1)
+
+    def test_question_spanning_pages(self):
+        pages = [
+            "Q1 First question\no\n__Yes__\no\nNo\nQ2 Second question starts",
+            "and ends here\no\nYes\no",
+            "__No__",
+        ]
+        parsed = list(parse_pages(pages))
+        self.assertEqual([q for q, _ in parsed], ["First question", "Second question starts and ends here"])
+        self.assertEqual(parsed[1][1], [{"text": "Yes", "is_correct": False}, {"text": "No", "is_correct": True}])
+
+    def test_page_chunks_cover_every_page(self):
+        chunks = page_chunks(37, 2)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], 37)
+        self.assertTrue(all(a[1] == b[0] for a, b in zip(chunks, chunks[1:])))
+
+
+class ImportQuestionsTestCase(TestCase):
+    parsed = [
+        ("First question", [{"text": "Yes", "is_correct": True}, {"text": "No", "is_correct": False}]),
+        ("Second question", [{"text": "Yes", "is_correct": False}, {"text": "No", "is_correct": True}]),
+        ("Third question", [{"text": "Maybe", "is_correct": True}]),
+    ]
+
+    def test_bulk_insert_in_one_transaction(self):
+        # SAVEPOINT, hash lookup, one insert per model, near-duplicate indexing
+        # (SAVEPOINT, signature and bucket inserts, bucket lookup, RELEASE), RELEASE
+        with self.assertNumQueries(10):
+            summary = import_questions(self.parsed)
+        self.assertEqual((summary.created, summary.answers), (3, 5))
+        question = GeneralQuestion.objects.get(text="Second question")
+        self.assertFalse(question.is_active)
+        self.assertEqual(question.answers.get(is_correct=True).text, "No")
+
+    def test_batches(self):
+        # The second batch also reads the signatures of its candidates in the first
+        with self.assertNumQueries(19):
+            summary = import_questions(self.parsed, batch_size=2)
+        self.assertEqual(summary.answers, GeneralAnswer.objects.count())
+
+    def test_reimport_skips_duplicates(self):
+        import_questions(self.parsed)
+        reworded = [("  FIRST   question ", self.parsed[0][1])] + self.parsed + [("Fourth question", [])]
+        summary = import_questions(reworded)
+        self.assertEqual((summary.created, summary.duplicates, summary.updated), (1, 4, 0))
+        self.assertEqual(GeneralQuestion.objects.count(), 4)
+
+    def test_reimport_updates_changed_answers(self):
+        import_questions(self.parsed)
+        corrected = [
+            ("First question", [{"text": "Yes", "is_correct": False}, {"text": "No", "is_correct": True}]),
+            ("Second question", [{"text": "Always", "is_correct": True}]),
+            self.parsed[2],
+        ]
+        summary = import_questions(corrected, update_existing=True)
+        self.assertEqual((summary.created, summary.duplicates, summary.updated), (0, 1, 2))
+        self.assertEqual(GeneralQuestion.objects.get(text="First question").answers.get(is_correct=True).text, "No")
+        self.assertEqual(list(GeneralQuestion.objects.get(text="Second question").answers.values_list('text', flat=True)),
+                         ["Always"])
+
+    def test_content_hash_ignores_case_spacing_and_numbering(self):
+        self.assertEqual(content_hash("Q12  Who  wins?"), content_hash("who wins?"))
+        self.assertNotEqual(content_hash("Who wins?"), content_hash("Who loses?"))
+
+    def test_release_quiz_questions(self):
+        admin = User.objects.create_user(username='admin', password='password123')
+        conference = Conference.objects.create(name="Test Conference")
+        conference.admins.add(admin)
+        quiz = Quiz.objects.create(conference=conference, title="Week 1")
+        question = Question.objects.create(quiz=quiz, text="Released question")
+        Answer.objects.create(question=question, text="Right", is_correct=True)
+        Answer.objects.create(question=question, text="Wrong")
+
+        self.client.login(username='admin', password='password123')
+        self.client.get(f'/release_quiz_questions/{quiz.id}/')
+        released = GeneralQuestion.objects.get(text="Released question")
+        self.assertTrue(released.is_active)
+        self.assertEqual(released.answers.count(), 2)
+
+
+class ParserTestCase(SimpleTestCase):
+    def test_yields_each_question_when_complete(self):
+        read = []
+
+        def lines():
+            for line in ["Q1 First", "o", "__A__", "Q2 Second", "o", "B"]:
+                read.append(line)
+                yield line
+
+        questions = iter_questions(lines())
+        self.assertEqual(next(questions), ("First", [{"text": "A", "is_correct": True}]))
+        self.assertEqual(len(read), 4)  # Nothing read past the start of the next question
+        self.assertEqual(next(questions).text, "Second")
+
+    def test_question_number_on_its_own_line(self):
+        parsed = list(iter_questions(["Q13", "1/10 @ A-20.", "o", "A-5"]))
+        self.assertEqual(parsed[0].text, "1/10 @ A-20.")
+
+    def test_answers_without_question_are_dropped(self):
+        parsed = list(iter_questions(["o", "Orphan", "Q1 Question", "o", "Yes"]))
+        self.assertEqual(parsed[0].answers, [{"text": "Yes", "is_correct": False}])
+
+
+class StatsTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='password123')
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(2)]
+        self.conference = Conference.objects.create(name="Big Ten")
+        self.conference.admins.add(self.admin)
+        self.quiz = Quiz.objects.create(conference=self.conference, title="Week 1")
+        self.question = Question.objects.create(quiz=self.quiz, text="Offsides?")
+        self.right = Answer.objects.create(question=self.question, text="5 yards", is_correct=True)
+        self.wrong = Answer.objects.create(question=self.question, text="10 yards", is_correct=False)
+
+    def answer(self, user, answer):
+        UserAnswer.objects.create(user=user, question=self.question, answer=answer, is_correct=answer.is_correct)
+
+    def test_answers_update_totals(self):
+        self.answer(self.users[0], self.right)
+        self.answer(self.users[0], self.wrong)
+        self.answer(self.users[1], self.right)
+
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.participants, stats.answer_count, stats.correct_count), (2, 3, 2))
+        self.assertEqual(stats.average_score, 66.7)
+        question_stats = QuestionStats.objects.get(question=self.question)
+        self.assertEqual((question_stats.answer_count, question_stats.correct_count), (3, 2))
+        self.assertEqual(AnswerStats.objects.get(answer=self.right).pick_count, 2)
+        self.assertEqual(AnswerStats.objects.get(answer=self.wrong).pick_count, 1)
+        user_stats = UserQuizStats.objects.get(user=self.users[0], quiz=self.quiz)
+        self.assertEqual((user_stats.answer_count, user_stats.correct_count), (2, 1))
+
+    def test_rebuild_matches_incremental(self):
+        self.answer(self.users[0], self.right)
+        self.answer(self.users[1], self.wrong)
+        before = list(QuizStats.objects.values()), list(AnswerStats.objects.values().order_by('pk'))
+        rebuild_stats()
+        self.assertEqual((list(QuizStats.objects.values()), list(AnswerStats.objects.values().order_by('pk'))), before)
+
+    def test_stats_page_is_one_read(self):
+        self.answer(self.users[0], self.right)
+        self.client.login(username='admin', password='password123')
+        self.client.get(f'/stats/{self.conference.id}/')  # Warm the session and user lookups
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/stats/{self.conference.id}/')
+        self.assertContains(response, "100.0%")
+        stats_queries = [q['sql'] for q in queries.captured_queries if 'quiz_app_quizstats' in q['sql']]
+        self.assertEqual(len(stats_queries), 1)
+
+
+@unittest.skipUnless(find_spec('numpy'), "Item analysis needs NumPy")
+class ItemAnalysisTestCase(TestCase):
+    def setUp(self):
+        self.conference = Conference.objects.create(name="Big Ten")
+        quiz = Quiz.objects.create(conference=self.conference, title="Week 1")
+        self.questions = []
+        for i in range(3):
+            question = Question.objects.create(quiz=quiz, text=f"Question {i}")
+            right = Answer.objects.create(question=question, text="Right", is_correct=True)
+            wrong = Answer.objects.create(question=question, text="Wrong", is_correct=False)
+            Answer.objects.create(question=question, text="Never picked", is_correct=False)
+            self.questions.append((question, right, wrong))
+        # Rows are users, columns are questions
+        self.results = [[1, 1, 1], [1, 1, 0], [1, 0, 0], [0, 0, 1]]
+        for i, row in enumerate(self.results):
+            user = User.objects.create_user(username=f'user{i}')
+            for (question, right, wrong), correct in zip(self.questions, row):
+                UserAnswer.objects.create(user=user, question=question, answer=right if correct else wrong,
+                                          is_correct=bool(correct))
+
+    def test_statistics(self):
+        import numpy as np
+
+        call_command('analyze_items', stdout=StringIO())
+        results = np.array(self.results, dtype=float)
+        for column, (question, right, wrong) in enumerate(self.questions):
+            analysis = ItemAnalysis.objects.get(question=question)
+            item = results[:, column]
+            rest = (results.sum(axis=1) - item) / 2
+            self.assertEqual(analysis.responses, 4)
+            self.assertAlmostEqual(analysis.p_value, item.mean())
+            self.assertAlmostEqual(analysis.point_biserial, np.corrcoef(item, rest)[0, 1])
+            rates = {answer['answer']: answer['rate'] for answer in analysis.distractor_rates}
+            self.assertEqual(len(rates), 3)
+            self.assertAlmostEqual(rates[right.id], item.mean())
+            self.assertAlmostEqual(rates[wrong.id], 1 - item.mean())
+
+    def test_undefined_discrimination(self):
+        from .analysis import item_statistics
+        import numpy as np
+
+        # Everyone got question 10 right, so its correlation is undefined
+        responses = np.array([[1, 10, 100, 1], [1, 11, 110, 0], [2, 10, 100, 1], [2, 11, 111, 1]])
+        stats = item_statistics(responses)
+        self.assertEqual(stats['items'][10], (2, 1.0, None))
+        self.assertEqual(stats['picks'], {100: 2, 110: 1, 111: 1})
+
+
+class QueryPlanAssertions:
+    """
+    Checks the SQLite query plans of queries, so that a dropped or unusable
+    index fails the build instead of slowing production down.
+    """
+
+    def query_plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoFullScans(self, queries, allow=()):
+        """
+        Fail if any SELECT in queries reads a table row by row. A scan of
+        an index, e.g. a partial one, is fine.
+
+        :param queries: QuerySets, SQL strings, or the captured_queries of
+                        a CaptureQueriesContext.
+        :param allow: Tables that may be scanned, e.g. small lookup tables.
+        """
+        for query in queries:
+            if isinstance(query, QuerySet):
+                sql, params = query.query.sql_with_params()
+            else:
+                sql, params = query['sql'] if isinstance(query, dict) else query, ()
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = self.query_plan(sql, params)
+            for detail in plan:
+                match = re.fullmatch(r'SCAN (\w+)', detail)
+                if match and match.group(1) not in allow:
+                    self.fail(f"Full scan of {match.group(1)}:\n{sql}\n" + "\n".join(plan))
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "Query plans are checked on SQLite")
+class QueryPlanTestCase(QueryPlanAssertions, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='official', password='password123')
+        self.conference = Conference.objects.create(name="Big Ten")
+        self.conference.admins.add(self.user)
+        self.quiz = Quiz.objects.create(conference=self.conference, title="Week 1")
+        self.question = Question.objects.create(quiz=self.quiz, text="Offsides?")
+        for n in range(3):
+            question = GeneralQuestion.objects.create(text=f"Question {n}")
+            GeneralAnswer.objects.create(question=question, text="Right", is_correct=True)
+            GeneralAnswer.objects.create(question=question, text="Wrong")
+        self.client.login(username='official', password='password123')
+
+    def test_quiz_views(self):
+        with CaptureQueriesContext(connection) as queries:
+            question = self.client.get('/quiz/?num_questions=3').context['question']
+            self.client.post('/quiz/', {'answer': question['answers'][0]['id']})
+            questions = self.client.get('/quiz/play/?num_questions=3').context['questions']
+            self.client.post('/quiz/submit/', {'responses': {questions[0]['id']: questions[0]['answers'][0]['id']}},
+                             content_type='application/json')
+        self.assertNoFullScans(queries.captured_queries)
+
+    def test_stats_view(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/stats/{self.conference.id}/')
+        self.assertNoFullScans(queries.captured_queries)
+
+    def test_hot_lookups(self):
+        self.assertNoFullScans([
+            UserAnswer.objects.filter(user=self.user).order_by('-answered_at'),
+            UserAnswer.objects.filter(question=self.question, is_correct=True),
+            GeneralQuestion.objects.filter(is_active=True).values_list('id', flat=True),
+            GeneralQuestion.objects.filter(is_active=False).order_by('id'),
+            GeneralQuestion.objects.filter(is_active=False, id__gt=1).order_by('id')[:51],  # A review page
+            Quiz.objects.filter(conference=self.conference, is_active=True),
+        ])
+
+
+class BenchmarkTestCase(TestCase):
+    """
+    Runs the benchmark on a small dataset. Query counts must not depend
+    on the dataset size, so they are held to the stored full-size baseline.
+    """
+
+    def test_query_counts(self):
+        cache.clear()
+        fixtures = benchmark.seed(benchmark.Dataset(general_questions=50, conferences=3, quizzes_per_conference=2,
+                                                    questions_per_quiz=5, users=20, user_answers=500))
+        cases = benchmark.cases(fixtures)
+        self.assertEqual(benchmark.uncovered_routes(cases), [])
+        results = benchmark.run(fixtures, cases, repeat=1)
+        for route, result in results.items():
+            self.assertFalse([status for status in result['status'] if status >= 500], route)
+        baseline = benchmark.load_baseline(settings.BASE_DIR / 'quiz_app' / 'benchmark_baseline.json')['routes']
+        self.assertEqual(benchmark.compare(results, baseline, tolerance=float('inf')), [])
+
+    def test_status_change_is_a_regression(self):
+        baseline = {'GET quiz': {'status': [200], 'queries': 9, 'p95_ms': 10.0, 'peak_kib': 100.0}}
+        results = {'GET quiz': {'status': [500], 'queries': 9, 'p95_ms': 10.0, 'peak_kib': 100.0}}
+        self.assertEqual(benchmark.compare(results, baseline), ['GET quiz: status [500], baseline [200]'])
+        self.assertEqual(benchmark.compare(baseline, baseline), [])
+
+
+@override_settings(REQUEST_METRICS=True)
+class RequestMetricsTestCase(TestCase):
+    def setUp(self):
+        metrics.store.clear()
+        self.user = User.objects.create_user(username='staff', password='password123', is_staff=True)
+        self.client.login(username='staff', password='password123')
+
+    def test_requests_are_recorded(self):
+        with self.assertLogs('quiz_app.metrics', 'INFO') as logs:
+            self.client.get('/feedback/')
+            self.client.get('/feedback/')
+        self.assertEqual(len(logs.records), 2)
+        summary = self.client.get('/metrics/').json()['views']['feedback']
+        self.assertEqual(summary['requests'], 2)
+        self.assertGreater(summary['mean_queries'], 0)
+        self.assertEqual(sum(summary['histogram_ms'].values()), 2)
+
+    async def test_async_requests_are_recorded(self):
+        await self.async_client.aforce_login(self.user)
+        with self.assertLogs('quiz_app.metrics', 'INFO'):
+            await self.async_client.get('/quiz/?num_questions=3')
+        summary = metrics.store.snapshot()['quiz']
+        self.assertEqual(summary['requests'], 1)
+        self.assertGreater(summary['mean_queries'], 0)
+
+    def test_duplicate_queries(self):
+        recorder = metrics.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            list(User.objects.filter(id=self.user.id))
+            list(User.objects.filter(id=self.user.id))
+            list(User.objects.filter(id=0))
+        self.assertEqual((recorder.count, recorder.duplicates, recorder.most_repeated[1]), (3, 1, 3))
+
+    def test_staff_only(self):
+        User.objects.create_user(username='official', password='password123')
+        self.client.login(username='official', password='password123')
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+
+
+class ConferenceFragmentTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='official', password='password123')
+        self.conference = Conference.objects.create(name="Big Ten")
+        self.client.login(username='official', password='password123')
+
+    def conference_queries(self, path='/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, [q['sql'] for q in queries if 'quiz_app_conference' in q['sql']]
+
+    def test_home_list_is_cached(self):
+        self.conference.members.add(self.user)
+        response, queries = self.conference_queries()
+        self.assertContains(response, "Big Ten")
+        self.assertTrue(queries)
+        response, queries = self.conference_queries()
+        self.assertContains(response, "Big Ten")
+        self.assertEqual(queries, [])
+
+    def test_membership_changes_invalidate(self):
+        self.assertContains(self.client.get('/'), "No Conferences Assigned")
+        self.conference.admins.add(self.user)
+        self.assertContains(self.client.get('/'), "Your Admin Conferences")
+        self.user.admin_conferences.clear()
+        self.assertContains(self.client.get('/'), "No Conferences Assigned")
+
+    def test_conference_changes_invalidate(self):
+        self.conference.admins.add(self.user)
+        self.client.get('/conference/')
+        self.conference.name = "Big 12"
+        self.conference.save()
+        self.assertContains(self.client.get('/conference/'), "Big 12")
+
+    def test_rosters_invalidate(self):
+        User.objects.create_superuser(username='root', password='password123')
+        self.client.login(username='root', password='password123')
+        self.client.get('/manage_conferences/')
+        self.conference.admins.add(self.user)
+        self.assertContains(self.client.get('/manage_conferences/'), "Admins: official")
+
+
+class ConferenceAdminRequiredTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='official', password='password123')
+        self.conference = Conference.objects.create(name="Big Ten")
+        self.quiz = Quiz.objects.create(conference=self.conference, title="Week 1")
+        self.client.login(username='official', password='password123')
+
+    def membership_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, [q['sql'] for q in queries if 'quiz_app_conference_' in q['sql']]
+
+    def test_non_admins_are_refused(self):
+        self.conference.members.add(self.user)
+        self.assertContains(self.client.get(f'/stats/{self.conference.id}/'), "not authorized")
+        self.assertContains(self.client.get(f'/edit_quiz/{self.quiz.id}/'), "not authorized")
+        self.assertEqual(self.client.get('/edit_quiz/0/').status_code, 404)
+
+    def test_roles_are_cached(self):
+        self.conference.admins.add(self.user)
+        response, queries = self.membership_queries(f'/edit_quiz/{self.quiz.id}/')
+        self.assertContains(response, "Edit Quiz: Week 1")
+        self.assertEqual(len(queries), 1)
+        response, queries = self.membership_queries(f'/edit_quiz/{self.quiz.id}/')
+        self.assertContains(response, "Edit Quiz: Week 1")
+        self.assertEqual(queries, [])
+
+    def test_role_changes_invalidate(self):
+        self.conference.admins.add(self.user)
+        self.assertNotContains(self.client.get(f'/stats/{self.conference.id}/'), "not authorized")
+        self.conference.admins.remove(self.user)
+        self.assertContains(self.client.get(f'/stats/{self.conference.id}/'), "not authorized")
+
+
+class ConcurrentWritesTestCase(TransactionTestCase):
+    def test_parallel_answers(self):
+        result = write_answers(threads=4, writes_per_thread=25)
+        self.assertEqual((result.writes, result.errors), (100, 0))
+        self.assertEqual(UserAnswer.objects.count(), 100)
+        # Concurrent stats upserts lose nothing
+        self.assertEqual(QuizStats.objects.get().answer_count, 100)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "SQLite settings")
+    def test_sqlite_settings(self):
+        with connection.cursor() as cursor:
+            pragmas = [cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                       for name in ('journal_mode', 'synchronous', 'busy_timeout')]
+        self.assertEqual(pragmas, ['wal', 1, 20000])
+
+
+class WriteBehindTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.user = User.objects.create_user(username='official', password='password123')
+        quiz = Quiz.objects.create(conference=Conference.objects.create(name="Big Ten"), title="Week 1")
+        self.question = Question.objects.create(quiz=quiz, text="Question")
+        self.answer = Answer.objects.create(question=self.question, text="Right", is_correct=True)
+
+    def record(self, token=None):
+        return {'token': token or uuid.uuid4().hex, 'user': self.user.id, 'question': self.question.id,
+                'answer': self.answer.id, 'correct': True, 'at': now().isoformat()}
+
+    def test_logged_answers_are_inserted_once(self):
+        log = writebehind.AnswerLog(self.directory.name)
+        records = [self.record(), self.record()]
+        for record in records:
+            log.append(record)
+        self.assertEqual(UserAnswer.objects.count(), 0)
+        self.assertEqual(log.flush(), 2)
+        self.assertEqual(writebehind.insert_answers(records), 0)  # Replayed after a crash
+        self.assertEqual(UserAnswer.objects.filter(client_token__isnull=False).count(), 2)
+        self.assertEqual(QuestionStats.objects.get(question=self.question).answer_count, 2)
+
+    def test_replay_skips_live_segments(self):
+        live = writebehind.AnswerLog(self.directory.name)
+        live.append(self.record())
+        # A segment whose process died mid-append
+        with open(f'{self.directory.name}/dead.log', 'w') as file:
+            file.write(json.dumps(self.record()) + '\n' + json.dumps(self.record())[:20])
+        with self.assertLogs('quiz_app.writebehind', 'WARNING'):
+            self.assertEqual(writebehind.replay(self.directory.name), 1)
+        self.assertEqual(UserAnswer.objects.count(), 1)
+        self.assertEqual(live.flush(), 1)
+        self.assertEqual(UserAnswer.objects.count(), 2)
+
+    def test_answers_to_deleted_rows_are_dropped(self):
+        record = self.record()
+        self.answer.delete()
+        with self.assertLogs('quiz_app.writebehind', 'WARNING'):
+            self.assertEqual(writebehind.insert_answers([record]), 0)
+
+    def test_answer_question_logs_answers(self):
+        self.client.login(username='official', password='password123')
+        with override_settings(ANSWER_WRITE_BEHIND=True, ANSWER_LOG_DIR=self.directory.name,
+                               ANSWER_LOG_FLUSH_INTERVAL=3600):
+            self.client.post(f'/quiz/{self.question.id}/answer/', {'answer': self.answer.id})
+            self.assertEqual(UserAnswer.objects.count(), 0)
+            self.assertEqual(writebehind.flush(), 1)
+        self.assertTrue(UserAnswer.objects.get().is_correct)
+
+    def test_flusher_starts_with_the_app(self):
+        config = apps.get_app_config('quiz_app')
+        with mock.patch.object(writebehind, 'start') as start:
+            config.ready()
+            start.assert_not_called()
+            with override_settings(ANSWER_WRITE_BEHIND=True):
+                config.ready()
+            start.assert_called_once_with()
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        self.general = GeneralQuestion.objects.create(text="Which foul is called for targeting a defenseless player?")
+        GeneralAnswer.objects.create(question=self.general, text="Targeting, with ejection", is_correct=True)
+        GeneralAnswer.objects.create(question=self.general, text="Roughing the passer")
+        self.conference = Conference.objects.create(name="Big Ten")
+        quiz = Quiz.objects.create(conference=self.conference, title="Week 1")
+        self.question = Question.objects.create(quiz=quiz, text="Is a fumble out of bounds a spot foul?")
+        Answer.objects.create(question=self.question, text="No, the ball returns to the spot of the fumble")
+        other = Quiz.objects.create(conference=Conference.objects.create(name="SEC"), title="Week 1")
+        Question.objects.create(quiz=other, text="Another conference's foul question")
+
+    def ids(self, query, conference_id=None):
+        return [(r['source'], r['id']) for r in search.search(query, conference_id)]
+
+    def test_ranked_search(self):
+        self.assertEqual(self.ids("foul", self.conference.id),
+                         [('general', self.general.id), ('conference', self.question.id)])
+        self.assertEqual(self.ids("ejection"), [('general', self.general.id)])  # Answer text
+        self.assertEqual(self.ids("defenseless targ"), [('general', self.general.id)])  # Prefix of the last word
+        self.assertEqual(self.ids("fumble"), [])  # Other conferences' questions need their id
+        self.assertEqual(self.ids('" OR *'), [])
+
+    def test_index_follows_changes(self):
+        GeneralQuestion.objects.filter(id=self.general.id).update(text="Pass interference")
+        GeneralAnswer.objects.bulk_create([GeneralAnswer(question=self.general, text="Offside")])
+        self.assertEqual(self.ids("interference offside"), [('general', self.general.id)])
+        self.assertEqual(self.ids("defenseless"), [])
+        self.general.delete()
+        self.assertEqual(self.ids("interference"), [])
+
+    def test_admin_search(self):
+        User.objects.create_superuser('admin', password='password123')
+        self.client.login(username='admin', password='password123')
+        response = self.client.get('/admin/quiz_app/generalquestion/', {'q': 'ejection'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.general])
+        response = self.client.get('/admin/quiz_app/question/', {'q': 'fumble'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.question])
+
+    def test_endpoint_is_for_conference_admins(self):
+        user = User.objects.create_user(username='official', password='password123')
+        self.client.login(username='official', password='password123')
+        path = f'/search/{self.conference.id}/'
+        self.assertNotIn('application/json', self.client.get(path, {'q': 'foul'})['Content-Type'])
+        self.conference.admins.add(user)
+        results = self.client.get(path, {'q': 'fumble'}).json()['results']
+        self.assertEqual([(r['quiz'], r['answers'][0]['text']) for r in results],
+                         [("Week 1", "No, the ball returns to the spot of the fumble")])
+
+
+class NearDuplicateTestCase(TestCase):
+    RULE = "12. A runner is down when any part of his body other than a hand or foot touches the ground."
+    VARIANT = "Q4 A runner is down when any part of the body other than hand or foot touches the ground"
+
+    def setUp(self):
+        self.original = GeneralQuestion.objects.create(text=self.RULE, is_active=True)
+        self.right = GeneralAnswer.objects.create(question=self.original, text="True", is_correct=True)
+        GeneralQuestion.objects.create(text="How many officials are on a crew?")
+
+    def test_similarity(self):
+        self.assertGreaterEqual(neardup.similarity(neardup.signature(self.RULE), neardup.signature(self.VARIANT)), 0.7)
+        self.assertLess(neardup.similarity(neardup.signature(self.RULE), neardup.signature("Who signals a safety?")), 0.2)
+
+    def test_import_records_near_duplicates(self):
+        summary = import_questions([(self.VARIANT, [{'text': "true", 'is_correct': True}])])
+        self.assertEqual(summary.near_duplicates, 1)
+        pair = NearDuplicate.objects.get()
+        self.assertEqual((pair.question.text, pair.duplicate_of), (self.VARIANT, self.original))
+
+        # Dismissals survive re-indexing
+        pair.dismissed = True
+        pair.save()
+        call_command('find_near_duplicates', '--rebuild', stdout=StringIO())
+        self.assertTrue(NearDuplicate.objects.get().dismissed)
+
+    def test_merge_from_review(self):
+        import_questions([(self.VARIANT, [{'text': "true", 'is_correct': True}])])
+        pair = NearDuplicate.objects.get()
+        attempt = QuizAttempt.objects.create(
+            user=User.objects.create_user(username='official'), question_ids=[pair.question_id], total=1
+        )
+        attempt.answers.create(question=pair.question, answer=pair.question.answers.get(), is_correct=True,
+                               answered_at=now())
+        # Mastery rows of the duplicate merge into the original's, or move there
+        both, only = attempt.user, User.objects.create_user(username='other')
+        seen = now()
+        for user, question_id, box, answers in [(both, self.original.id, 1, 2), (both, pair.question_id, 3, 1),
+                                                (only, pair.question_id, 2, 1)]:
+            QuestionMastery.objects.create(user=user, source=QuestionMastery.GENERAL, question_id=question_id,
+                                           box=box, due_at=seen + timedelta(days=box), answer_count=answers,
+                                           correct_count=1, last_seen_at=seen)
+
+        User.objects.create_superuser('admin', password='password123')
+        self.client.login(username='admin', password='password123')
+        self.assertContains(self.client.get('/review_questions/'), 'value="%d"' % pair.id, count=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/review_questions/', {'merge': pair.id})
+        self.assertFalse(GeneralQuestion.objects.filter(text=self.VARIANT).exists())
+        self.assertEqual((attempt.answers.get().question, attempt.answers.get().answer), (self.original, self.right))
+        self.assertEqual(
+            list(QuestionMastery.objects.order_by('user_id').values_list(
+                'user', 'question_id', 'box', 'due_at', 'answer_count', 'correct_count')),
+            [(both.id, self.original.id, 3, seen + timedelta(days=3), 3, 2),
+             (only.id, self.original.id, 2, seen + timedelta(days=2), 1, 1)],
+        )
+
+
+@override_settings(REVIEW_PAGE_SIZE=3)
+class ReviewQuestionsTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', password='password123')
+        self.client.login(username='admin', password='password123')
+        self.inactive = []
+        for n, text in enumerate(["Offsides", "Holding", "Pass interference", "Targeting", "Clipping", "Delay of game",
+                                  "False start"]):
+            question = GeneralQuestion.objects.create(text=f"Is this {text}?", is_active=False)
+            GeneralAnswer.objects.create(question=question, text="Yes", is_correct=n % 2 == 0)
+            GeneralAnswer.objects.create(question=question, text="No", is_correct=n % 2 == 1)
+            self.inactive.append(question.id)
+        self.active = GeneralQuestion.objects.create(text="Who spots the ball?", is_active=True)
+
+    def test_keyset_pages(self):
+        seen = []
+        response = self.client.get('/review_questions/')
+        while True:
+            seen += [question.id for question in response.context['questions']]
+            after = response.context['page'].next_after
+            if after is None:
+                break
+            with self.assertNumQueries(5):  # Session, user, page, answers, near duplicates
+                response = self.client.get('/review_questions/', {'after': after})
+        self.assertEqual(seen, self.inactive)
+
+        before = response.context['page'].previous_before
+        response = self.client.get('/review_questions/', {'before': before})
+        self.assertEqual([question.id for question in response.context['questions']], self.inactive[3:6])
+
+        response = self.client.get('/review_questions/', {'status': 'active'})
+        self.assertEqual(list(response.context['questions']), [self.active])
+
+    def test_bulk_actions(self):
+        self.client.post('/review_questions/', {'action': 'activate', 'selected': self.inactive[:2]})
+        self.assertEqual(GeneralQuestion.objects.filter(is_active=True).count(), 3)
+
+        with self.assertNumQueries(3):  # Session, user, one UPDATE
+            self.client.post('/review_questions/', {'action': 'deactivate', 'scope': 'all', 'status': 'active'})
+        self.assertFalse(GeneralQuestion.objects.filter(is_active=True).exists())
+
+        self.client.post('/review_questions/', {'action': 'delete', 'scope': 'all', 'q': 'targeting'})
+        self.assertFalse(GeneralQuestion.objects.filter(text__contains="Targeting").exists())
+        self.assertEqual(GeneralQuestion.objects.count(), 7)
+
+        attempt = QuizAttempt.objects.create(user=User.objects.get(), question_ids=[self.inactive[0]], total=1)
+        attempt.answers.create(question_id=self.inactive[0], is_correct=True, answered_at=now(),
+                               answer=GeneralAnswer.objects.filter(question_id=self.inactive[0]).first())
+        self.client.post('/review_questions/', {'action': 'delete', 'scope': 'all', 'status': 'inactive'})
+        self.assertFalse(GeneralQuestion.objects.exists())
+        self.assertFalse(GeneralAnswer.objects.exists())
+        self.assertEqual((attempt.answers.get().question, attempt.answers.get().answer), (None, None))
+        self.assertEqual(search.search("offsides"), [])
+
+    def test_delete_by_answer_text_match(self):
+        # Matches on an answer only, which the delete removes before the question
+        GeneralAnswer.objects.filter(question_id=self.inactive[1], text="No").update(text="Ten yard penalty")
+        self.client.post('/review_questions/', {'action': 'delete', 'scope': 'all', 'q': 'penalty'})
+        self.assertFalse(GeneralQuestion.objects.filter(id=self.inactive[1]).exists())
+        self.assertEqual(GeneralQuestion.objects.count(), 7)
+
+    def test_delete_covers_every_relation(self):
+        # Hidden too: NearDuplicate.duplicate_of has no reverse accessor
+        relations = {
+            (field.related_model, field.field.name)
+            for field in GeneralQuestion._meta.get_fields(include_hidden=True)
+            if field.auto_created and not field.concrete
+        }
+        self.assertEqual(relations, set(review.QUESTION_RELATIONS))
+
+
+class SamplingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.active = [GeneralQuestion.objects.create(text=f"Active {n}").id for n in range(5)]
+        self.inactive = GeneralQuestion.objects.create(text="Inactive", is_active=False).id
+
+    def test_samples_only_active_questions(self):
+        sampled = sample_active_question_ids(10)
+        self.assertCountEqual(sampled, self.active)
+        self.assertEqual(len(sample_active_question_ids(3)), 3)
+
+    def test_no_queries_until_pool_changes(self):
+        sample_active_question_ids(3)
+        with self.assertNumQueries(0):
+            sample_active_question_ids(3)
+
+        GeneralQuestion.objects.filter(id=self.inactive).update(is_active=True)
+        invalidate_active_ids()
+        with self.assertNumQueries(1):
+            self.assertIn(self.inactive, sample_active_question_ids(10))
+
+    def test_deleted_question_is_not_sampled(self):
+        sample_active_question_ids(3)
+        GeneralQuestion.objects.get(id=self.active[0]).delete()
+        self.assertNotIn(self.active[0], sample_active_question_ids(10))
+
+
+class QuizViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='official', password='password123')
+        self.client.login(username='official', password='password123')
+        for n in range(3):
+            question = GeneralQuestion.objects.create(text=f"Question {n}")
+            GeneralAnswer.objects.create(question=question, text="Right", is_correct=True)
+            GeneralAnswer.objects.create(question=question, text="Wrong")
+
+    def answer(self, correct):
+        question = self.client.get('/quiz/').context['question']
+        answer = next(a for a in question['answers'] if a['is_correct'] == correct)
+        return self.client.post('/quiz/', {'answer': answer['id']})
+
+    def test_quiz_is_scored(self):
+        self.client.get('/quiz/?num_questions=3')
+        self.answer(True)
+        self.answer(False)
+        self.answer(True)
+        response = self.client.get('/quiz/')
+        self.assertEqual((response.context['score'], response.context['total']), (2, 3))
+        self.assertEqual(len(response.context['wrong_questions']), 1)
+
+    async def test_quiz_over_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get('/quiz/?num_questions=3')
+        for _ in range(3):
+            question = (await self.async_client.get('/quiz/')).context['question']
+            answer = next(a for a in question['answers'] if a['is_correct'])
+            await self.async_client.post('/quiz/', {'answer': answer['id']})
+        response = await self.async_client.get('/quiz/')
+        self.assertEqual((response.context['score'], response.context['total']), (3, 3))
+        attempt = await QuizAttempt.objects.aget(user=self.user)
+        self.assertEqual(attempt.score, 3)
+
+    def test_steps_do_not_query_questions(self):
+        self.client.get('/quiz/?num_questions=3')
+        with CaptureQueriesContext(connection) as queries:
+            self.answer(True)
+            self.client.get('/quiz/')
+        self.assertFalse([q for q in queries if 'quiz_app_general' in q['sql']])
+
+    def test_single_page_quiz(self):
+        response = self.client.get('/quiz/play/?num_questions=3&timer=20')
+        questions = response.context['questions']
+        self.assertEqual(len(questions), 3)
+        self.assertNotContains(response, 'is_correct')
+
+        responses = {}
+        for question in questions:
+            answer = GeneralAnswer.objects.get(question_id=question['id'], is_correct=True)
+            responses[question['id']] = answer.id
+        responses[questions[0]['id']] = GeneralAnswer.objects.get(question_id=questions[0]['id'], is_correct=False).id
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.post('/quiz/submit/', {'responses': responses}, content_type='application/json').json()
+        self.assertEqual(len([q for q in queries if 'quiz_app_general' in q['sql']]), 1)
+        self.assertEqual((result['score'], result['total']), (2, 3))
+        self.assertEqual(result['wrong_questions'], [questions[0]['id']])
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual((attempt.score, attempt.answers.count()), (2, 3))
+
+        # A quiz can only be submitted once
+        response = self.client.post('/quiz/submit/', {'responses': responses}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def expire(self, key, seconds=3600):
+        attempt_id = self.client.session[key]
+        QuizAttempt.objects.filter(id=attempt_id).update(deadline=now() - timedelta(seconds=seconds))
+        cache.delete(f'quiz:attempt:{attempt_id}')
+
+    def test_single_page_quiz_survives_refresh(self):
+        questions = self.client.get('/quiz/play/?num_questions=3&timer=20').context['questions']
+        response = self.client.get('/quiz/play/?num_questions=3&timer=20')
+        self.assertEqual([q['id'] for q in response.context['questions']], [q['id'] for q in questions])
+        self.assertEqual(QuizAttempt.objects.count(), 1)
+
+        self.client.post('/quiz/submit/', {'responses': {}}, content_type='application/json')
+        self.client.get('/quiz/play/?num_questions=3')
+        self.assertEqual(QuizAttempt.objects.count(), 2)
+        self.assertEqual(QuizAttempt.objects.filter(finished_at__isnull=True).count(), 1)
+
+    def test_timed_quiz_records_deadline(self):
+        self.client.get('/quiz/?num_questions=3&timer=20')
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertAlmostEqual((attempt.deadline - attempt.started_at).total_seconds(), 20 * 60, delta=1)
+        self.answer(True)
+        self.answer(True)
+        self.answer(True)
+        self.client.get('/quiz/')
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 3)
+        self.assertFalse(attempt.expired)
+
+    def test_answer_after_deadline_is_not_counted(self):
+        self.client.get('/quiz/?num_questions=3&timer=20')
+        question = self.client.get('/quiz/').context['question']
+        self.answer(True)
+        self.expire('quiz_attempt')
+        response = self.client.post('/quiz/', {'answer': question['answers'][0]['id']})
+        self.assertTrue(response.context['expired'])
+        self.assertEqual(response.context['score'], 1)
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual((attempt.score, attempt.expired), (1, True))
+
+    def test_quiz_ends_at_deadline_during_grace(self):
+        self.client.get('/quiz/?num_questions=3&timer=20')
+        question = self.client.get('/quiz/').context['question']
+        self.expire('quiz_attempt', seconds=settings.QUIZ_TIMER_GRACE_SECONDS // 2)
+        # The answer in flight still counts, but the quiz ends instead of showing the next question
+        response = self.client.post('/quiz/', {'answer': next(a['id'] for a in question['answers'] if a['is_correct'])})
+        self.assertRedirects(response, '/quiz/', fetch_redirect_response=False)
+        response = self.client.get('/quiz/')
+        self.assertTemplateUsed(response, 'quiz_results.html')
+        self.assertTrue(response.context['expired'])
+        self.assertEqual(response.context['score'], 1)
+
+    def test_single_page_quiz_is_graded_once(self):
+        questions = self.client.get('/quiz/play/?num_questions=3').context['questions']
+        attempt_id = self.client.session['quiz_play']
+        responses = {q['id']: GeneralAnswer.objects.get(question_id=q['id'], is_correct=True).id for q in questions}
+        first = self.client.post('/quiz/submit/', {'responses': responses}, content_type='application/json').json()
+
+        # A replay sent before the session lost the attempt reports the same result
+        session = self.client.session
+        session['quiz_play'] = attempt_id
+        session.save()
+        responses[questions[0]['id']] = GeneralAnswer.objects.get(question_id=questions[0]['id'], is_correct=False).id
+        replay = self.client.post('/quiz/submit/', {'responses': responses}, content_type='application/json').json()
+        self.assertEqual(replay, first)
+        attempt = QuizAttempt.objects.get(id=attempt_id)
+        self.assertEqual((attempt.score, attempt.answers.count()), (3, 3))
+        self.assertEqual(LeaderboardEntry.objects.get(user=self.user, conference=None).score, 3)
+
+    def test_single_page_submit_after_sweep(self):
+        questions = self.client.get('/quiz/play/?num_questions=3&timer=20').context['questions']
+        self.expire('quiz_play')
+        finalize_expired_attempts()
+        responses = {q['id']: GeneralAnswer.objects.get(question_id=q['id'], is_correct=True).id for q in questions}
+        result = self.client.post('/quiz/submit/', {'responses': responses}, content_type='application/json').json()
+        self.assertEqual((result['status'], result['score']), ('expired', 0))
+        self.assertFalse(QuizAttempt.objects.get(user=self.user).answers.exists())
+
+    def test_single_page_submit_after_deadline(self):
+        questions = self.client.get('/quiz/play/?num_questions=3&timer=20').context['questions']
+        self.expire('quiz_play')
+        responses = {q['id']: GeneralAnswer.objects.get(question_id=q['id'], is_correct=True).id for q in questions}
+        result = self.client.post('/quiz/submit/', {'responses': responses}, content_type='application/json').json()
+        self.assertEqual((result['status'], result['score']), ('expired', 0))
+        self.assertEqual(QuizAttempt.objects.get(user=self.user).score, 0)
+
+    def test_sweeper_closes_abandoned_attempts(self):
+        self.client.get('/quiz/play/?num_questions=3')  # Untimed, never swept
+        self.client.get('/quiz/?num_questions=3&timer=20')
+        self.answer(True)
+        self.expire('quiz_attempt')
+        self.assertEqual(finalize_expired_attempts(), 1)
+        attempt = QuizAttempt.objects.get(deadline__isnull=False)
+        self.assertTrue(attempt.expired)
+        self.assertEqual(attempt.score, 1)
+        self.assertIsNotNone(attempt.finished_at)
+
+        # The user coming back sees the results of the closed attempt
+        response = self.client.get('/quiz/')
+        self.assertTrue(response.context['expired'])
+        self.assertEqual(response.context['score'], 1)
+
+    def test_answers_are_saved_as_they_arrive(self):
+        self.client.get('/quiz/?num_questions=3')
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual(self.client.session['quiz_attempt'], attempt.id)
+        self.answer(True)
+        self.assertEqual(attempt.answers.count(), 1)
+        self.answer(False)
+        self.assertEqual(list(attempt.answers.values_list('is_correct', flat=True)), [True, False])
+
+    def test_progress_survives_cache_loss(self):
+        self.client.get('/quiz/?num_questions=3')
+        self.answer(True)
+        cache.clear()
+        self.answer(False)
+        cache.clear()
+        self.assertEqual(self.client.get('/quiz/').context['current_index'], 3)
+        self.answer(True)
+        response = self.client.get('/quiz/')
+        self.assertEqual((response.context['score'], len(response.context['wrong_questions'])), (2, 1))
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual((attempt.score, attempt.answers.count()), (2, 3))
+        self.assertNotIn('quiz_attempt', self.client.session)
+
+
+class AdaptiveTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='official', password='password123')
+        self.client.login(username='official', password='password123')
+        for n in range(4):
+            question = GeneralQuestion.objects.create(text=f"Question {n}")
+            GeneralAnswer.objects.create(question=question, text="Right", is_correct=True)
+            GeneralAnswer.objects.create(question=question, text="Wrong")
+
+    def test_due_and_weak_questions_first(self):
+        at = time.time()
+        missed = [(question_id, 0, at - 60) for question_id in range(1, 11)]
+        mastered = [(question_id, 4, at + 86400) for question_id in range(11, 21)]
+        state = adaptive.State(missed + mastered)
+        ids = list(range(1, 101))
+        chosen = adaptive.choose(state, ids, set(ids), 10, now=at)
+        self.assertEqual(len(set(chosen)), 10)
+        self.assertEqual(len([question_id for question_id in chosen if question_id <= 10]), 7)
+        self.assertFalse([question_id for question_id in chosen if 11 <= question_id <= 20])
+        # Once the pool is all seen, the rest come weakest first
+        chosen = adaptive.choose(state, ids[:20], set(ids[:20]), 15, now=at)
+        self.assertEqual(len(set(chosen)), 15)
+        self.assertTrue(set(range(1, 11)) <= set(chosen))
+
+    def test_quiz_answers_move_questions_between_boxes(self):
+        self.client.get('/quiz/?num_questions=4&adaptive=1')
+        with self.captureOnCommitCallbacks(execute=True):  # Where the cached state is updated
+            for correct in (True, False, True, True):
+                question = self.client.get('/quiz/').context['question']
+                answer = next(a for a in question['answers'] if a['is_correct'] == correct)
+                self.client.post('/quiz/', {'answer': answer['id']})
+            self.client.get('/quiz/')
+        mastery = QuestionMastery.objects.filter(user=self.user, source=QuestionMastery.GENERAL)
+        self.assertEqual(sorted(mastery.values_list('box', flat=True)), [0, 1, 1, 1])
+        missed = mastery.get(box=0)
+        self.assertLessEqual(missed.due_at, now())
+        self.assertGreater(mastery.filter(box=1).first().due_at, now() + timedelta(hours=23))
+
+        # The missed question leads the next quiz, picked without a query
+        with self.assertNumQueries(0):
+            self.assertEqual(adaptive.select_general_questions(self.user.id, 1), [missed.question_id])
+        response = self.client.get('/quiz/?num_questions=1&adaptive=1')
+        self.assertEqual(response.context['question']['id'], missed.question_id)
+
+    def test_state_updates_in_place(self):
+        at = time.time()
+        rows = [(question_id, question_id % 3, at + question_id) for question_id in range(1, 21)]
+        state = adaptive.State(rows)
+        changes = {
+            5: ((2, at + 5), (0, at - 60)),
+            7: ((1, at + 7), (2, at + 86400)),
+            30: (None, (1, at + 3600)),
+            9: ((4, at), (1, at + 9)),  # Stale: the cached state has it in box 0
+        }
+        state.update(changes)
+        expected = {question_id: (box, due) for question_id, box, due in rows}
+        expected.update({question_id: after for question_id, (_, after) in changes.items()})
+        rebuilt = adaptive.State((question_id, box, due) for question_id, (box, due) in expected.items())
+        self.assertEqual(sorted(state.rows()), sorted(rebuilt.rows()))
+        self.assertEqual(state.due_at, rebuilt.due_at)
+        self.assertEqual(state.seen, rebuilt.seen)
+
+    def test_conference_questions(self):
+        conference = Conference.objects.create(name="Big Ten")
+        conference.members.add(self.user)
+        quiz = Quiz.objects.create(conference=conference, title="Week 1")
+        questions = [Question.objects.create(quiz=quiz, text=f"Question {n}") for n in range(3)]
+        for question in questions:
+            Answer.objects.create(question=question, text="Right", is_correct=True)
+        wrong = Answer.objects.create(question=questions[0], text="Wrong")
+        closed = Quiz.objects.create(conference=conference, title="Week 0", is_active=False)
+        Question.objects.create(quiz=closed, text="Closed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/quiz/{questions[0].id}/answer/', {'answer': wrong.id})
+            response = self.client.post(f'/quiz/{questions[1].id}/answer/', {'answer': questions[1].answers.get().id})
+        self.assertRedirects(response, f'/conference/{conference.id}/quiz/', fetch_redirect_response=False)
+        mastery = QuestionMastery.objects.get(user=self.user, source=QuestionMastery.CONFERENCE, question_id=questions[0].id)
+        self.assertEqual((mastery.box, mastery.answer_count, mastery.correct_count), (0, 1, 0))
+        self.assertCountEqual(adaptive.select_conference_questions(self.user.id, conference.id, 2),
+                              [questions[0].id, questions[2].id])
+
+        # The practice page asks the missed or unseen questions of open quizzes
+        response = self.client.get(f'/conference/{conference.id}/quiz/')
+        self.assertIn(response.context['question'].id, (questions[0].id, questions[2].id))
+        self.assertContains(response, f'/quiz/{response.context["question"].id}/answer/')
+        outsider = Conference.objects.create(name="SEC")
+        self.assertContains(self.client.get(f'/conference/{outsider.id}/quiz/'), "You are not a member of this conference.")
+
+    def test_preferences(self):
+        response = self.client.post('/quiz/preferences/', {'num_questions': 10, 'timer': 20, 'adaptive': 'on'})
+        self.assertRedirects(response, '/quiz/?num_questions=10&timer=20&adaptive=1', fetch_redirect_response=False)
+
+
+class LeaderboardTestCase(TestCase):
+    def setUp(self):
+        leaderboard.rebuild_leaderboard()  # Drops rankings loaded by other tests
+        self.users = [User.objects.create_user(username=f'official{i}', password='password123') for i in range(3)]
+        self.conferences = [Conference.objects.create(name=name) for name in ("Big Ten", "SEC")]
+        self.conferences[0].members.add(*self.users)
+        self.answers = []
+        for conference in self.conferences:
+            quiz = Quiz.objects.create(conference=conference, title="Week 1")
+            question = Question.objects.create(quiz=quiz, text="Offsides?")
+            self.answers.append((Answer.objects.create(question=question, text="5 yards", is_correct=True),
+                                 Answer.objects.create(question=question, text="10 yards")))
+
+    def answer(self, user, conference, correct):
+        answer = self.answers[conference][0 if correct else 1]
+        UserAnswer.objects.create(user=user, question=answer.question, answer=answer, is_correct=correct)
+
+    def test_ranking(self):
+        ranking = leaderboard.Ranking([(1, 5), (2, 9), (3, 5), (4, 200)])
+        self.assertEqual(ranking.top(3), [(1, 4, 200), (2, 2, 9), (3, 1, 5)])
+        self.assertEqual(ranking.top(10), [(1, 4, 200), (2, 2, 9), (3, 1, 5), (3, 3, 5)])
+        self.assertEqual((ranking.rank(3), ranking.rank(5)), ((3, 5), None))
+        ranking.add(3, 5)
+        ranking.set(4, 0)
+        self.assertEqual(ranking.top(10), [(1, 3, 10), (2, 2, 9), (3, 1, 5)])
+        self.assertEqual(len(ranking), 3)
+
+    def test_answers_update_leaderboards(self):
+        leaderboard.top(10)  # Load the rankings before the answers arrive
+        leaderboard.top(10, self.conferences[0].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.answer(self.users[0], 0, True)
+            self.answer(self.users[0], 1, True)
+            self.answer(self.users[1], 0, True)
+            self.answer(self.users[1], 0, True)
+            self.answer(self.users[2], 0, False)
+            attempt = QuizAttempt.objects.create(user=self.users[2], total=2)
+            questions = [GeneralQuestion.objects.create(text=text) for text in ("Holding?", "Clipping?")]
+            save_answers(attempt.id, self.users[2].id,
+                         [(questions[0].id, None, True, time.time())] * 3 + [(questions[1].id, None, True, time.time())])
+            # Only the first correct answer to a question scores
+            attempt = QuizAttempt.objects.create(user=self.users[2], total=1)
+            save_answers(attempt.id, self.users[2].id, [(questions[0].id, None, True, time.time())])
+
+        self.assertEqual(leaderboard.top(10, self.conferences[0].id), [(1, self.users[0].id, 1), (1, self.users[1].id, 1)])
+        self.assertEqual(leaderboard.rank(self.users[0].id), (1, 2))
+        self.assertEqual(leaderboard.rank(self.users[1].id), (3, 1))
+        self.assertEqual(leaderboard.rank(self.users[2].id), (1, 2))
+        self.assertIsNone(leaderboard.rank(self.users[2].id, self.conferences[0].id))
+
+        before = sorted(LeaderboardEntry.objects.values_list('conference_id', 'user_id', 'score'), key=str)
+        leaderboard.rebuild_leaderboard()
+        self.assertEqual(sorted(LeaderboardEntry.objects.values_list('conference_id', 'user_id', 'score'), key=str), before)
+        # Rankings reload from the rows after a restart
+        self.assertEqual(leaderboard.rank(self.users[0].id, self.conferences[1].id), (1, 1))
+
+    def test_stale_ranking_reloads_once(self):
+        self.answer(self.users[0], 0, True)
+        leaderboard.top(10)
+        ranking, loaded_at = leaderboard._rankings[None]
+        leaderboard._rankings[None] = (ranking, loaded_at - leaderboard.MAX_AGE)
+        # While another request reloads it, the stale ranking is served
+        with leaderboard._reload_locks[None]:
+            with self.assertNumQueries(0):
+                self.assertEqual(leaderboard.rank(self.users[0].id), (1, 1))
+        with self.assertNumQueries(1):
+            leaderboard.rank(self.users[0].id)
+        with self.assertNumQueries(0):
+            leaderboard.rank(self.users[0].id)
+
+    def test_answer_view_scores_its_question_only(self):
+        self.client.login(username='official0', password='password123')
+        right, other = self.answers[0][0], self.answers[1][0]
+        self.client.post(f'/quiz/{right.question_id}/answer/', {'answer': right.id})
+        self.client.post(f'/quiz/{right.question_id}/answer/', {'answer': right.id})  # Scores nothing more
+        self.assertEqual(LeaderboardEntry.objects.get(user=self.users[0], conference=self.conferences[0]).score, 1)
+        self.assertEqual(LeaderboardEntry.objects.get(user=self.users[0], conference=None).score, 1)
+        # An answer to another question is refused
+        response = self.client.post(f'/quiz/{right.question_id}/answer/', {'answer': other.id})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(LeaderboardEntry.objects.filter(conference=self.conferences[1]).exists())
+
+    def test_leaderboard_pages(self):
+        self.answer(self.users[0], 0, True)
+        self.client.login(username='official0', password='password123')
+        response = self.client.get(f'/leaderboard/{self.conferences[0].id}/')
+        self.assertContains(response, "You are ranked #1 with 1 correct answer.")
+        self.assertEqual(response.context['entries'], [{'rank': 1, 'username': 'official0', 'score': 1, 'is_user': True}])
+        self.assertContains(self.client.get('/leaderboard/'), "official0")
+        response = self.client.get(f'/leaderboard/{self.conferences[1].id}/')
+        self.assertContains(response, "You are not a member of this conference.")
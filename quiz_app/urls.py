@@ -9,16 +9,25 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('edit_profile/', views.edit_profile, name='edit_profile'),
     path('quiz/', views.quiz_view, name='quiz'),
+    path('quiz/play/', views.quiz_play, name='quiz_play'),
     path('quiz/preferences/', views.quiz_preferences_view, name='quiz_preferences'),
     path('quiz/submit/', views.submit_quiz, name='submit_quiz'),
     path('quiz/<int:question_id>/answer/', views.answer_question, name='answer_question'),
+    path('conference/<int:conference_id>/quiz/', views.conference_quiz, name='conference_quiz'),
     path('create_quiz/', views.create_quiz, name='create_quiz'),
     path('edit_quiz/<int:quiz_id>/', views.edit_quiz, name='edit_quiz'),
     path('add_answers/<int:question_id>/', views.add_answers, name='add_answers'),
     path('stats/<int:conference_id>/', views.stats_view, name='stats'),
+    path('conference/', views.conference_home, name='conference_home'),
     path('manage_conferences/', views.manage_conferences, name='manage_conferences'),
     path('upload_pdf/', views.upload_pdf, name='upload_pdf'),
+    path('upload_pdf/jobs/<int:job_id>/', views.import_status, name='import_status'),
+    path('metrics/', views.request_metrics, name='request_metrics'),
+    path('review_questions/', views.review_questions, name='review_questions'),
     path('feedback/', views.feedback, name='feedback'),
+    path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('leaderboard/<int:conference_id>/', views.leaderboard_view, name='conference_leaderboard'),
+    path('search/<int:conference_id>/', views.search_questions, name='search_questions'),
     path('create_conference_quiz/<int:conference_id>/', views.create_conference_quiz, name='create_conference_quiz'),
     path('close_quiz/<int:quiz_id>/', views.close_quiz, name='close_quiz'),
     path('release_quiz_questions/<int:quiz_id>/', views.release_quiz_questions, name='release_quiz_questions'),
@@ -1,8 +1,9 @@
+import json
 import logging
 import random
-import pdfplumber
-import re
+import time
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.forms import UserCreationForm
@@ -11,9 +12,23 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 
 from .forms import *
 
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.db.models import Prefetch
 from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
 from .models import *
+from . import adaptive, fragments, leaderboard, metrics, review, search, writebehind
+from .attempts import (aclaim_attempt, afinalize_attempt, aget_progress, arecord_answer, asave_answers,
+                       astart_attempt, finalize_attempt, is_expired, parse_timer, start_attempt)
+from .bundles import abuild_bundle, adelete_bundle, aget_bundle, astore_bundle, build_bundle
+from .dedup import file_sha256
+from .neardup import merge_questions
+from .importers import import_questions
+from .permissions import conference_admin_required, is_conference_member, quiz_conference_id
+from .ingest import fail_stale_job, start_import
+from .sampling import sample_active_question_ids
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +36,7 @@ logger = logging.getLogger(__name__)
 # View for superusers to manage conferences
 @user_passes_test(lambda u: u.is_superuser)
 def manage_conferences(request):
-    conferences = Conference.objects.all()
+    conferences = Conference.objects.prefetch_related('admins')  # The list shows each conference's admins
     if request.method == 'POST':
         form = ConferenceForm(request.POST, request.FILES)
         if form.is_valid():
@@ -32,7 +47,9 @@ def manage_conferences(request):
 
     return render(request, 'manage_conferences.html', {
         'conferences': conferences,
-        'form': form
+        'form': form,
+        'roster_key': fragments.roster_key(),
+        'fragment_timeout': fragments.FRAGMENT_TIMEOUT,
     })
 
 
@@ -48,25 +65,16 @@ def conference_admin_dashboard(request):
 # Unified home page for all users
 @login_required
 def home(request):
-    if request.user.is_superuser:
-        return render(request, 'home.html', {
-            'role': 'superuser',
-            'conferences': Conference.objects.all()
-        })
-    elif request.user.admin_conferences.exists():
-        return render(request, 'home.html', {
-            'role': 'admin',
-            'conferences': request.user.admin_conferences.all()
-        })
-    elif request.user.member_conferences.exists():
-        return render(request, 'home.html', {
-            'role': 'member',
-            'conferences': request.user.member_conferences.all()
-        })
-    else:
-        return render(request, 'home.html', {
-            'role': 'none'
-        })
+    # The conference lists are lazy; they are only queried when their
+    # cached fragment has to be rendered again
+    superuser = request.user.is_superuser
+    return render(request, 'home.html', {
+        'is_superuser': superuser,
+        'admin_conferences': Conference.objects.all() if superuser else request.user.admin_conferences.all(),
+        'member_conferences': Conference.objects.none() if superuser else request.user.member_conferences.all(),
+        'conference_list_key': fragments.conference_list_key(request.user),
+        'fragment_timeout': fragments.FRAGMENT_TIMEOUT,
+    })
 
 
 # Profile editing view
@@ -83,100 +91,248 @@ def edit_profile(request):
     return render(request, 'edit_profile.html', {'form': form})
 
 
-# View for quiz functionality
+# View for quiz functionality. Async, like answer_question and submit_quiz,
+# so under ASGI quiz-takers don't each hold a thread.
 @login_required
-def quiz_view(request):
-    # Initialize session data for quiz
-    if 'quiz_data' not in request.session:
+async def quiz_view(request):
+    user = await _auser(request)
+    # Start a quiz attempt; the session only holds its ID
+    attempt_id = await request.session.aget('quiz_attempt')
+    if attempt_id is None:
         num_questions = int(request.GET.get('num_questions', 10))
-        # Fetch only valid, active questions
-        questions = list(GeneralQuestion.objects.filter(is_active=True))
-        if not questions:
+        # Draw active question IDs without loading the questions
+        question_ids = await sync_to_async(_select_questions)(user, num_questions, request.GET.get('adaptive'))
+        if not question_ids:
             return render(request, 'error.html', {'message': 'No active questions available for the quiz.'})
 
-        random.shuffle(questions)
-        # Store valid question IDs in session
-        selected_questions = questions[:num_questions]
-        request.session['quiz_data'] = {
-            'questions': [q.id for q in selected_questions],
-            'current_index': 0,
-            'score': 0,
-            'wrong_questions': []
-        }
-
-    quiz_data = request.session['quiz_data']
-    current_index = quiz_data['current_index']
-
-    # Handle end of quiz
-    if current_index >= len(quiz_data['questions']):
-        wrong_questions = GeneralQuestion.objects.filter(id__in=quiz_data['wrong_questions'])
-        score = quiz_data['score']
-        del request.session['quiz_data']
+        # Fetch the whole quiz once; every step is served from the bundle
+        bundle = await abuild_bundle(question_ids)
+        question_ids = [question_id for question_id in question_ids if question_id in bundle]
+        attempt, progress = await astart_attempt(user, question_ids, parse_timer(request.GET.get('timer')))
+        await astore_bundle(attempt.id, bundle)
+        await request.session.aset('quiz_attempt', attempt.id)
+        attempt_id = attempt.id
+
+    progress = await aget_progress(attempt_id)
+    question_ids = progress['questions']
+    current_index = progress['index']
+    bundle = await aget_bundle(attempt_id, question_ids)
+    # Only an answer posted as time ran out gets the grace period
+    expired = is_expired(progress['deadline'], grace=request.method == 'POST')
+
+    # Handle end of quiz, including running out of time
+    if current_index >= len(question_ids) or expired:
+        await afinalize_attempt(attempt_id, progress, expired=expired)
+        await request.session.apop('quiz_attempt')
+        await adelete_bundle(attempt_id)
         return render(request, 'quiz_results.html', {
-            'score': score,
-            'total': len(quiz_data['questions']),
-            'wrong_questions': wrong_questions
+            'score': progress['score'],
+            'total': len(question_ids),
+            'wrong_questions': [bundle[question_id] for question_id in progress['wrong'] if question_id in bundle],
+            'expired': expired,
         })
 
     # Retrieve the current question
-    try:
-        question_id = quiz_data['questions'][current_index]
-        question = get_object_or_404(GeneralQuestion, id=question_id)
-        answers = question.answers.all()  # Fetch related answers
-    except GeneralQuestion.DoesNotExist:
+    question = bundle.get(question_ids[current_index])
+    if question is None:
         return render(request, 'error.html', {'message': 'Question not found in the database.'})
+    answers = question['answers']
 
     # Handle answer submission
     if request.method == 'POST':
         selected_answer = request.POST.get('answer')
-        if selected_answer and answers.filter(id=int(selected_answer), is_correct=True).exists():
-            quiz_data['score'] += 1
-        else:
-            quiz_data['wrong_questions'].append(question.id)
-        quiz_data['current_index'] += 1
-        request.session['quiz_data'] = quiz_data
+        selected = next((a for a in answers if selected_answer and str(a['id']) == selected_answer), None)
+        await arecord_answer(
+            attempt_id,
+            progress,
+            question['id'],
+            selected['id'] if selected else None,
+            bool(selected and selected['is_correct']),
+        )
         return redirect('quiz')
 
     return render(request, 'quiz.html', {
         'question': question,
         'answers': answers,  # Pass answers to template
         'current_index': current_index + 1,
-        'total_questions': len(quiz_data['questions'])
+        'total_questions': len(question_ids),
+        'deadline': progress['deadline'],
+    })
+
+
+# Single-page quiz: the whole quiz is sent once and answered client-side
+@login_required
+def quiz_play(request):
+    # A refresh or going back shows the quiz in progress instead of starting another
+    attempt_id = request.session.get('quiz_play')
+    attempt = QuizAttempt.objects.filter(
+        id=attempt_id, user=request.user, finished_at__isnull=True
+    ).first() if attempt_id else None
+    deadline = attempt.deadline.timestamp() if attempt and attempt.deadline else None
+    if attempt and is_expired(deadline):
+        finalize_attempt(attempt.id, expired=True)
+        attempt = None
+
+    if attempt is None:
+        num_questions = int(request.GET.get('num_questions', 10))
+        question_ids = _select_questions(request.user, num_questions, request.GET.get('adaptive'))
+        if not question_ids:
+            return render(request, 'error.html', {'message': 'No active questions available for the quiz.'})
+        bundle = build_bundle(question_ids)
+        question_ids = [question_id for question_id in question_ids if question_id in bundle]
+        random.shuffle(question_ids)
+        attempt, progress = start_attempt(request.user, question_ids, parse_timer(request.GET.get('timer')))
+        request.session['quiz_play'] = attempt.id
+        deadline = progress['deadline']
+    else:
+        bundle = build_bundle(attempt.question_ids)
+
+    questions = []
+    for question_id in attempt.question_ids:
+        question = bundle.get(question_id)
+        if question is None:
+            continue  # Deleted since the quiz started
+        # Never send the correctness flags to the browser
+        answers = [{'id': a['id'], 'text': a['text']} for a in question['answers']]
+        random.shuffle(answers)
+        questions.append({'id': question['id'], 'text': question['text'], 'answers': answers})
+    return render(request, 'quiz_play.html', {
+        'questions': questions,
+        'deadline': deadline,
     })
 
 
+def _select_questions(user, count, adaptive_mode):
+    """
+    IDs of the general questions for a new quiz: chosen from the user's
+    history when they asked for an adaptive quiz, at random otherwise.
+    """
+    if adaptive_mode:
+        return adaptive.select_general_questions(user.id, count)
+    return sample_active_question_ids(count)
+
+
 # Submit quiz view
 @login_required
-def submit_quiz(request):
-    if request.method == 'POST':
-        return JsonResponse({'status': 'success', 'message': 'Quiz submitted successfully!'})
-    return JsonResponse({'status': 'error', 'message': 'Invalid request method.'}, status=400)
+async def submit_quiz(request):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method.'}, status=400)
+
+    user = await _auser(request)
+    attempt = await QuizAttempt.objects.filter(id=await request.session.aget('quiz_play'), user=user).afirst()
+    if not attempt:
+        return JsonResponse({'status': 'error', 'message': 'No quiz in progress.'}, status=400)
+    try:
+        responses = json.loads(request.body)['responses']  # {question id: answer id}
+        selected = {int(question_id): int(answer_id) for question_id, answer_id in responses.items() if answer_id}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid submission.'}, status=400)
+    expired = is_expired(attempt.deadline.timestamp() if attempt.deadline else None)
+    if expired:
+        selected = {}  # Submitted too late; nothing counts
+
+    # Grade every response with one query
+    question_ids = attempt.question_ids
+    answer_keys = {
+        answer_id: (question_id, is_correct)
+        async for answer_id, question_id, is_correct in GeneralAnswer.objects.filter(
+            question_id__in=question_ids
+        ).values_list('id', 'question_id', 'is_correct')
+    }
+    correct_answers = {question_id: answer_id for answer_id, (question_id, is_correct) in answer_keys.items() if is_correct}
+    if await aclaim_attempt(attempt.id, expired):
+        answered_at = time.time()
+        results = []
+        for question_id in question_ids:
+            answer_id = selected.get(question_id)
+            if answer_keys.get(answer_id, (None,))[0] != question_id:
+                answer_id = None  # Not one of this question's answers
+            results.append((question_id, answer_id, answer_id is not None and answer_keys[answer_id][1], answered_at))
+        await asave_answers(attempt.id, user.id, results)
+        await afinalize_attempt(attempt.id, expired=expired)
+        correct = {question_id for question_id, _, is_correct, _ in results if is_correct}
+    else:
+        # Graded by an earlier submission, or closed by the sweeper: report
+        # that result instead of grading again
+        attempt = await QuizAttempt.objects.aget(id=attempt.id)
+        expired = attempt.expired
+        correct = {question_id async for question_id in attempt.answers.filter(
+            is_correct=True).values_list('question_id', flat=True)}
+    await request.session.apop('quiz_play')
+
+    wrong_questions = [question_id for question_id in question_ids if question_id not in correct]
+    return JsonResponse({
+        'status': 'expired' if expired else 'success',
+        'score': len(question_ids) - len(wrong_questions),
+        'total': len(question_ids),
+        'wrong_questions': wrong_questions,
+        'correct_answers': correct_answers,
+    })
 
 
 # View to answer a specific question
 @login_required
-def answer_question(request, question_id):
-    question = get_object_or_404(Question, id=question_id)
+async def answer_question(request, question_id):
+    user = await _auser(request)
     if request.method == 'POST':
         selected_answer_id = request.POST.get('answer')
-        selected_answer = get_object_or_404(Answer, id=selected_answer_id)
-        is_correct = selected_answer.is_correct
-        UserAnswer.objects.create(
-            user=request.user,
-            question=question,
-            answer=selected_answer,
-            is_correct=is_correct
+        # The question and quiz come along for the totals and leaderboards
+        selected_answer = await aget_object_or_404(
+            Answer.objects.select_related('question__quiz'), id=selected_answer_id, question_id=question_id
         )
+        question = selected_answer.question
+        is_correct = selected_answer.is_correct
+        if settings.ANSWER_WRITE_BEHIND:
+            # Respond once the answer is on disk; the flusher inserts it
+            await sync_to_async(writebehind.submit, thread_sensitive=False)(
+                user.id, question.id, selected_answer.id, is_correct
+            )
+        else:
+            await UserAnswer.objects.acreate(
+                user=user,
+                question=question,
+                answer=selected_answer,
+                is_correct=is_correct
+            )
         if is_correct:
-            return redirect('quiz')
+            return redirect('conference_quiz', conference_id=question.quiz.conference_id)
         else:
-            correct_answer = question.answers.filter(is_correct=True).first()
+            correct_answer = await question.answers.filter(is_correct=True).afirst()
             return render(request, 'feedback.html', {
                 'question': question,
                 'correct_answer': correct_answer,
                 'selected_answer': selected_answer
             })
-    return redirect('quiz')
+    question = await aget_object_or_404(Question.objects.select_related('quiz'), id=question_id)
+    return redirect('conference_quiz', conference_id=question.quiz.conference_id)
+
+
+# A conference's practice quiz: one question at a time from its open quizzes,
+# picked from the user's history (see adaptive.py) and answered through
+# answer_question
+@login_required
+def conference_quiz(request, conference_id):
+    if not (request.user.is_superuser or is_conference_member(request, conference_id)):
+        return render(request, 'error.html', {'message': 'You are not a member of this conference.'})
+    conference = get_object_or_404(Conference, id=conference_id)
+    question_ids = adaptive.select_conference_questions(request.user.id, conference.id, 1)
+    if not question_ids:
+        return render(request, 'error.html', {'message': 'This conference has no open quiz questions.'})
+    question = Question.objects.select_related('quiz').get(id=question_ids[0])
+    return render(request, 'conference_quiz.html', {
+        'conference': conference,
+        'question': question,
+        'answers': question.answers.all(),
+    })
+
+
+async def _auser(request):
+    """
+    Load the user without blocking and put it on the request, so templates
+    reading request.user don't query from the event loop.
+    """
+    request.user = await request.auser()
+    return request.user
 
 
 # Create a quiz
@@ -225,19 +381,42 @@ def upload_pdf(request):
     if request.method == 'POST':
         form = QuizPDFForm(request.POST, request.FILES)
         if form.is_valid():
-            quiz_pdf = form.save()
-            file_path = quiz_pdf.file.path
-            try:
-                parse_and_save_pdf(file_path)
-            except Exception as e:
-                logger.error(f"Error parsing PDF: {e}")
-                return render(request, 'error.html', {'message': f"Error parsing PDF: {e}"})
-            return redirect('home')
+            sha256 = file_sha256(form.cleaned_data['file'])
+            imported = ImportJob.objects.filter(pdf__sha256=sha256, status=ImportJob.DONE).order_by('-id').first()
+            if imported:
+                # Identical file: nothing new to parse
+                return render(request, 'upload_pdf.html', {'form': QuizPDFForm(), 'job': imported, 'already_imported': True})
+
+            quiz_pdf = form.save(commit=False)
+            quiz_pdf.sha256 = sha256
+            quiz_pdf.save()
+            # Parsing happens in the background; hand back the job so the
+            # page can poll its progress.
+            job = start_import(quiz_pdf, request.user)
+            return render(request, 'upload_pdf.html', {'form': QuizPDFForm(), 'job': job})
     else:
         form = QuizPDFForm()
     return render(request, 'upload_pdf.html', {'form': form})
 
 
+# Progress of a PDF import job
+@login_required
+def import_status(request, job_id):
+    job = get_object_or_404(ImportJob, id=job_id)
+    if job.created_by_id != request.user.id and not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Not authorized.'}, status=403)
+    if fail_stale_job(job):
+        job.refresh_from_db()
+    return JsonResponse(job.as_dict())
+
+
+# Recent request timings and query counts, when REQUEST_METRICS is on
+@login_required
+@user_passes_test(lambda u: u.is_superuser or u.is_staff)
+def request_metrics(request):
+    return JsonResponse({'enabled': settings.REQUEST_METRICS, 'views': metrics.store.snapshot()})
+
+
 # Feedback view
 @login_required
 def feedback(request):
@@ -246,80 +425,6 @@ def feedback(request):
     })
 
 
-def parse_and_save_pdf(file_path):
-    """
-    Parse the uploaded PDF and save extracted questions and answers into the database.
-    """
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-
-            # Extract questions and answers
-            parsed_data = extract_questions_and_answers(text)
-            for question_text, answers in parsed_data:  # Unpack the tuple here
-                # Save question to database
-                question = GeneralQuestion.objects.create(text=question_text, is_active=False)
-
-                # Save answers to database
-                for answer in answers:
-                    GeneralAnswer.objects.create(
-                        question=question,
-                        text=answer["text"],
-                        is_correct=answer["is_correct"],
-                    )
-
-
-def extract_questions_and_answers(text):
-    """
-    Extracts questions and their answers from a given text.
-
-    :param text: The raw text extracted from a PDF page.
-    :return: A list of tuples, where each tuple contains a question (str)
-             and a list of answers (dict with 'text' and 'is_correct' keys).
-    """
-    lines = text.split("\n")
-    questions = []
-    current_question = None
-    current_answers = []
-    i = 0
-
-    while i < len(lines):
-        line = lines[i].strip()
-        # Detect a new question starting with "Q#"
-        question_match = re.match(r"(Q\d+)\s(.*)", line)
-        if question_match:
-            # Save the previous question and its answers
-            if current_question and current_answers:
-                questions.append((current_question.strip(), current_answers))
-                current_answers = []
-
-            # Start a new question
-            current_question = question_match.group(2).strip()
-
-        # Detect standalone "o" indicating the start of an answer
-        elif line == "o" and i + 1 < len(lines):
-            # The next line is the answer text
-            answer_text = lines[i + 1].strip()
-            is_correct = "__" in answer_text  # Detect correct answers by underline
-            cleaned_text = answer_text.replace("__", "").strip()  # Clean underline markers
-            current_answers.append({"text": cleaned_text, "is_correct": is_correct})
-            i += 1  # Skip the next line since it's part of the answer
-
-        # Append additional lines to the current question
-        elif current_question and not re.match(r"(Q\d+)\s", line):
-            current_question += f" {line.strip()}"
-
-        i += 1
-
-    # Add the last question and answers
-    if current_question and current_answers:
-        questions.append((current_question.strip(), current_answers))
-
-    return questions
-
-
 # View for user signup
 def signup(request):
     if request.method == 'POST':
@@ -339,42 +444,84 @@ def quiz_preferences_view(request):
     form = QuizPreferenceForm(request.POST or None)
     if form.is_valid():
         # Process preferences and redirect to quiz page
-        num_questions = form.cleaned_data.get('num_questions')
-        timer = form.cleaned_data.get('timer')
-        return redirect(f'/quiz/?num_questions={num_questions}&timer={timer}')
+        params = {'num_questions': form.cleaned_data.get('num_questions'), 'timer': form.cleaned_data.get('timer')}
+        if form.cleaned_data.get('adaptive'):
+            params['adaptive'] = 1
+        if form.cleaned_data.get('single_page'):
+            return redirect(f'/quiz/play/?{urlencode(params)}')
+        return redirect(f'/quiz/?{urlencode(params)}')
 
     return render(request, 'quiz_preferences.html', {'form': form})
 
 
 # Conference stats view for admins
 @login_required
+@conference_admin_required('You are not authorized to view stats for this conference.')
 def stats_view(request, conference_id):
     conference = get_object_or_404(Conference, id=conference_id)
-    if request.user not in conference.admins.all():
-        return render(request, 'error.html', {'message': 'You are not authorized to view stats for this conference.'})
 
-    quizzes = conference.quizzes.all()
+    # Totals are kept up to date as answers arrive, see stats.py
+    quizzes = conference.quizzes.select_related('stats').order_by('title')
     stats = []
 
     for quiz in quizzes:
-        user_stats = quiz.user_stats.all()
+        quiz_stats = getattr(quiz, 'stats', None)
         stats.append({
             'quiz': quiz,
-            'total_attempts': user_stats.count(),
-            'average_score': user_stats.aggregate_avg('score'),  # Placeholder, calculate avg score
+            'total_attempts': quiz_stats.participants if quiz_stats else 0,
+            'answer_count': quiz_stats.answer_count if quiz_stats else 0,
+            'average_score': quiz_stats.average_score if quiz_stats else None,
         })
 
+    # Written by the analyze_items command
+    items = (
+        ItemAnalysis.objects.filter(question__quiz__conference=conference)
+        .select_related('question__quiz')
+        .order_by('question__quiz__title', 'question_id')
+    )
+
     return render(request, 'stats.html', {
         'conference': conference,
         'stats': stats,
+        'items': items,
+    })
+
+
+# Overall leaderboard, or a conference's for its members and admins
+@login_required
+def leaderboard_view(request, conference_id=None):
+    conference = None
+    if conference_id is not None:
+        if not (request.user.is_superuser or is_conference_member(request, conference_id)):
+            return render(request, 'error.html', {'message': 'You are not a member of this conference.'})
+        conference = get_object_or_404(Conference, id=conference_id)
+
+    # Rankings are kept in memory as answers arrive, see leaderboard.py
+    top = leaderboard.top(settings.LEADERBOARD_SIZE, conference_id)
+    usernames = dict(User.objects.filter(id__in=[user_id for _, user_id, _ in top]).values_list('id', 'username'))
+    return render(request, 'leaderboard.html', {
+        'conference': conference,
+        'entries': [
+            {'rank': rank, 'username': usernames.get(user_id), 'score': score, 'is_user': user_id == request.user.id}
+            for rank, user_id, score in top
+        ],
+        'user_rank': leaderboard.rank(request.user.id, conference_id),
     })
 
 
+# Ranked full-text search of the general questions and the conference's own,
+# for conference admins building quizzes
+@login_required
+@conference_admin_required('You are not authorized to search questions for this conference.')
+def search_questions(request, conference_id):
+    query = request.GET.get('q', '')
+    return JsonResponse({'query': query, 'results': search.search(query, conference_id=conference_id)})
+
+
 @login_required
+@conference_admin_required('not authorized to create quizzes for this conference.')
 def create_conference_quiz(request, conference_id):
     conference = get_object_or_404(Conference, id=conference_id)
-    if request.user not in conference.admins.all():
-        return render(request, 'error.html', {'message': 'not authorized to create quizzes for this conference.'})
 
     if request.method == 'POST':
         form = QuizForm(request.POST)
@@ -391,13 +538,12 @@ def create_conference_quiz(request, conference_id):
 
 
 @login_required
+@conference_admin_required('You are not authorized to edit this quiz.', conference_id=quiz_conference_id)
 def edit_quiz(request, quiz_id):
     """
     View to edit a conference quiz and add questions.
     """
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    if request.user not in quiz.conference.admins.all():
-        return render(request, 'error.html', {'message': 'You are not authorized to edit this quiz.'})
 
     questions = quiz.questions.all()
 
@@ -419,13 +565,12 @@ def edit_quiz(request, quiz_id):
 
 
 @login_required
+@conference_admin_required('You are not authorized to close this quiz.', conference_id=quiz_conference_id)
 def close_quiz(request, quiz_id):
     """
     View to close a quiz, making it inactive.
     """
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    if request.user not in quiz.conference.admins.all():
-        return render(request, 'error.html', {'message': 'You are not authorized to close this quiz.'})
 
     quiz.is_active = False
     quiz.save()
@@ -433,49 +578,37 @@ def close_quiz(request, quiz_id):
 
 
 @login_required
+@conference_admin_required('You are not authorized to release questions from this quiz.', conference_id=quiz_conference_id)
 def release_quiz_questions(request, quiz_id):
     """
     View to release quiz questions to the general question pool.
     """
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    if request.user not in quiz.conference.admins.all():
-        return render(request, 'error.html', {'message': 'You are not authorized to release questions from this quiz.'})
 
-    for question in quiz.questions.all():
-        GeneralQuestion.objects.create(text=question.text)
+    questions = quiz.questions.prefetch_related('answers')
+    import_questions(
+        [(question.text, [{'text': a.text, 'is_correct': a.is_correct} for a in question.answers.all()])
+         for question in questions],
+        is_active=True,
+    )
 
     return redirect('edit_quiz', quiz_id=quiz.id)
 
 
-@login_required
-@user_passes_test(lambda u: u.is_superuser or u.is_staff)
-def review_questions(request):
-    # Fetch inactive questions
-    inactive_questions = Question.objects.filter(is_active=False)
-
-    if request.method == 'POST':
-        question_ids = request.POST.getlist('activate')
-        Question.objects.filter(id__in=question_ids).update(is_active=True)
-        return redirect('review_questions')
-
-    return render(request, 'review_questions.html', {
-        'inactive_questions': inactive_questions,
-    })
-
-
 @login_required
 def conference_home(request):
-    conferences = request.user.admin_conferences.all()
+    conferences = Conference.objects.all() if request.user.is_superuser else request.user.admin_conferences.all()
     return render(request, 'conference_home.html', {
         'conferences': conferences,
+        'conference_list_key': fragments.conference_list_key(request.user),
+        'fragment_timeout': fragments.FRAGMENT_TIMEOUT,
     })
 
 
 @login_required
+@conference_admin_required('You are not authorized to create quizzes for this conference.')
 def conference_create_quiz(request, conference_id):
     conference = get_object_or_404(Conference, id=conference_id)
-    if request.user not in conference.admins.all():
-        return render(request, 'error.html', {'message': 'You are not authorized to create quizzes for this conference.'})
 
     if request.method == 'POST':
         question_text = request.POST.get('question_text')
@@ -507,14 +640,54 @@ def conference_create_quiz(request, conference_id):
 @login_required
 @user_passes_test(lambda u: u.is_superuser or u.is_staff)
 def review_questions(request):
-    inactive_questions = GeneralQuestion.objects.filter(is_active=False)
+    # The filter comes from the query string, or from hidden fields on POST
+    params = request.POST if request.method == 'POST' else request.GET
+    status = 'active' if params.get('status') == 'active' else 'inactive'
+    query = params.get('q', '')
+    questions = GeneralQuestion.objects.filter(is_active=status == 'active')
+    if search.search_terms(query):
+        questions = questions.filter(id__in=search.matching_ids(search.GENERAL, query))
 
     if request.method == 'POST':
-        question_ids = request.POST.getlist('activate')
-        GeneralQuestion.objects.filter(id__in=question_ids).update(is_active=True)
-        return redirect('review_questions')
+        if 'merge' in request.POST:
+            pair = get_object_or_404(NearDuplicate.objects.select_related('question', 'duplicate_of'), id=request.POST['merge'])
+            merge_questions(pair.question, pair.duplicate_of)
+        elif 'dismiss' in request.POST:
+            NearDuplicate.objects.filter(id=request.POST['dismiss']).update(dismissed=True)
+        else:
+            # Either the ticked questions or everything matching the filter
+            if request.POST.get('scope') != 'all':
+                questions = GeneralQuestion.objects.filter(id__in=[i for i in request.POST.getlist('selected') if i.isdigit()])
+            action = request.POST.get('action')
+            if action in ('activate', 'deactivate'):
+                review.set_active(questions, action == 'activate')
+            elif action == 'delete':
+                review.delete_questions(questions)
+        return redirect(f"{reverse('review_questions')}?{urlencode({'status': status, 'q': query})}")
+
+    # Near duplicates are found as questions are imported, see neardup.py
+    page = review.keyset_page(
+        questions.prefetch_related(
+            'answers',
+            Prefetch('near_duplicates', NearDuplicate.objects.filter(dismissed=False).select_related('duplicate_of')),
+        ),
+        settings.REVIEW_PAGE_SIZE,
+        after=_int_or_none(request.GET.get('after')),
+        before=_int_or_none(request.GET.get('before')),
+    )
+    return render(request, 'review_questions.html', {
+        'questions': page.items,
+        'page': page,
+        'status': status,
+        'query': query,
+    })
 
-    return render(request, 'review_questions.html', {'inactive_questions': inactive_questions})
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
 
 def logout_view(request):
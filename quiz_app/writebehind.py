@@ -0,0 +1,271 @@
+"""
+Write-behind buffer for UserAnswer inserts.
+
+With ANSWER_WRITE_BEHIND on, answer_question doesn't insert its UserAnswer
+itself: it appends the answer to an append-only log on local disk, fsyncs
+it and responds. A flusher thread bulk-inserts the logged answers every
+ANSWER_LOG_FLUSH_INTERVAL seconds, so a conference answering at once costs
+one transaction per interval instead of one per click.
+
+Each process appends to its own segment file in ANSWER_LOG_DIR and holds
+an exclusive lock on it. A flush starts a new segment, inserts the answers
+of the closed one and deletes it. A segment nobody holds a lock on was left
+behind by a process that died; the flusher replays such segments when it
+starts, which is when the app loads (see apps.py), and the flush_answer_log
+command replays them on demand.
+
+Every logged answer carries a client_token, which is unique on UserAnswer.
+Answers whose token is already in the table are skipped, so replaying a
+segment that was inserted but not yet deleted inserts nothing twice. The
+running totals (stats.py) are updated for the newly inserted rows only.
+Segment locks use fcntl, so write-behind needs a POSIX system.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.utils.timezone import now
+
+from . import adaptive, leaderboard
+from .importers import batched
+from .models import Answer, UserAnswer
+from .stats import apply_answers
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# The log is created by start() or on first use, so that importing this
+# module (e.g. from views.py) never starts the flusher.
+_log_lock = threading.Lock()
+_logs = {}
+
+
+def start():
+    """
+    Start this process's log and flusher, which first replays what dead
+    processes left behind, unless they are already running.
+    """
+    _get_log()
+
+
+def submit(user_id, question_id, answer_id, is_correct):
+    """
+    Log an answer for insertion by the flusher. Returns once the answer is
+    on disk.
+    """
+    _get_log().append({
+        'token': uuid.uuid4().hex,
+        'user': user_id,
+        'question': question_id,
+        'answer': answer_id,
+        'correct': is_correct,
+        'at': now().isoformat(),
+    })
+
+
+def flush():
+    """
+    Insert what this process has logged so far.
+
+    :return: The number of answers inserted.
+    """
+    return _get_log().flush()
+
+
+def replay(directory=None):
+    """
+    Insert the answers of segments left behind by processes that died.
+
+    :return: The number of answers inserted.
+    """
+    inserted = 0
+    for path in sorted(Path(directory or settings.ANSWER_LOG_DIR).glob('*.log')):
+        segment = Segment.claim(path)
+        if segment:
+            inserted += insert_answers(segment.records())
+            segment.remove()
+    return inserted
+
+
+def insert_answers(records):
+    """
+    Insert logged answers that aren't in the table yet and add them to the
+    running totals, ANSWER_LOG_BATCH_SIZE per transaction. Answers whose
+    user, question or answer was deleted in the meantime are dropped.
+
+    :return: The number of answers inserted.
+    """
+    inserted = 0
+    for batch in batched(records, settings.ANSWER_LOG_BATCH_SIZE):
+        tokens = {uuid.UUID(record['token']): record for record in batch}
+        with transaction.atomic():
+            for token in UserAnswer.objects.filter(client_token__in=tokens).values_list('client_token', flat=True):
+                del tokens[token]
+            answers = dict(
+                Answer.objects.filter(id__in={r['answer'] for r in tokens.values()}).values_list('id', 'question_id')
+            )
+            users = set(User.objects.filter(id__in={r['user'] for r in tokens.values()}).values_list('id', flat=True))
+            rows = [
+                UserAnswer(client_token=token, user_id=record['user'], question_id=record['question'],
+                           answer_id=record['answer'], is_correct=record['correct'],
+                           answered_at=datetime.fromisoformat(record['at']))
+                for token, record in tokens.items()
+                if record['user'] in users and answers.get(record['answer']) == record['question']
+            ]
+            if len(rows) < len(tokens):
+                logger.warning(f"Dropped {len(tokens) - len(rows)} logged answer(s) to deleted rows")
+            UserAnswer.objects.bulk_create(rows)
+            # bulk_create doesn't send the signal that does these
+            apply_answers(rows)
+            adaptive.record_user_answers(rows)
+            leaderboard.record_user_answers(rows)
+        inserted += len(rows)
+    return inserted
+
+
+class Segment:
+    """
+    One locked file of the answer log, holding an answer per JSON line.
+    """
+
+    def __init__(self, path, file):
+        self.path = path
+        self.file = file
+        self.size = 0  # Answers appended by this process
+
+    @classmethod
+    def create(cls, directory):
+        # Locked before it gets the name replay() looks for, so no other
+        # process can claim it in between
+        temporary = directory / f'{uuid.uuid4().hex}.tmp'
+        file = open(temporary, 'a', encoding='utf-8')
+        _lock(file)
+        path = temporary.with_suffix('.log')
+        os.rename(temporary, path)
+        return cls(path, file)
+
+    @classmethod
+    def claim(cls, path):
+        """
+        Lock a segment left behind by another process, or return None if it
+        is still in use or already gone.
+        """
+        try:
+            file = open(path, 'a', encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        try:
+            _lock(file)
+        except BlockingIOError:
+            file.close()
+            return None
+        if not path.exists():  # Flushed and deleted before we got the lock
+            file.close()
+            return None
+        return cls(path, file)
+
+    def append(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.size += 1
+
+    def records(self):
+        records = []
+        with open(self.path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn write of a process that died mid-append; that
+                    # answer was never acknowledged
+                    logger.warning(f"Skipped a damaged line in {self.path}")
+        return records
+
+    def remove(self):
+        os.unlink(self.path)
+        self.file.close()
+
+
+class AnswerLog:
+    """
+    The segments of one process: the one being appended to, and closed ones
+    waiting to be inserted.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._current = Segment.create(self.directory)
+        self._closed = []  # Kept locked until inserted, so no other process replays them
+
+    def append(self, record):
+        with self._lock:
+            self._current.append(record)
+
+    def flush(self):
+        """
+        Close the current segment and insert every closed segment. A segment
+        that fails to insert stays closed and is retried on the next flush.
+
+        :return: The number of answers inserted.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._current.size:
+                    self._closed.append(self._current)
+                    self._current = Segment.create(self.directory)
+            inserted = 0
+            while self._closed:
+                segment = self._closed[0]
+                inserted += insert_answers(segment.records())
+                segment.remove()
+                self._closed.pop(0)
+            return inserted
+
+
+def _get_log():
+    directory = Path(settings.ANSWER_LOG_DIR)
+    with _log_lock:
+        if directory not in _logs:
+            _logs[directory] = AnswerLog(directory)
+            threading.Thread(target=_run_flusher, args=(_logs[directory],), name='answer-log', daemon=True).start()
+        return _logs[directory]
+
+
+def _run_flusher(log):
+    recover = True
+    while True:
+        try:
+            if recover:
+                replay(log.directory)  # What dead processes left behind
+                recover = False
+            else:
+                log.flush()
+        except Exception:
+            logger.exception("Flushing the answer log failed; retrying")
+        finally:
+            # Connections are per thread; don't hold this one between flushes.
+            connections.close_all()
+        time.sleep(settings.ANSWER_LOG_FLUSH_INTERVAL)
+
+
+def _lock(file):
+    if fcntl is None:
+        raise ImproperlyConfigured("ANSWER_WRITE_BEHIND needs fcntl, which this platform lacks.")
+    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)